@@ -1,15 +1,26 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import csv
-import openpyxl
+import contextlib
+import multiprocessing
+import os
 import sys
 import argparse
+import tempfile
+import time
 from pathlib import Path
-from openpyxl import Workbook
 
+from batch_executor import BatchTask, run_batch
+from batch_manifest import ManifestSet
+from column_stats import stats_path, table_profile
+from column_types import DEFAULT_SAMPLE_ROWS
+from compressed_io import strip_compression
+from parallel import peak_rss_bytes
+from pipeline import ENGINES, profile_rows, read_csv, write_excel
 
-def csv_to_excel(csv_file, excel_file, sheet_name='Sheet1', separator=',', start_row=1, start_col=1):
+
+def csv_to_excel(csv_file, excel_file, sheet_name='Sheet1', separator=',', start_row=1, start_col=1,
+                 engine='auto', sample_rows=DEFAULT_SAMPLE_ROWS, profile=False):
     """
     Convert CSV file to Excel
     
@@ -20,6 +31,19 @@ def csv_to_excel(csv_file, excel_file, sheet_name='Sheet1', separator=',', start
         separator: CSV delimiter
         start_row: Starting row in Excel (1-indexed)
         start_col: Starting column in Excel (1-indexed)
+        engine: 'stream' writes sheet XML directly (new workbook, new sheet, or
+                full replacement of an existing sheet), 'openpyxl' loads the
+                whole workbook in memory, 'auto' uses openpyxl only to update
+                an existing sheet in place
+        sample_rows: Rows sampled to lock each column's type
+        profile: Also write statistics of the CSV columns, gathered in the
+                 same pass, to <excel_file>.stats.json (see column_stats)
+    
+    Rows beyond Excel's 1,048,576-row limit continue on sheets named
+    <sheet>_2, <sheet>_3, ... with the first CSV row repeated as a header.
+    
+    Returns:
+        Number of CSV rows written
     """
     csv_path = Path(csv_file)
     excel_path = Path(excel_file)
@@ -28,70 +52,83 @@ def csv_to_excel(csv_file, excel_file, sheet_name='Sheet1', separator=',', start
     if not csv_path.exists():
         raise FileNotFoundError(f"CSV file not found: {csv_file}")
     
-    # Load or create workbook
-    if excel_path.exists():
-        print(f"Loading existing Excel file: {excel_file}")
-        wb = openpyxl.load_workbook(excel_file)
-    else:
-        print(f"Creating new Excel file: {excel_file}")
-        wb = Workbook()
-        # Remove default sheet if creating new workbook
-        if 'Sheet' in wb.sheetnames:
-            wb.remove(wb['Sheet'])
+    table = read_csv(csv_path, 'utf-8', {'delimiter': separator}, newline='')
+    if profile:
+        stats = table_profile(table.columns)
+        table = profile_rows(table, stats)
+    row_count, sheet_names = write_excel(table, excel_path, sheet_name, start_row, start_col, engine, sample_rows)
+    if profile:
+        stats.write(excel_path, source=csv_path)
     
-    # Create or select sheet
-    if sheet_name in wb.sheetnames:
-        print(f"Writing to existing sheet: {sheet_name}")
-        sheet = wb[sheet_name]
+    if len(sheet_names) > 1:
+        print(f"✓ Successfully wrote {row_count} rows across {len(sheet_names)} sheets "
+              f"('{sheet_names[0]}' to '{sheet_names[-1]}') in {excel_file}")
     else:
-        print(f"Creating new sheet: {sheet_name}")
-        sheet = wb.create_sheet(title=sheet_name)
+        print(f"✓ Successfully wrote {row_count} rows to '{sheet_name}' in {excel_file}")
+    return row_count
+
+
+def _measure_engine(csv_file, excel_file, separator, engine):
+    """Run one conversion in a fresh process and report (rows, seconds, peak RSS)"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        rows = csv_to_excel(csv_file, excel_file, separator=separator, engine=engine)
+        elapsed = time.perf_counter() - started
+    return rows, elapsed, peak_rss_bytes()
+
+
+def compare_engines(csv_file, separator=','):
+    """Convert csv_file with every engine and print rows/sec and peak RSS"""
+    if not Path(csv_file).exists():
+        raise FileNotFoundError(f"CSV file not found: {csv_file}")
     
-    # Read CSV and write to Excel
-    with open(csv_path, "r", encoding="utf-8", newline="") as f:
-        reader = csv.reader(f, delimiter=separator)
-        
-        row_count = 0
-        for row_index, row_data in enumerate(reader, start=start_row):
-            for col_index, value in enumerate(row_data, start=start_col):
-                # Try to convert numbers
-                try:
-                    if '.' in value:
-                        cell_value = float(value)
-                    else:
-                        cell_value = int(value)
-                except (ValueError, AttributeError):
-                    cell_value = value
-                
-                sheet.cell(row=row_index, column=col_index, value=cell_value)
-            row_count += 1
+    print(f"Comparing engines on {csv_file}")
+    print(f"{'Engine':<10} {'Rows':>12} {'Seconds':>10} {'Rows/sec':>12} {'Peak RSS':>12}")
     
-    wb.save(excel_file)
-    print(f"✓ Successfully wrote {row_count} rows to '{sheet_name}' in {excel_file}")
+    # Each engine runs in its own spawned process so peak RSS is not shared
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for engine in ('stream', 'openpyxl'):
+            excel_file = Path(tmp_dir) / f"{engine}.xlsx"
+            with ctx.Pool(1) as pool:
+                rows, elapsed, peak = pool.apply(_measure_engine, (csv_file, excel_file, separator, engine))
+            rate = rows / elapsed if elapsed else float('inf')
+            peak_text = f"{peak / 1024 / 1024:.1f} MB" if peak is not None else "n/a"
+            print(f"{engine:<10} {rows:>12,} {elapsed:>10.2f} {rate:>12,.0f} {peak_text:>12}")
 
 
-def batch_csv_to_excel(csv_files, output_dir=None, separator=','):
-    """Convert multiple CSV files to Excel"""
+def batch_csv_to_excel(csv_files, output_dir=None, separator=',', start_row=1, start_col=1, engine='auto',
+                       sample_rows=DEFAULT_SAMPLE_ROWS, incremental=False, jobs=1, summary_path=None, profile=False):
+    """
+    Convert multiple CSV files to Excel
+    
+    Files are converted side by side in jobs worker processes (see
+    batch_executor). With incremental, inputs converted before with the
+    same options whose content and outputs haven't changed are skipped
+    (see batch_manifest).
+    """
+    options = {'separator': separator, 'start_row': start_row, 'start_col': start_col, 'engine': engine,
+               'sample_rows': sample_rows, 'profile': profile}
+    tasks = []
     for csv_file in csv_files:
         csv_path = Path(csv_file)
         
-        if not csv_path.exists():
-            print(f"⚠️  Skipping {csv_file}: File not found")
-            continue
-        
         # Determine output path
+        # An .xlsx is a zip already, so data.csv.gz becomes data.xlsx
+        stem_path = strip_compression(csv_path)
         if output_dir:
             out_dir = Path(output_dir)
             out_dir.mkdir(parents=True, exist_ok=True)
-            excel_file = out_dir / f"{csv_path.stem}.xlsx"
+            excel_file = out_dir / f"{stem_path.stem}.xlsx"
         else:
-            excel_file = csv_path.with_suffix('.xlsx')
+            excel_file = stem_path.with_suffix('.xlsx')
         
-        try:
-            print(f"\nProcessing: {csv_path.name}")
-            csv_to_excel(csv_file, excel_file, sheet_name=csv_path.stem, separator=separator)
-        except Exception as e:
-            print(f"✗ Error processing {csv_file}: {e}")
+        outputs = [excel_file, stats_path(excel_file)] if profile else [excel_file]
+        tasks.append(BatchTask(csv_path, csv_to_excel, (csv_file, excel_file),
+                               dict(options, sheet_name=stem_path.stem[:31]), outputs))
+    
+    manifests = ManifestSet('CSVtoExcel') if incremental else None
+    return run_batch(tasks, jobs, manifests, options, summary_path)
 
 
 def main():
@@ -109,11 +146,32 @@ Examples:
   # With custom separator and sheet name
   %(prog)s data.csv -o output.xlsx --sep ";" --sheet "MyData"
   
+  # Also write column statistics (nulls, min/max, distinct estimate, type) to output.xlsx.stats.json
+  %(prog)s data.csv -o output.xlsx --profile
+  
+  # Compressed CSV input (gzip, bzip2 or xz)
+  %(prog)s data.csv.gz -o output.xlsx
+  
   # Batch conversion
   %(prog)s file1.csv file2.csv file3.csv --batch --output-dir excel_files
   
+  # Nightly run: only reconvert inputs that changed (manifest kept in the output dir)
+  %(prog)s feeds/* --batch --output-dir excel_files --incremental
+  
+  # Convert 8 files at a time, with a JSON report of times, sizes and errors
+  %(prog)s feeds/* --batch --output-dir excel_files --jobs 8 --summary report.json
+  
   # Start writing at specific cell
   %(prog)s data.csv -o output.xlsx --start-row 5 --start-col 3
+  
+  # Add (or replace) one sheet in a large existing workbook without loading it
+  %(prog)s daily.csv -o report.xlsx --sheet "2024-06-01" --engine stream
+  
+  # Force the in-memory openpyxl engine
+  %(prog)s data.csv -o output.xlsx --engine openpyxl
+  
+  # Compare rows/sec and peak memory of the engines
+  %(prog)s data.csv --compare-engines
         '''
     )
     
@@ -123,8 +181,22 @@ Examples:
     parser.add_argument('--sheet', default='Sheet1', help='Excel sheet name (default: Sheet1)')
     parser.add_argument('--start-row', type=int, default=1, help='Starting row in Excel (default: 1)')
     parser.add_argument('--start-col', type=int, default=1, help='Starting column in Excel (default: 1)')
+    parser.add_argument('--engine', choices=ENGINES, default='auto',
+                       help='Writer engine: stream (new file/sheet, or replace a sheet), openpyxl, or auto (default: auto)')
+    parser.add_argument('--compare-engines', action='store_true',
+                       help='Benchmark rows/sec and peak memory of each engine on the input')
+    parser.add_argument('--sample-rows', type=int, default=DEFAULT_SAMPLE_ROWS,
+                       help=f'Rows sampled to infer column types (default: {DEFAULT_SAMPLE_ROWS})')
+    parser.add_argument('--profile', action='store_true',
+                       help='Write column statistics gathered during the conversion to <output>.stats.json')
     parser.add_argument('--batch', action='store_true', help='Batch mode: convert multiple CSV files')
     parser.add_argument('--output-dir', help='Output directory for batch mode')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Batch mode: skip inputs unchanged since their last conversion with the same options')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Batch mode: files converted at once in worker processes (0 = all cores, default: 1)')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='Batch mode: write a JSON summary of per-file time, bytes in/out and errors (- for stdout)')
     
     args = parser.parse_args()
     
@@ -142,9 +214,16 @@ Examples:
             
             csv_to_excel(csv_file, excel_file, sheet_name, sep)
         
+        # Engine comparison
+        elif args.compare_engines:
+            for csv_file in args.input:
+                compare_engines(csv_file, args.sep)
+        
         # Batch mode
         elif args.batch:
-            batch_csv_to_excel(args.input, args.output_dir, args.sep)
+            batch_csv_to_excel(args.input, args.output_dir, args.sep, args.start_row, args.start_col,
+                               args.engine, args.sample_rows, args.incremental, args.jobs, args.summary,
+                               args.profile)
         
         # Single file mode
         else:
@@ -158,9 +237,10 @@ Examples:
             if args.output:
                 excel_file = args.output
             else:
-                excel_file = Path(csv_file).with_suffix('.xlsx')
+                excel_file = strip_compression(csv_file).with_suffix('.xlsx')
             
-            csv_to_excel(csv_file, excel_file, args.sheet, args.sep, args.start_row, args.start_col)
+            csv_to_excel(csv_file, excel_file, args.sheet, args.sep, args.start_row, args.start_col, args.engine,
+                         args.sample_rows, args.profile)
     
     except FileNotFoundError as e:
         print(f"Error: {e}", file=sys.stderr)
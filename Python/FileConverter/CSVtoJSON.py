@@ -1,50 +1,111 @@
 import csv
-import json
 import argparse
+import io
+import itertools
+import os
 import sys
 from pathlib import Path
-from datetime import datetime
 
+from batch_executor import BatchTask, run_batch
+from batch_manifest import ManifestSet
+from column_stats import TableProfile, stats_path, table_profile
+from column_types import DEFAULT_SAMPLE_ROWS
+from compressed_io import is_compressed, open_output, replace_suffix
+from csv_chunks import can_split, chunk_size_for, read_chunk_text, split_records
+from external_sort import DEFAULT_SORT_MEMORY_MB, sort_rows
+from json_stream import JsonRecordWriter, encode_record, join_encoded
+from parallel import ordered_map, resolve_jobs
+from pipeline import build_row_converter, filter_rows, json_spec, read_csv, sniff_dialect, write_json
+from row_filters import parse_column_list
+from sharding import ShardSet, check_shard_limit, manifest_path
 
-def convert_value(value, preserve_strings=False, parse_dates=False):
-    """Convert string values to appropriate Python types"""
-    if preserve_strings:
-        return value
+# Row converters built in each worker process, keyed by their spec
+_worker_converters = {}
+
+
+def _convert_chunk(task):
+    """
+    Convert one record-aligned byte range to a block of encoded JSON (runs in a worker)
     
-    if not value:
-        return None
+    With by_record the encoded records come back as a list instead, for a
+    sharded output to split between its files.
+    """
+    path, start, end, encoding, params, spec, indent, ndjson, profile_columns, by_record = task
     
-    # Try date parsing if enabled
-    if parse_dates:
-        date_formats = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S']
-        for fmt in date_formats:
-            try:
-                dt = datetime.strptime(value, fmt)
-                return dt.isoformat()
-            except ValueError:
-                pass
+    convert = _worker_converters.get(spec)
+    if convert is None:
+        convert = _worker_converters[spec] = build_row_converter(spec)
     
-    # Try numeric conversion
-    if value.isdigit():
-        return int(value)
+    text = read_chunk_text(path, start, end, encoding)
+    encoded = []
+    kept = []
+    scanned = 0
+    for row in csv.reader(io.StringIO(text), **params):
+        if not row:
+            continue
+        scanned += 1
+        record = convert(row)
+        if record is not None:
+            encoded.append(encode_record(record, indent, ndjson))
+            if profile_columns is not None:
+                kept.append(row)
     
-    try:
-        float_val = float(value)
-        return float_val
-    except ValueError:
-        pass
-    
-    # Boolean conversion
-    if value.lower() in ('true', 'yes', '1'):
-        return True
-    if value.lower() in ('false', 'no', '0'):
-        return False
-    
-    return value
+    profile = None
+    if profile_columns is not None:
+        profile = TableProfile(*profile_columns)
+        profile.observe(kept)
+    block = encoded if by_record else join_encoded(encoded, indent, ndjson)
+    return scanned, len(encoded), block, profile
 
 
-def csv_to_json(csv_file, json_file, preserve_strings=False, parse_dates=False, pretty=True, encoding='utf-8'):
-    """Convert CSV to JSON with auto-detection of delimiter"""
+def _parallel_ranges(csv_path, encoding, params, jobs):
+    """Record-aligned byte ranges for the data rows, or None if the file can't be split safely"""
+    if is_compressed(csv_path) or not can_split(encoding, params):
+        return None
+    quotechar = None if params['quoting'] == csv.QUOTE_NONE else params['quotechar']
+    chunk_size = chunk_size_for(os.path.getsize(csv_path), jobs)
+    split = split_records(csv_path, chunk_size, quotechar)
+    if split is None:
+        return None
+    _, ranges = split
+    return ranges if len(ranges) > 1 else None
+
+
+def csv_to_json(csv_file, json_file, preserve_strings=False, parse_dates=False, pretty=True, encoding='utf-8',
+                ndjson=False, sample_rows=DEFAULT_SAMPLE_ROWS, jobs=1, select=None, where=None, profile=False,
+                shard_rows=None, shard_bytes=None, sort_by=None, descending=False,
+                sort_memory=DEFAULT_SORT_MEMORY_MB):
+    """
+    Convert CSV to JSON with auto-detection of delimiter
+    
+    Rows are written as they are parsed, so memory use does not depend on
+    the file size. With ndjson=True each row is written as one JSON Lines
+    record instead of an array element.
+    
+    Column types (and date formats, with parse_dates) are inferred once from
+    the first sample_rows rows; each column is then converted by its own
+    fast path, falling back to convert_value for values that don't fit.
+    
+    With jobs > 1 the data rows are split into record-aligned byte ranges
+    that a process pool converts; the encoded chunks are written in order.
+    
+    select (list of column names) and where (list of conditions such as
+    'age >= 30', see row_filters) are applied to the raw strings before any
+    conversion, in the same single pass.
+    
+    With profile, statistics of the columns written (see column_stats) are
+    gathered in that same pass and saved as <json_file>.stats.json.
+    
+    With shard_rows or shard_bytes the output is split into numbered files
+    (name.part-0001.json, ...), each a complete JSON document, and listed
+    in <json_file>.shards.json (see sharding).
+    
+    sort_by (list of column names) orders the records by those columns,
+    typed as they are converted, in descending order with descending; rows
+    are sorted within sort_memory MB, spilling sorted runs to temp files
+    (see external_sort). Only rows matching where are sorted, and sort_by
+    may name columns select leaves out. Sorting converts on one core.
+    """
     csv_path = Path(csv_file)
     json_path = Path(json_file)
     
@@ -52,58 +113,110 @@ def csv_to_json(csv_file, json_file, preserve_strings=False, parse_dates=False,
         raise FileNotFoundError(f"CSV file not found: {csv_file}")
     
     # Detect CSV dialect automatically
-    with open(csv_path, 'r', encoding=encoding) as file:
-        sample = file.read(8192)  # Read larger sample
-        file.seek(0)
-        
+    params = sniff_dialect(csv_path, encoding)
+    table = read_csv(csv_path, encoding, params)
+    stats = table_profile(table.columns, select) if profile else None
+    shards = ShardSet(json_path, shard_rows, shard_bytes) if shard_rows or shard_bytes else None
+    
+    jobs = resolve_jobs(jobs)
+    ranges = _parallel_ranges(csv_path, encoding, params, jobs) if jobs > 1 and not sort_by else None
+    
+    if ranges:
+        # Lock a converter per column from a sample of rows
         try:
-            dialect = csv.Sniffer().sniff(sample)
-            print(f"Detected delimiter: '{dialect.delimiter}'")
-        except csv.Error:
-            print("Could not auto-detect delimiter, using comma")
-            dialect = 'excel'
+            sample = list(itertools.islice(table.rows(), sample_rows))
+        finally:
+            table.close()
+        spec = json_spec(table.columns or [], sample, preserve_strings, parse_dates, select, where)
         
-        reader = csv.DictReader(file, dialect=dialect)
+        print(f"Converting {len(ranges)} chunks with {jobs} worker processes")
+        indent = 4 if pretty else None
+        scanned = 0
+        profile_columns = ([column.name for column in stats.columns], stats.positions) if stats else None
+        tasks = ((str(csv_path), start, end, encoding, params, spec, indent, ndjson, profile_columns,
+                  shards is not None) for start, end in ranges)
+        results = ordered_map(_convert_chunk, tasks, jobs)
         
-        data = []
-        for row in reader:
-            # Convert values to appropriate data types
-            parsed_row = {
-                key: convert_value(value, preserve_strings, parse_dates) 
-                for key, value in row.items()
-            }
-            data.append(parsed_row)
-    
-    # Write JSON output
-    indent = 4 if pretty else None
-    with open(json_path, 'w', encoding=encoding) as outfile:
-        json.dump(data, outfile, indent=indent, ensure_ascii=False)
-    
-    print(f"✓ Converted {len(data)} rows from '{csv_file}' to '{json_file}'")
+        def blocks():
+            nonlocal scanned
+            for chunk_scanned, chunk_count, block, chunk_stats in results:
+                scanned += chunk_scanned
+                if stats:
+                    stats.merge(chunk_stats)
+                yield chunk_count, block
+        
+        if shards:
+            records = itertools.chain.from_iterable(block for _, block in blocks())
+            for outfile, shard_records in shards.split(records, encoding):
+                with JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+                    for text in shard_records:
+                        writer.write_encoded(text)
+            count = shards.rows
+        else:
+            with open_output(json_path, encoding=encoding) as outfile, \
+                    JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+                for chunk_count, block in blocks():
+                    writer.write_block(block, chunk_count)
+            count = writer.count
+    else:
+        filtered = None
+        if sort_by:
+            if jobs > 1:
+                print("Sorted output is converted on one core")
+            # Filter before sorting, so rows --where drops are never keyed or
+            # spilled; --select is applied as records are written, so the
+            # sort can still use columns it drops
+            if where:
+                table = filtered = filter_rows(table, None, where)
+            table = sort_rows(table, sort_by, descending, sort_memory, sample_rows)
+        elif jobs > 1:
+            print("Input is too small, compressed or can't be split safely; converting on one core")
+        count = write_json(table, json_path, encoding, pretty, ndjson, preserve_strings, parse_dates,
+                           sample_rows, select, None if filtered else where, stats, shards)
+        scanned = (filtered or table).scanned
+    
+    if shards:
+        shards.write_manifest(source=csv_path)
+    if stats:
+        stats.write(json_path, source=csv_path)
+    if where:
+        print(f"Kept {count} of {scanned} rows matching: {' AND '.join(where)}")
+    print(f"✓ Converted {count} rows from '{csv_file}' to '{json_file}'")
 
 
-def batch_csv_to_json(csv_files, output_dir=None, **kwargs):
-    """Convert multiple CSV files to JSON"""
+def batch_csv_to_json(csv_files, output_dir=None, incremental=False, jobs=1, summary_path=None, **kwargs):
+    """
+    Convert multiple CSV files to JSON
+    
+    Several files are converted side by side in jobs worker processes (see
+    batch_executor); a single file gets all of them. With incremental,
+    inputs converted before with the same options whose content and
+    outputs haven't changed are skipped (see batch_manifest).
+    """
+    suffix = '.jsonl' if kwargs.get('ndjson') else '.json'
+    file_jobs = jobs if len(csv_files) == 1 else 1
+    tasks = []
     for csv_file in csv_files:
         csv_path = Path(csv_file)
         
-        if not csv_path.exists():
-            print(f"⚠️  Skipping {csv_file}: File not found")
-            continue
-        
         # Determine output path
         if output_dir:
             out_dir = Path(output_dir)
             out_dir.mkdir(parents=True, exist_ok=True)
-            json_file = out_dir / f"{csv_path.stem}.json"
+            json_file = out_dir / replace_suffix(csv_path, suffix).name
         else:
-            json_file = csv_path.with_suffix('.json')
+            json_file = replace_suffix(csv_path, suffix)
         
-        try:
-            print(f"\nProcessing: {csv_path.name}")
-            csv_to_json(csv_file, json_file, **kwargs)
-        except Exception as e:
-            print(f"✗ Error processing {csv_file}: {e}")
+        if kwargs.get('shard_rows') or kwargs.get('shard_bytes'):
+            outputs = [manifest_path(json_file)]
+        else:
+            outputs = [json_file]
+        if kwargs.get('profile'):
+            outputs.append(stats_path(json_file))
+        tasks.append(BatchTask(csv_path, csv_to_json, (csv_file, json_file), dict(kwargs, jobs=file_jobs), outputs))
+    
+    manifests = ManifestSet('CSVtoJSON') if incremental else None
+    return run_batch(tasks, jobs if len(tasks) > 1 else 1, manifests, kwargs, summary_path)
 
 
 def main():
@@ -124,8 +237,35 @@ Examples:
   # Compact output (no pretty printing)
   %(prog)s input.csv -o output.json --no-pretty
   
+  # Convert a large file on 8 cores
+  %(prog)s big.csv -o big.json --jobs 8
+  
+  # Keep two columns of the rows matching all conditions
+  %(prog)s input.csv -o output.json --select name,age --where "age >= 30" --where "country in (US,CA)"
+  
+  # Also write column statistics (nulls, min/max, distinct estimate, type) to output.json.stats.json
+  %(prog)s input.csv -o output.json --profile
+  
+  # Split the output into files of 1M records each (big.part-0001.jsonl, ...) plus big.jsonl.shards.json
+  %(prog)s big.csv -o big.jsonl --ndjson --shard-rows 1000000
+  
+  # Records ordered by country, then by amount, largest first (sorted on disk past 512 MB)
+  %(prog)s sales.csv -o sales.json --sort-by country,amount --desc --sort-memory 512
+  
+  # JSON Lines output (one record per line)
+  %(prog)s input.csv -o output.jsonl --ndjson
+  
+  # Compressed input and output (gzip, bzip2 or xz, by content/extension)
+  %(prog)s feed.csv.gz -o feed.json.xz
+  
   # Batch conversion
   %(prog)s file1.csv file2.csv file3.csv --batch --output-dir json_files
+  
+  # Nightly run: only reconvert inputs that changed (manifest kept in the output dir)
+  %(prog)s feeds/* --batch --output-dir json_files --incremental
+  
+  # Convert 8 files at a time, with a JSON report of times, sizes and errors
+  %(prog)s feeds/* --batch --output-dir json_files --jobs 8 --summary report.json
         '''
     )
     
@@ -135,13 +275,42 @@ Examples:
                        help='Keep all values as strings (no type conversion)')
     parser.add_argument('--parse-dates', action='store_true',
                        help='Attempt to parse and convert date fields')
+    parser.add_argument('--sample-rows', type=int, default=DEFAULT_SAMPLE_ROWS,
+                       help=f'Rows sampled to infer column types (default: {DEFAULT_SAMPLE_ROWS})')
     parser.add_argument('--no-pretty', action='store_false', dest='pretty',
                        help='Compact JSON output (no indentation)')
+    parser.add_argument('--ndjson', action='store_true',
+                       help='Write JSON Lines (one record per line) instead of an array')
+    parser.add_argument('--select', type=parse_column_list,
+                       help='Comma-separated columns to keep, in output order')
+    parser.add_argument('--where', action='append',
+                       help='Keep rows matching a condition on the raw value: "col = x", "col >= 5", '
+                            '"col in (a,b)", "col ~ regex" (repeat to AND)')
+    parser.add_argument('--sort-by', type=parse_column_list, metavar='COL[,COL2]',
+                       help='Order the records by these columns, compared as typed values')
+    parser.add_argument('--desc', action='store_true', help='With --sort-by: descending order')
+    parser.add_argument('--sort-memory', type=int, default=DEFAULT_SORT_MEMORY_MB, metavar='MB',
+                       help=f'Memory for sorting before sorted runs spill to temp files '
+                            f'(default: {DEFAULT_SORT_MEMORY_MB})')
+    parser.add_argument('--profile', action='store_true',
+                       help='Write column statistics gathered during the conversion to <output>.stats.json')
+    parser.add_argument('--shard-rows', type=check_shard_limit, metavar='N',
+                       help='Split the output into files of N records (name.part-0001.json, ...) '
+                            'listed in <output>.shards.json')
+    parser.add_argument('--shard-bytes', type=check_shard_limit, metavar='N',
+                       help='Split the output into files of about N bytes (characters before compression)')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Worker processes for parsing, or for converting several files at once in batch '
+                            'mode (0 = all cores, default: 1)')
     parser.add_argument('--encoding', default='utf-8',
                        help='File encoding (default: utf-8)')
     parser.add_argument('--batch', action='store_true',
                        help='Batch mode: convert multiple CSV files')
     parser.add_argument('--output-dir', help='Output directory for batch mode')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Batch mode: skip inputs unchanged since their last conversion with the same options')
+    parser.add_argument('--summary', metavar='FILE',
+                       help='Batch mode: write a JSON summary of per-file time, bytes in/out and errors (- for stdout)')
     
     args = parser.parse_args()
     
@@ -161,10 +330,23 @@ Examples:
             batch_csv_to_json(
                 args.input,
                 output_dir=args.output_dir,
+                incremental=args.incremental,
+                summary_path=args.summary,
                 preserve_strings=args.preserve_strings,
                 parse_dates=args.parse_dates,
                 pretty=args.pretty,
-                encoding=args.encoding
+                encoding=args.encoding,
+                ndjson=args.ndjson,
+                sample_rows=args.sample_rows,
+                jobs=args.jobs,
+                select=args.select,
+                where=args.where,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes,
+                sort_by=args.sort_by,
+                descending=args.desc,
+                sort_memory=args.sort_memory
             )
         
         # Single file mode
@@ -174,7 +356,7 @@ Examples:
                 sys.exit(1)
             
             csv_file = args.input[0]
-            json_file = args.output or Path(csv_file).with_suffix('.json')
+            json_file = args.output or replace_suffix(csv_file, '.jsonl' if args.ndjson else '.json')
             
             csv_to_json(
                 csv_file,
@@ -182,7 +364,18 @@ Examples:
                 preserve_strings=args.preserve_strings,
                 parse_dates=args.parse_dates,
                 pretty=args.pretty,
-                encoding=args.encoding
+                encoding=args.encoding,
+                ndjson=args.ndjson,
+                sample_rows=args.sample_rows,
+                jobs=args.jobs,
+                select=args.select,
+                where=args.where,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes,
+                sort_by=args.sort_by,
+                descending=args.desc,
+                sort_memory=args.sort_memory
             )
     
     except FileNotFoundError as e:
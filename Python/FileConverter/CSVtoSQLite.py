@@ -0,0 +1,333 @@
+import csv
+import argparse
+import io
+import itertools
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from batch_executor import BatchOutput, BatchTask, run_batch
+from batch_manifest import ManifestSet
+from column_types import DEFAULT_SAMPLE_ROWS
+from compressed_io import is_compressed, strip_compression
+from csv_chunks import can_split, dialect_params, chunk_size_for, read_chunk_text, split_records
+from parallel import ordered_map, resolve_jobs
+from pipeline import HEADER_STRATEGIES, INPUT_FORMATS, read_csv, read_json, sniff_dialect
+from sqlite_store import (IF_EXISTS, LOAD_PRAGMAS, append_database, bulk_load_pragmas, column_kinds, column_names,
+                          create_indexes, create_table, insert_rows, load_table, parse_index_spec, sql_type,
+                          table_bytes)
+
+_JSON_SUFFIXES = ('.json', '.jsonl', '.ndjson')
+
+
+def _load_chunk(task):
+    """Load one record-aligned byte range into a database file of its own (runs in a worker)"""
+    path, start, end, encoding, params, columns, kinds, preserve_strings, parse_dates, chunk_db = task
+
+    text = read_chunk_text(path, start, end, encoding)
+    conn = sqlite3.connect(chunk_db, isolation_level=None)
+    try:
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        create_table(conn, 'chunk', columns, kinds)
+        count = insert_rows(conn, 'chunk', columns, kinds, csv.reader(io.StringIO(text), **params),
+                            preserve_strings, parse_dates)
+    finally:
+        conn.close()
+    return chunk_db, count
+
+
+def _parallel_ranges(csv_path, encoding, params, jobs):
+    """Record-aligned byte ranges for the data rows, or None if the file can't be split safely"""
+    if is_compressed(csv_path) or not can_split(encoding, params):
+        return None
+    quotechar = None if params['quoting'] == csv.QUOTE_NONE else params['quotechar']
+    chunk_size = chunk_size_for(os.path.getsize(csv_path), jobs)
+    split = split_records(csv_path, chunk_size, quotechar)
+    if split is None:
+        return None
+    _, ranges = split
+    return ranges if len(ranges) > 1 else None
+
+
+def _parallel_load(conn, table_name, csv_path, ranges, columns, kinds, jobs, encoding, params, preserve_strings,
+                   parse_dates):
+    """Load byte ranges in worker processes and merge their databases in file order"""
+    print(f"Loading {len(ranges)} chunks with {jobs} worker processes")
+    count = 0
+    with tempfile.TemporaryDirectory(prefix='csv2sqlite_') as tmp_dir:
+        tasks = ((str(csv_path), start, end, encoding, params, columns, kinds, preserve_strings, parse_dates,
+                  os.path.join(tmp_dir, f'chunk{number}.db'))
+                 for number, (start, end) in enumerate(ranges))
+        for chunk_db, _ in ordered_map(_load_chunk, tasks, jobs):
+            count += append_database(conn, table_name, chunk_db, columns, 'chunk')
+            os.remove(chunk_db)
+    return count
+
+
+def default_table_name(input_file):
+    """Table named after the input file: sales.csv.gz -> sales"""
+    return strip_compression(Path(input_file)).stem
+
+
+def csv_to_sqlite(input_file, db_file, table_name=None, if_exists='fail', indexes=None, preserve_strings=False,
+                  parse_dates=False, sample_rows=DEFAULT_SAMPLE_ROWS, encoding='utf-8', delimiter=None,
+                  flatten=False, fields=None, header_strategy='scan', input_format='auto', jobs=1):
+    """
+    Load a CSV or JSON/JSON Lines file into a table of an SQLite database
+
+    Column types are inferred from the first sample_rows rows as CSVtoJSON
+    infers them, and become the columns' declared types (INTEGER, REAL,
+    TEXT, or none for mixed columns). Rows are inserted in large batches
+    with journaling and syncing off, and indexes are built afterwards (see
+    sqlite_store).
+
+    With jobs > 1 a CSV file is split into record-aligned byte ranges that
+    worker processes convert and load into temporary databases; these are
+    merged into the table in file order.
+
+    Args:
+        input_file: CSV, JSON or JSON Lines file (JSON by extension; may be
+            compressed)
+        db_file: SQLite database, created if missing
+        table_name: Table to load (default: the input file's name)
+        if_exists: 'fail', 'replace' or 'append' when the table exists
+        indexes: Lists of columns to index after loading
+        preserve_strings, parse_dates, sample_rows: As for CSVtoJSON
+        encoding: Input encoding
+        delimiter: CSV delimiter (default: detected)
+        flatten, fields, header_strategy, input_format: JSON input options
+            (see JSONtoCSV)
+        jobs: Worker processes for a CSV file (0 = all cores)
+
+    Returns:
+        Number of rows loaded
+    """
+    input_path = Path(input_file)
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+    table_name = table_name or default_table_name(input_path)
+
+    jobs = resolve_jobs(jobs)
+    ranges = None
+    if strip_compression(input_path).suffix.lower() in _JSON_SUFFIXES:
+        table = read_json(input_path, encoding, flatten, fields, header_strategy, input_format)
+    else:
+        if delimiter:
+            params = dict(dialect_params('excel'), delimiter=delimiter)
+        else:
+            params = sniff_dialect(input_path, encoding)
+        table = read_csv(input_path, encoding, params)
+        ranges = _parallel_ranges(input_path, encoding, params, jobs) if jobs > 1 else None
+    if jobs > 1 and not ranges:
+        print("Input is JSON, too small, compressed or can't be split safely; loading on one core")
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    try:
+        if ranges:
+            # Lock the column types from a sample, then let the workers load every row
+            try:
+                if table.columns is None:
+                    raise ValueError("Input has no header row")
+                columns = column_names(table.columns)
+                sample = list(itertools.islice(filter(None, table.rows()), sample_rows))
+            finally:
+                table.close()
+            kinds = column_kinds(sample, len(columns), preserve_strings, parse_dates)
+            with bulk_load_pragmas(conn):
+                create_table(conn, table_name, columns, kinds, if_exists)
+                count = _parallel_load(conn, table_name, input_path, ranges, columns, kinds, jobs, encoding, params,
+                                       preserve_strings, parse_dates)
+                for index_name in create_indexes(conn, table_name, indexes or []):
+                    print(f"Created index {index_name}")
+        else:
+            count, kinds = load_table(table, conn, table_name, if_exists, indexes, preserve_strings, parse_dates,
+                                      sample_rows)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+
+    print("Column types: " + ', '.join(f"{column} {sql_type(kind) or 'ANY'}"
+                                       for column, kind in zip(column_names(table.columns), kinds)))
+    print(f"✓ Loaded {count} rows from '{input_file}' into {db_file}:{table_name} in {elapsed:.2f}s")
+    return count
+
+
+def _load_batch_file(input_file, db_file, **kwargs):
+    """
+    csv_to_sqlite for one file of a batch; its output is its own table, so
+    the summary counts that table's rows and pages, not the whole database
+    """
+    table_name = default_table_name(input_file)
+    count = csv_to_sqlite(input_file, db_file, table_name, **kwargs)
+    conn = sqlite3.connect(db_file)
+    try:
+        size = table_bytes(conn, table_name)
+    finally:
+        conn.close()
+    return BatchOutput([db_file], size or 0, {'table': table_name, 'rows': count})
+
+
+def batch_csv_to_sqlite(input_files, db_file, incremental=False, summary_path=None, **kwargs):
+    """
+    Load multiple files into one database, each into its own table
+
+    Files are loaded one after another (SQLite allows a single writer); a
+    file that fails is reported and the rest are still loaded.
+
+    With incremental, files loaded before with the same options and
+    unchanged since are skipped (see batch_manifest, whose manifest sits
+    next to the database). Only the inputs are compared, not the shared
+    database, which every load changes; a changed file's table is
+    replaced, so if_exists='append' isn't allowed.
+    """
+    if incremental and kwargs.get('if_exists') == 'append':
+        raise ValueError("--incremental reloads a changed file's table whole; it can't be used with "
+                         "--if-exists append")
+    load_kwargs = dict(kwargs, if_exists='replace') if incremental else kwargs
+    manifest_dir = Path(db_file).resolve().parent
+    tasks = [BatchTask(Path(input_file), _load_batch_file, (input_file, db_file), load_kwargs, None, manifest_dir)
+             for input_file in input_files]
+    manifests = ManifestSet('CSVtoSQLite') if incremental else None
+    # Options recorded with each input: those shaping its table, and the database
+    options = {key: value for key, value in kwargs.items() if key != 'jobs'}
+    options['database'] = str(Path(db_file).resolve())
+    return run_batch(tasks, 1, manifests, options, summary_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Bulk-load CSV or JSON files into an SQLite database',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Load into table "sales" of data.db
+  %(prog)s sales.csv -d data.db
+
+  # Choose the table name and replace it if it exists
+  %(prog)s export.csv -d data.db --table orders --if-exists replace
+
+  # Index columns after loading (comma-separate for a composite index)
+  %(prog)s events.jsonl.gz -d data.db --index user_id --index country,city
+
+  # Add rows to an existing table
+  %(prog)s sales_march.csv -d data.db --table sales --if-exists append
+
+  # Load a large CSV on 8 cores
+  %(prog)s big.csv -d data.db --jobs 8
+
+  # Load several files, one table each
+  %(prog)s sales.csv customers.csv products.json -d data.db --batch
+
+  # Nightly run: only reload the files that changed
+  %(prog)s exports/*.csv -d data.db --batch --incremental
+
+Notes:
+  - Column types are inferred as CSVtoJSON infers them; with
+    --preserve-strings every column is TEXT
+  - The load runs without a rollback journal; if it is interrupted the
+    database may be damaged, so load into a fresh file or keep a copy
+        '''
+    )
+
+    parser.add_argument('input', nargs='*', help='CSV or JSON file(s) to load')
+    parser.add_argument('-d', '--database', help='SQLite database file (created if missing)')
+    parser.add_argument('--table', help='Table name (default: input file name)')
+    parser.add_argument('--if-exists', choices=IF_EXISTS, default='fail',
+                       help='What to do when the table exists (default: fail)')
+    parser.add_argument('--index', action='append', type=parse_index_spec, metavar='COLUMNS',
+                       help='Create an index on these comma-separated columns after loading (repeatable)')
+    parser.add_argument('--preserve-strings', action='store_true',
+                       help='Keep all values as strings (no type conversion)')
+    parser.add_argument('--parse-dates', action='store_true',
+                       help='Store dates in ISO format')
+    parser.add_argument('--sample-rows', type=int, default=DEFAULT_SAMPLE_ROWS,
+                       help=f'Rows sampled to infer column types (default: {DEFAULT_SAMPLE_ROWS})')
+    parser.add_argument('--delimiter', '--sep', help='CSV delimiter (default: detected)')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Worker processes for parsing and converting a CSV file (0 = all cores, default: 1)')
+    parser.add_argument('--encoding', default='utf-8', help='File encoding (default: utf-8)')
+    parser.add_argument('--flatten', action='store_true', help='JSON: flatten nested objects')
+    parser.add_argument('--fields', nargs='+', help='JSON: specific fields to load')
+    parser.add_argument('--header-strategy', choices=HEADER_STRATEGIES, default='scan',
+                       help='JSON: find the columns with a key-only first pass (scan) or by buffering rows in a '
+                            'temp file (spill) (default: scan)')
+    parser.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                       help='JSON: one document (json) or one record per line (jsonl) (default: auto)')
+    parser.add_argument('--batch', action='store_true',
+                       help='Batch mode: load multiple files, one table each')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Batch mode: skip inputs unchanged since they were last loaded with the same options')
+    parser.add_argument('--summary', metavar='FILE',
+                       help='Batch mode: write a JSON summary of per-file time, bytes in/out and errors (- for stdout)')
+
+    args = parser.parse_args()
+
+    try:
+        # Interactive mode
+        if not args.input:
+            print("CSV to SQLite Loader")
+            print("=" * 50)
+
+            input_file = input("CSV or JSON file to load: ").strip() or "input.csv"
+            db_file = input("SQLite database: ").strip() or "output.db"
+            table_name = input(f"Table name [{default_table_name(input_file)}]: ").strip() or None
+
+            csv_to_sqlite(input_file, db_file, table_name, encoding=args.encoding)
+            return
+
+        db_file = args.database or strip_compression(Path(args.input[0])).with_suffix('.db')
+        options = dict(
+            if_exists=args.if_exists,
+            indexes=args.index,
+            preserve_strings=args.preserve_strings,
+            parse_dates=args.parse_dates,
+            sample_rows=args.sample_rows,
+            encoding=args.encoding,
+            delimiter=args.delimiter,
+            flatten=args.flatten,
+            fields=args.fields,
+            header_strategy=args.header_strategy,
+            input_format=args.input_format,
+            jobs=args.jobs
+        )
+
+        # Batch mode
+        if args.batch:
+            if args.table:
+                print("Error: --table names a single table; batch mode names each after its file")
+                sys.exit(1)
+            batch_csv_to_sqlite(args.input, db_file, incremental=args.incremental, summary_path=args.summary,
+                                **options)
+
+        # Single file mode
+        else:
+            if len(args.input) > 1:
+                print("Error: Specify only one input file, or use --batch for multiple files")
+                sys.exit(1)
+            csv_to_sqlite(args.input[0], db_file, args.table, **options)
+
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except csv.Error as e:
+        print(f"CSV parsing error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON - {e}", file=sys.stderr)
+        sys.exit(1)
+    except sqlite3.Error as e:
+        print(f"SQLite error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
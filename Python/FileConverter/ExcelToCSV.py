@@ -1,13 +1,75 @@
-import pandas as pd
 import argparse
+import os
 import sys
+import time
 from pathlib import Path
 
+from batch_executor import BatchTask, run_batch
+from batch_manifest import ManifestSet
+from column_stats import table_profile
+from parallel import ordered_map, resolve_jobs
+from pipeline import profile_rows, sheet_table, write_csv
+from sharding import ShardSet, check_shard_limit
+from xlsx_reader import get_sheet, open_workbook, sheet_window
 
-def excel_to_csv(excel_file, output_csv=None, sheet_name=None, sheet_index=0, encoding='utf-8', delimiter=',', all_sheets=False):
+# Workbooks opened in each worker process, keyed by path; opening one parses
+# its shared strings, which every sheet a worker exports can then reuse
+_worker_workbooks = {}
+
+
+def _write_sheet(ws, csv_output, encoding, delimiter, window, profile=False, source=None, shard_rows=None,
+                 shard_bytes=None):
+    """
+    Stream a worksheet to a CSV file, or to shards of it with shard_rows or
+    shard_bytes, with profile also its column statistics
+
+    Returns (rows, seconds, files written).
+    """
+    start = time.perf_counter()
+    table = sheet_table(ws, window)
+    if profile:
+        stats = table_profile(table.columns)
+        table = profile_rows(table, stats)
+    shards = ShardSet(csv_output, shard_rows, shard_bytes) if shard_rows or shard_bytes else None
+    rows = write_csv(table, csv_output, encoding, delimiter, lineterminator=os.linesep, shards=shards)
+    if shards is not None:
+        shards.write_manifest(source)
+        outputs = shards.outputs()
+    else:
+        outputs = [Path(csv_output)]
+    if profile:
+        outputs.append(stats.write(csv_output, source))
+    return rows, time.perf_counter() - start, outputs
+
+
+def _export_sheet(task):
+    """Export one sheet of a workbook (runs in a worker)"""
+    excel_path, sheet_index, csv_output, encoding, delimiter, window, profile, shard_rows, shard_bytes = task
+    wb = _worker_workbooks.get(excel_path)
+    if wb is None:
+        wb = _worker_workbooks[excel_path] = open_workbook(excel_path)
+    return _write_sheet(get_sheet(wb, sheet_index=sheet_index), csv_output, encoding, delimiter, window, profile,
+                        excel_path, shard_rows, shard_bytes)
+
+
+def _print_timings(timings, elapsed):
+    """Per-sheet summary for --all-sheets, slowest first"""
+    width = max(len(name) for name, _, _ in timings)
+    print(f"\nSheet timings ({elapsed:.2f}s total):")
+    for name, rows, seconds in sorted(timings, key=lambda t: -t[2]):
+        print(f"  {name:<{width}}  {rows:>10,} rows  {seconds:8.2f}s")
+
+
+def excel_to_csv(excel_file, output_csv=None, sheet_name=None, sheet_index=0, encoding='utf-8', delimiter=',',
+                 all_sheets=False, jobs=1, cell_range=None, skip_rows=0, max_rows=None, profile=False,
+                 shard_rows=None, shard_bytes=None):
     """
     Convert Excel file to CSV
     
+    Sheets are streamed row by row from a read-only workbook straight into
+    the CSV, so memory does not grow with the sheet size; the output is the
+    same as pandas' read_excel(...).to_csv(index=False) (see xlsx_reader).
+    
     Args:
         excel_file: Path to Excel input file
         output_csv: Path to CSV output file (optional)
@@ -16,72 +78,130 @@ def excel_to_csv(excel_file, output_csv=None, sheet_name=None, sheet_index=0, en
         encoding: Output encoding
         delimiter: CSV delimiter
         all_sheets: Convert all sheets to separate CSV files
+        jobs: Worker processes for all_sheets, one sheet each at a time
+            (0 = all cores)
+        cell_range: Only export this block, e.g. 'B2:H5000' or 'B:H'
+            (its first row is the header)
+        skip_rows: Rows to skip before the header
+        max_rows: Export at most this many data rows
+        profile: Also write statistics of each CSV's columns, gathered in
+            the same pass, to <csv>.stats.json (see column_stats)
+        shard_rows, shard_bytes: Split each CSV into numbered files
+            (name.part-0001.csv, ...) of this many rows or characters, each
+            with the header, listed in <csv>.shards.json (see sharding)
+    
+    Returns:
+        List of the files written: the CSV files (or their shards and
+        manifest), and with profile their statistics
+    
+    Reading stops as soon as the selected rows are done, so a sample of a
+    huge sheet costs no more than its own rows.
     """
     excel_path = Path(excel_file)
     
     if not excel_path.exists():
         raise FileNotFoundError(f"Excel file not found: {excel_file}")
     
-    # Read Excel file
+    window = sheet_window(cell_range, skip_rows, max_rows)
     if all_sheets:
-        # Read all sheets
-        excel_data = pd.read_excel(excel_path, sheet_name=None, engine='openpyxl')
+        return _export_all_sheets(excel_path, encoding, delimiter, jobs, window, profile, shard_rows, shard_bytes)
+    
+    wb = open_workbook(excel_path)
+    try:
+        # Read specific sheet
+        ws = get_sheet(wb, sheet_name=sheet_name or None, sheet_index=sheet_index)
+        if sheet_name:
+            print(f"Reading sheet: {sheet_name}")
+        else:
+            print(f"Reading sheet at index: {sheet_index}")
         
-        print(f"Found {len(excel_data)} sheet(s) in {excel_file}")
+        # Determine output path
+        if output_csv:
+            csv_path = Path(output_csv)
+        else:
+            csv_path = excel_path.with_suffix('.csv')
+        
+        # Export to CSV
+        rows, _, outputs = _write_sheet(ws, csv_path, encoding, delimiter, window, profile, excel_path,
+                                        shard_rows, shard_bytes)
+    finally:
+        wb.close()
+    
+    print(f"✓ Converted {rows} rows → {csv_path}")
+    return outputs
+
+
+def _export_all_sheets(excel_path, encoding, delimiter, jobs, window, profile=False, shard_rows=None,
+                       shard_bytes=None):
+    """Export every sheet to <stem>_<sheet>.csv, one sheet per worker process with jobs > 1"""
+    start = time.perf_counter()
+    wb = open_workbook(excel_path)
+    try:
+        sheet_names = wb.sheetnames
+        print(f"Found {len(sheet_names)} sheet(s) in {excel_path}")
         
-        for sheet_name, df in excel_data.items():
+        csv_outputs = []
+        for sheet_name in sheet_names:
             # Generate output filename
             safe_sheet_name = "".join(c if c.isalnum() or c in (' ', '_', '-') else '_' for c in sheet_name)
-            csv_output = excel_path.parent / f"{excel_path.stem}_{safe_sheet_name}.csv"
-            
-            df.to_csv(csv_output, index=False, encoding=encoding, sep=delimiter)
-            print(f"✓ Converted sheet '{sheet_name}' ({len(df)} rows) → {csv_output.name}")
+            csv_outputs.append(excel_path.parent / f"{excel_path.stem}_{safe_sheet_name}.csv")
         
-        return
-    
-    # Read specific sheet
-    if sheet_name:
-        df = pd.read_excel(excel_path, sheet_name=sheet_name, engine='openpyxl')
-        print(f"Reading sheet: {sheet_name}")
-    else:
-        df = pd.read_excel(excel_path, sheet_name=sheet_index, engine='openpyxl')
-        print(f"Reading sheet at index: {sheet_index}")
-    
-    # Determine output path
-    if output_csv:
-        csv_path = Path(output_csv)
-    else:
-        csv_path = excel_path.with_suffix('.csv')
-    
-    # Export to CSV
-    df.to_csv(csv_path, index=False, encoding=encoding, sep=delimiter)
+        jobs = min(resolve_jobs(jobs), len(sheet_names))
+        if jobs > 1:
+            wb.close()
+            print(f"Exporting with {jobs} worker processes")
+            tasks = [(str(excel_path), index, str(csv_output), encoding, delimiter, window, profile, shard_rows,
+                      shard_bytes) for index, csv_output in enumerate(csv_outputs)]
+            # Every sheet is queued at once so idle workers pick up the next one
+            results = ordered_map(_export_sheet, tasks, jobs, window=len(tasks))
+        else:
+            results = (_write_sheet(ws, csv_output, encoding, delimiter, window, profile, excel_path, shard_rows,
+                                    shard_bytes) for ws, csv_output in zip(wb.worksheets, csv_outputs))
+        
+        timings = []
+        outputs = []
+        for sheet_name, csv_output, (rows, seconds, files) in zip(sheet_names, csv_outputs, results):
+            print(f"✓ Converted sheet '{sheet_name}' ({rows} rows) → {csv_output.name}")
+            timings.append((sheet_name, rows, seconds))
+            outputs += files
+    finally:
+        wb.close()
     
-    print(f"✓ Converted {len(df)} rows → {csv_path}")
+    if timings:
+        _print_timings(timings, time.perf_counter() - start)
+    return outputs
 
 
-def batch_excel_to_csv(excel_files, output_dir=None, **kwargs):
-    """Convert multiple Excel files to CSV"""
+def batch_excel_to_csv(excel_files, output_dir=None, incremental=False, jobs=1, summary_path=None, **kwargs):
+    """
+    Convert multiple Excel files to CSV
+    
+    Several files are converted side by side in jobs worker processes (see
+    batch_executor); a single file gets all of them. With incremental,
+    inputs converted before with the same options whose content and
+    outputs haven't changed are skipped (see batch_manifest).
+    """
+    file_jobs = jobs if len(excel_files) == 1 else 1
+    tasks = []
     for excel_file in excel_files:
         excel_path = Path(excel_file)
         
-        if not excel_path.exists():
-            print(f"⚠️  Skipping {excel_file}: File not found")
-            continue
+        # Override output path for batch mode
+        if output_dir and not kwargs.get('all_sheets'):
+            out_dir = Path(output_dir)
+            out_dir.mkdir(parents=True, exist_ok=True)
+            csv_file = out_dir / f"{excel_path.stem}.csv"
+            manifest_dir = out_dir
+        else:
+            csv_file = None
+            manifest_dir = excel_path.parent
         
-        try:
-            print(f"\nProcessing: {excel_path.name}")
-            
-            # Override output path for batch mode
-            if output_dir and not kwargs.get('all_sheets'):
-                out_dir = Path(output_dir)
-                out_dir.mkdir(parents=True, exist_ok=True)
-                csv_file = out_dir / f"{excel_path.stem}.csv"
-                excel_to_csv(excel_file, output_csv=csv_file, **kwargs)
-            else:
-                excel_to_csv(excel_file, **kwargs)
-                
-        except Exception as e:
-            print(f"✗ Error processing {excel_file}: {e}")
+        # excel_to_csv() returns the CSV files it wrote
+        tasks.append(BatchTask(excel_path, excel_to_csv, (excel_file, csv_file), dict(kwargs, jobs=file_jobs),
+                               manifest_dir=manifest_dir))
+    
+    manifests = ManifestSet('ExcelToCSV') if incremental else None
+    return run_batch(tasks, jobs if len(tasks) > 1 else 1, manifests, kwargs, summary_path)
 
 
 def main():
@@ -102,11 +222,33 @@ Examples:
   # Convert all sheets to separate CSV files
   %(prog)s data.xlsx --all-sheets
   
+  # Export a large workbook's sheets on 8 cores
+  %(prog)s data.xlsx --all-sheets --jobs 8
+  
+  # Header plus the first 1000 rows, or just a block of the sheet
+  %(prog)s data.xlsx -o sample.csv --max-rows 1000
+  %(prog)s data.xlsx -o block.csv --range B2:H5000
+  
+  # Also write column statistics (nulls, min/max, distinct estimate, type) to output.csv.stats.json
+  %(prog)s data.xlsx -o output.csv --profile
+  
+  # Split a huge sheet into CSV files of 500k rows, each with the header, plus output.csv.shards.json
+  %(prog)s data.xlsx -o output.csv --shard-rows 500000
+  
+  # Gzip-compressed output (also .bz2, .xz)
+  %(prog)s data.xlsx -o output.csv.gz
+  
   # Custom delimiter (tab-separated)
   %(prog)s data.xlsx -o output.tsv --delimiter "\\t"
   
   # Batch conversion
   %(prog)s file1.xlsx file2.xlsx --batch --output-dir csv_files
+  
+  # Nightly run: only reconvert inputs that changed (manifest kept in the output dir)
+  %(prog)s feeds/* --batch --output-dir csv_files --incremental
+  
+  # Convert 8 files at a time, with a JSON report of times, sizes and errors
+  %(prog)s feeds/* --batch --output-dir csv_files --jobs 8 --summary report.json
         '''
     )
     
@@ -115,10 +257,28 @@ Examples:
     parser.add_argument('--sheet', dest='sheet_name', help='Sheet name to convert')
     parser.add_argument('--sheet-index', type=int, default=0, help='Sheet index to convert (0-based, default: 0)')
     parser.add_argument('--all-sheets', action='store_true', help='Convert all sheets to separate CSV files')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Worker processes for --all-sheets, one sheet each, or for converting several files '
+                             'at once in batch mode (0 = all cores, default: 1)')
+    parser.add_argument('--range', dest='cell_range',
+                        help='Only export this cell range, e.g. B2:H5000 or B:H (first row is the header)')
+    parser.add_argument('--skip-rows', type=int, default=0, help='Rows to skip before the header (default: 0)')
+    parser.add_argument('--max-rows', type=int, help='Export at most this many data rows')
     parser.add_argument('--delimiter', '--sep', default=',', help='CSV delimiter (default: comma)')
     parser.add_argument('--encoding', default='utf-8', help='Output encoding (default: utf-8)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write column statistics gathered during the conversion to <output>.stats.json')
+    parser.add_argument('--shard-rows', type=check_shard_limit, metavar='N',
+                        help='Split each CSV into files of N rows (name.part-0001.csv, ...) '
+                             'listed in <output>.shards.json')
+    parser.add_argument('--shard-bytes', type=check_shard_limit, metavar='N',
+                        help='Split each CSV into files of about N bytes (characters before compression)')
     parser.add_argument('--batch', action='store_true', help='Batch mode: convert multiple Excel files')
     parser.add_argument('--output-dir', help='Output directory for batch mode')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Batch mode: skip inputs unchanged since their last conversion with the same options')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='Batch mode: write a JSON summary of per-file time, bytes in/out and errors (- for stdout)')
     
     args = parser.parse_args()
     
@@ -172,11 +332,20 @@ Examples:
             batch_excel_to_csv(
                 args.input,
                 output_dir=args.output_dir,
+                incremental=args.incremental,
+                summary_path=args.summary,
                 sheet_name=args.sheet_name,
                 sheet_index=args.sheet_index,
                 encoding=args.encoding,
                 delimiter=args.delimiter,
-                all_sheets=args.all_sheets
+                all_sheets=args.all_sheets,
+                jobs=args.jobs,
+                cell_range=args.cell_range,
+                skip_rows=args.skip_rows,
+                max_rows=args.max_rows,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes
             )
         
         # Single file mode
@@ -192,7 +361,14 @@ Examples:
                 sheet_index=args.sheet_index,
                 encoding=args.encoding,
                 delimiter=args.delimiter,
-                all_sheets=args.all_sheets
+                all_sheets=args.all_sheets,
+                jobs=args.jobs,
+                cell_range=args.cell_range,
+                skip_rows=args.skip_rows,
+                max_rows=args.max_rows,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes
             )
     
     except FileNotFoundError as e:
@@ -1,26 +1,168 @@
 import json
 import csv
 import argparse
+import io
+import os
+import pickle
 import sys
+import tempfile
 from pathlib import Path
 
+from batch_executor import BatchTask, run_batch
+from batch_manifest import ManifestSet
+from column_stats import TableProfile, stats_path, table_profile
+from compressed_io import is_compressed, open_file, replace_suffix
+from csv_chunks import can_split, chunk_size_for, read_chunk_text, split_records
+from external_sort import DEFAULT_SORT_MEMORY_MB, sort_rows
+from json_stream import json_line_error
+from parallel import ordered_map, resolve_jobs
+from pipeline import (BATCH_ROWS, HEADER_STRATEGIES, INPUT_FORMATS, batched, csv_text, filter_rows,
+                      json_fieldnames, make_flattener, process_record, profile_rows, read_json, resolve_json_format,
+                      unspill_records, write_csv)
+from row_filters import parse_column_list
+from sharding import ShardSet, check_shard_limit, manifest_path
 
-def flatten_dict(d, parent_key='', sep='_'):
-    """Flatten nested dictionary"""
-    items = []
-    for k, v in d.items():
-        new_key = f"{parent_key}{sep}{k}" if parent_key else k
-        if isinstance(v, dict):
-            items.extend(flatten_dict(v, new_key, sep=sep).items())
-        elif isinstance(v, list):
-            # Convert list to string representation
-            items.append((new_key, str(v)))
+# Flatteners reused by every chunk a worker process converts, keyed by fields
+_worker_flatteners = {}
+
+
+def _convert_lines(task):
+    """
+    Decode and process one line-aligned byte range of a JSON Lines file (runs in a worker)
+    
+    mode 'keys' collects the keys of the rows, 'spill' also returns the rows
+    pickled back to back, and 'csv' returns the rows as CSV text for the
+    given fieldnames (with profile, also their column statistics; with
+    by_row, a list of the CSV text of each row). Only fields (if given) are
+    ever serialised or flattened.
+    
+    Returns (lines, rows, keys, skipped, payload, error, profile): payload
+    holds the pickled rows or CSV text, skipped lists the types of non-dict
+    items and error is (line, message, column) for the first line that
+    doesn't decode, counted from the start of the range.
+    """
+    path, start, end, encoding, flatten, fields, mode, fieldnames, delimiter, profile, by_row = task
+    flattener = None
+    if flatten:
+        flattener = _worker_flatteners.get(fields)
+        if flattener is None:
+            flattener = _worker_flatteners[fields] = make_flattener(flatten, fields)
+    
+    lines = read_chunk_text(path, start, end, encoding).split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    keys = set()
+    skipped = []
+    count = 0
+    out = io.StringIO() if mode == 'csv' else io.BytesIO()
+    if mode == 'csv':
+        writer = csv.DictWriter(out, fieldnames=fieldnames, delimiter=delimiter, extrasaction='ignore')
+        stats = TableProfile(fieldnames) if profile else None
+        written = []
+        ends = [0]
+    
+    for lineno, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as e:
+            return len(lines), count, keys, skipped, None, (lineno, e.msg, e.colno), None
+        if not isinstance(item, dict):
+            skipped.append(type(item))
+            continue
+        row = process_record(item, flattener, fields)
+        count += 1
+        if mode == 'csv':
+            writer.writerow(row)
+            if by_row:
+                ends.append(out.tell())
+            if stats is not None:
+                written.append([csv_text(row.get(key)) for key in fieldnames])
+                if len(written) >= BATCH_ROWS:
+                    stats.observe(written)
+                    written = []
+            continue
+        keys.update(row)
+        if mode == 'spill':
+            pickle.dump(row, out, pickle.HIGHEST_PROTOCOL)
+    
+    payload = out.getvalue()
+    if mode == 'csv' and by_row:
+        payload = [payload[start:end] for start, end in zip(ends, ends[1:])]
+    if mode == 'csv' and stats is not None:
+        stats.observe(written)
+        return len(lines), count, keys, skipped, payload, None, stats
+    return len(lines), count, keys, skipped, payload, None, None
+
+
+def _parallel_ranges(json_path, encoding, jobs):
+    """Line-aligned byte ranges of a JSON Lines file, or None if it can't be split safely"""
+    if is_compressed(json_path) or not can_split(encoding, {}):
+        return None
+    # JSON strings can't hold a raw newline, so every newline ends a record
+    chunk_size = chunk_size_for(os.path.getsize(json_path), jobs)
+    _, ranges = split_records(json_path, chunk_size, quotechar=None, skip_records=0)
+    return ranges if len(ranges) > 1 else None
+
+
+def _convert_chunks(json_path, encoding, ranges, jobs, flatten, fields, mode, fieldnames=None, delimiter=',',
+                    profile=False, by_row=False):
+    """Run _convert_lines over the ranges in a process pool; yields (rows, skipped, keys, payload, profile) in order"""
+    tasks = ((str(json_path), start, end, encoding, flatten, tuple(fields) if fields else None,
+              mode, fieldnames, delimiter, profile, by_row) for start, end in ranges)
+    line_offset = 0
+    for lines, count, keys, skipped, payload, error, stats in ordered_map(_convert_lines, tasks, jobs):
+        if mode != 'csv':
+            for item_type in skipped:
+                print(f"Warning: Skipping non-dict item: {item_type}")
+        if error:
+            lineno, message, colno = error
+            raise json_line_error(line_offset + lineno, message, colno)
+        line_offset += lines
+        yield count, len(skipped), keys, payload, stats
+
+
+def _parallel_fields(json_path, encoding, ranges, jobs, flatten, fields, spill):
+    """First pass over a JSON Lines file in worker processes, spilling rows if spill is a file"""
+    all_fields = set()
+    row_count = 0
+    items = 0
+    mode = 'keys' if spill is None else 'spill'
+    for count, skipped, keys, payload, _ in _convert_chunks(json_path, encoding, ranges, jobs, flatten, fields,
+                                                           mode):
+        all_fields.update(keys)
+        row_count += count
+        items += count + skipped
+        if spill is not None:
+            spill.write(payload)
+    if not items:
+        raise ValueError("JSON file is empty!")
+    return all_fields, row_count
+
+
+def _observed_records(records, stats, fieldnames):
+    """Spilled records, one by one, with each batch's CSV cells passed to stats (if any) first"""
+    for batch in batched(records):
+        if stats is not None:
+            stats.observe([[csv_text(record.get(key)) for key in fieldnames] for record in batch])
+        yield from batch
+
+
+def _chunk_texts(chunks, stats, by_row):
+    """CSV text of converted chunks (of each row, with by_row), merging their statistics into stats (if any)"""
+    for _, _, _, text, chunk_stats in chunks:
+        if stats is not None:
+            stats.merge(chunk_stats)
+        if by_row:
+            yield from text
         else:
-            items.append((new_key, v))
-    return dict(items)
+            yield text
 
 
-def json_to_csv(json_file, csv_file, flatten=False, fields=None, encoding='utf-8', delimiter=','):
+def json_to_csv(json_file, csv_file, flatten=False, fields=None, encoding='utf-8', delimiter=',',
+                header_strategy='scan', input_format='auto', jobs=1, profile=False, shard_rows=None,
+                shard_bytes=None, sort_by=None, descending=False, sort_memory=DEFAULT_SORT_MEMORY_MB):
     """
     Convert JSON to CSV
     
@@ -31,6 +173,23 @@ def json_to_csv(json_file, csv_file, flatten=False, fields=None, encoding='utf-8
         fields: List of fields to include (None = all fields)
         encoding: File encoding
         delimiter: CSV delimiter
+        header_strategy: How the header is found before rows are written:
+            'scan' reads the input twice (keys only, then rows),
+            'spill' reads it once and buffers rows in a temp file
+        input_format: 'json' (one document), 'jsonl' (one record per line)
+            or 'auto' (by extension, else by looking at the first lines)
+        jobs: Worker processes for JSON Lines input (0 = all cores); lines
+            are decoded, flattened and written to CSV text in the workers
+        profile: Also write statistics of the CSV columns, gathered in the
+            same pass, to <csv_file>.stats.json (see column_stats)
+        shard_rows, shard_bytes: Split the output into numbered CSV files
+            (name.part-0001.csv, ...) of this many rows or characters, each
+            with the header, listed in <csv_file>.shards.json (see sharding)
+        sort_by: Columns to order the rows by, compared as CSVtoJSON would
+            type them (see external_sort); sorting converts on one core
+        descending: Sort in descending order
+        sort_memory: MB of rows held while sorting before sorted runs are
+            spilled to temp files
     """
     json_path = Path(json_file)
     csv_path = Path(csv_file)
@@ -38,97 +197,129 @@ def json_to_csv(json_file, csv_file, flatten=False, fields=None, encoding='utf-8
     if not json_path.exists():
         raise FileNotFoundError(f"JSON file not found: {json_file}")
     
-    # Load JSON data
-    with open(json_path, 'r', encoding=encoding) as f:
-        data = json.load(f)
+    if header_strategy not in HEADER_STRATEGIES:
+        raise ValueError(f"Unknown header strategy: {header_strategy} (choose from {', '.join(HEADER_STRATEGIES)})")
     
-    # Validate data structure
-    if not data:
-        raise ValueError("JSON file is empty!")
+    input_format = resolve_json_format(json_path, encoding, input_format)
+    fields = list(fields) if fields else None
+    shards = ShardSet(csv_path, shard_rows, shard_bytes) if shard_rows or shard_bytes else None
     
-    if not isinstance(data, list):
-        # If root is a dict, try to find a list inside
-        if isinstance(data, dict):
-            # Look for list values
-            list_values = [v for v in data.values() if isinstance(v, list)]
-            if list_values:
-                print(f"Warning: Root is a dict. Using first list value ({len(list_values[0])} items)")
-                data = list_values[0]
-            else:
-                print("Warning: Root is a dict, not a list. Wrapping in list.")
-                data = [data]
+    jobs = resolve_jobs(jobs)
+    ranges = None
+    if jobs > 1 and sort_by:
+        print("Sorted output is converted on one core")
+    elif jobs > 1:
+        if input_format == 'jsonl':
+            ranges = _parallel_ranges(json_path, encoding, jobs)
+        if ranges:
+            print(f"Converting {len(ranges)} chunks with {jobs} worker processes")
+        elif input_format == 'json':
+            print("A JSON document is parsed on one core; use JSON Lines input to convert in parallel")
         else:
-            raise ValueError("JSON root must be a list of objects or a dict containing a list")
+            print("Input is too small, compressed or can't be split safely; converting on one core")
+    
+    if not ranges:
+        # Fields are pushed into flattening, so the sort columns are read
+        # too and dropped once the rows are sorted
+        extra = [column for column in sort_by or [] if fields and column not in fields]
+        table = read_json(json_path, encoding, flatten, fields and fields + extra, header_strategy, input_format)
+        if sort_by:
+            table = sort_rows(table, sort_by, descending, sort_memory)
+        if extra:
+            kept = [column for column in table.columns if column in fields]
+            if not kept:
+                raise ValueError(f"None of the specified fields exist in data: {fields}")
+            table = filter_rows(table, kept)
+        if profile:
+            stats = table_profile(table.columns)
+            table = profile_rows(table, stats)
+        row_count = write_csv(table, csv_path, encoding, delimiter, shards=shards)
+        if shards is not None:
+            shards.write_manifest(source=json_path)
+        if profile:
+            stats.write(csv_path, source=json_path)
+        print(f"✓ Converted {row_count} rows with {len(table.columns)} fields → {csv_path}")
+        return
     
-    # Flatten if requested
     if flatten:
         print("Flattening nested JSON structures...")
-        data = [flatten_dict(item) if isinstance(item, dict) else item for item in data]
     
-    # Handle nested objects by converting to strings
-    processed_data = []
-    for item in data:
-        if not isinstance(item, dict):
-            print(f"Warning: Skipping non-dict item: {type(item)}")
-            continue
+    # The header is the union of all keys, so it is only known after every
+    # record has been seen; neither strategy keeps the records in memory
+    spill = tempfile.TemporaryFile() if header_strategy == 'spill' else None
+    try:
+        all_fields, row_count = _parallel_fields(json_path, encoding, ranges, jobs, flatten, fields, spill)
+        fieldnames = json_fieldnames(all_fields, row_count, fields)
+        stats = TableProfile(fieldnames) if profile else None
         
-        processed_item = {}
-        for key, value in item.items():
-            if isinstance(value, (dict, list)):
-                # Convert complex types to JSON string
-                processed_item[key] = json.dumps(value, ensure_ascii=False)
+        # Spilled records are written here; otherwise the workers produce
+        # the CSV text (a row at a time for a sharded output to split)
+        if spill is not None:
+            spill.seek(0)
+            items = _observed_records(unspill_records(spill), stats, fieldnames)
+        else:
+            chunks = _convert_chunks(json_path, encoding, ranges, jobs, flatten, fields, 'csv', tuple(fieldnames),
+                                     delimiter, profile, shards is not None)
+            items = _chunk_texts(chunks, stats, shards is not None)
+        
+        def write(csvfile, items):
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=delimiter, extrasaction='ignore')
+            writer.writeheader()
+            if spill is not None:
+                writer.writerows(items)
             else:
-                processed_item[key] = value
-        processed_data.append(processed_item)
-    
-    if not processed_data:
-        raise ValueError("No valid data rows to export")
-    
-    # Determine fieldnames
-    all_fields = set()
-    for item in processed_data:
-        all_fields.update(item.keys())
-    
-    if fields:
-        # Use specified fields only
-        fieldnames = [f for f in fields if f in all_fields]
-        if not fieldnames:
-            raise ValueError(f"None of the specified fields exist in data: {fields}")
-        print(f"Exporting fields: {', '.join(fieldnames)}")
-    else:
-        fieldnames = sorted(all_fields)
-    
-    # Write CSV
-    with open(csv_path, 'w', newline='', encoding=encoding) as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=delimiter, extrasaction='ignore')
-        writer.writeheader()
-        writer.writerows(processed_data)
+                for text in items:
+                    csvfile.write(text)
+        
+        # Write CSV
+        if shards is None:
+            with open_file(csv_path, 'w', newline='', encoding=encoding) as csvfile:
+                write(csvfile, items)
+        else:
+            for csvfile, shard_items in shards.split(items, encoding, newline=''):
+                write(csvfile, shard_items)
+            shards.write_manifest(source=json_path)
+    finally:
+        if spill is not None:
+            spill.close()
     
-    print(f"✓ Converted {len(processed_data)} rows with {len(fieldnames)} fields → {csv_path}")
+    if stats is not None:
+        stats.write(csv_path, source=json_path)
+    print(f"✓ Converted {row_count} rows with {len(fieldnames)} fields → {csv_path}")
 
 
-def batch_json_to_csv(json_files, output_dir=None, **kwargs):
-    """Convert multiple JSON files to CSV"""
+def batch_json_to_csv(json_files, output_dir=None, incremental=False, jobs=1, summary_path=None, **kwargs):
+    """
+    Convert multiple JSON files to CSV
+    
+    Several files are converted side by side in jobs worker processes (see
+    batch_executor); a single file gets all of them. With incremental,
+    inputs converted before with the same options whose content and
+    outputs haven't changed are skipped (see batch_manifest).
+    """
+    file_jobs = jobs if len(json_files) == 1 else 1
+    tasks = []
     for json_file in json_files:
         json_path = Path(json_file)
         
-        if not json_path.exists():
-            print(f"⚠️  Skipping {json_file}: File not found")
-            continue
-        
         # Determine output path
         if output_dir:
             out_dir = Path(output_dir)
             out_dir.mkdir(parents=True, exist_ok=True)
-            csv_file = out_dir / f"{json_path.stem}.csv"
+            csv_file = out_dir / replace_suffix(json_path, '.csv').name
         else:
-            csv_file = json_path.with_suffix('.csv')
+            csv_file = replace_suffix(json_path, '.csv')
         
-        try:
-            print(f"\nProcessing: {json_path.name}")
-            json_to_csv(json_file, csv_file, **kwargs)
-        except Exception as e:
-            print(f"✗ Error processing {json_file}: {e}")
+        if kwargs.get('shard_rows') or kwargs.get('shard_bytes'):
+            outputs = [manifest_path(csv_file)]
+        else:
+            outputs = [csv_file]
+        if kwargs.get('profile'):
+            outputs.append(stats_path(csv_file))
+        tasks.append(BatchTask(json_path, json_to_csv, (json_file, csv_file), dict(kwargs, jobs=file_jobs), outputs))
+    
+    manifests = ManifestSet('JSONtoCSV') if incremental else None
+    return run_batch(tasks, jobs if len(tasks) > 1 else 1, manifests, kwargs, summary_path)
 
 
 def main():
@@ -149,13 +340,41 @@ Examples:
   # Custom delimiter (tab-separated)
   %(prog)s input.json -o output.tsv --delimiter "\\t"
   
+  # Read the input once, buffering rows in a temp file (e.g. slow network storage)
+  %(prog)s input.json -o output.csv --header-strategy spill
+  
+  # JSON Lines input (one object per line), decoded by 8 worker processes
+  %(prog)s events.jsonl -o events.csv --jobs 8
+  
+  # Also write column statistics (nulls, min/max, distinct estimate, type) to output.csv.stats.json
+  %(prog)s input.json -o output.csv --profile
+  
+  # Split the output into CSV files of 1M rows, each with the header, plus events.csv.shards.json
+  %(prog)s events.jsonl -o events.csv --shard-rows 1000000
+  
+  # Rows ordered by user id, newest first within each user (sorted on disk past 256 MB)
+  %(prog)s events.jsonl -o events.csv --sort-by user_id,timestamp --desc
+  
+  # Compressed feed in, compressed CSV out
+  %(prog)s events.jsonl.bz2 -o events.csv.gz
+  
   # Batch conversion
   %(prog)s file1.json file2.json file3.json --batch --output-dir csv_files
+  
+  # Nightly run: only reconvert inputs that changed (manifest kept in the output dir)
+  %(prog)s feeds/* --batch --output-dir csv_files --incremental
+  
+  # Convert 8 files at a time, with a JSON report of times, sizes and errors
+  %(prog)s feeds/* --batch --output-dir csv_files --jobs 8 --summary report.json
 
 Notes:
   - JSON root should be a list of objects
+  - JSON Lines input is detected from the .jsonl/.ndjson extension or the
+    first lines; force it with --input-format
   - Nested objects will be converted to JSON strings (or flattened with --flatten)
   - Arrays within objects will be converted to strings
+  - .gz, .bz2 and .xz files are decompressed (and outputs compressed) while
+    streaming; compressed input is converted on one core
         '''
     )
     
@@ -165,8 +384,34 @@ Notes:
     parser.add_argument('--fields', nargs='+', help='Specific fields to export')
     parser.add_argument('--delimiter', '--sep', default=',', help='CSV delimiter (default: comma)')
     parser.add_argument('--encoding', default='utf-8', help='File encoding (default: utf-8)')
+    parser.add_argument('--header-strategy', choices=HEADER_STRATEGIES, default='scan',
+                        help='Find the CSV header with a key-only first pass (scan) or by '
+                             'buffering rows in a temp file (spill) (default: scan)')
+    parser.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                        help='Input is one JSON document (json) or one record per line (jsonl) '
+                             '(default: auto)')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='Worker processes for JSON Lines input, or for converting several files at once '
+                             'in batch mode (0 = all cores, default: 1)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write column statistics gathered during the conversion to <output>.stats.json')
+    parser.add_argument('--sort-by', type=parse_column_list, metavar='COL[,COL2]',
+                        help='Order the rows by these columns, compared as typed values')
+    parser.add_argument('--desc', action='store_true', help='With --sort-by: descending order')
+    parser.add_argument('--sort-memory', type=int, default=DEFAULT_SORT_MEMORY_MB, metavar='MB',
+                        help=f'Memory for sorting before sorted runs spill to temp files '
+                             f'(default: {DEFAULT_SORT_MEMORY_MB})')
+    parser.add_argument('--shard-rows', type=check_shard_limit, metavar='N',
+                        help='Split the output into CSV files of N rows (name.part-0001.csv, ...) '
+                             'listed in <output>.shards.json')
+    parser.add_argument('--shard-bytes', type=check_shard_limit, metavar='N',
+                        help='Split the output into CSV files of about N bytes (characters before compression)')
     parser.add_argument('--batch', action='store_true', help='Batch mode: convert multiple JSON files')
     parser.add_argument('--output-dir', help='Output directory for batch mode')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Batch mode: skip inputs unchanged since their last conversion with the same options')
+    parser.add_argument('--summary', metavar='FILE',
+                        help='Batch mode: write a JSON summary of per-file time, bytes in/out and errors (- for stdout)')
     
     args = parser.parse_args()
     
@@ -186,10 +431,21 @@ Notes:
             batch_json_to_csv(
                 args.input,
                 output_dir=args.output_dir,
+                incremental=args.incremental,
+                summary_path=args.summary,
                 flatten=args.flatten,
                 fields=args.fields,
                 encoding=args.encoding,
-                delimiter=args.delimiter
+                delimiter=args.delimiter,
+                header_strategy=args.header_strategy,
+                input_format=args.input_format,
+                jobs=args.jobs,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes,
+                sort_by=args.sort_by,
+                descending=args.desc,
+                sort_memory=args.sort_memory
             )
         
         # Single file mode
@@ -199,7 +455,7 @@ Notes:
                 sys.exit(1)
             
             json_file = args.input[0]
-            csv_file = args.output or Path(json_file).with_suffix('.csv')
+            csv_file = args.output or replace_suffix(json_file, '.csv')
             
             json_to_csv(
                 json_file,
@@ -207,7 +463,16 @@ Notes:
                 flatten=args.flatten,
                 fields=args.fields,
                 encoding=args.encoding,
-                delimiter=args.delimiter
+                delimiter=args.delimiter,
+                header_strategy=args.header_strategy,
+                input_format=args.input_format,
+                jobs=args.jobs,
+                profile=args.profile,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes,
+                sort_by=args.sort_by,
+                descending=args.desc,
+                sort_memory=args.sort_memory
             )
     
     except FileNotFoundError as e:
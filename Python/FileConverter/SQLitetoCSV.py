@@ -0,0 +1,206 @@
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+from compressed_io import open_output, strip_compression
+from json_stream import JSON_LINES_SUFFIXES, JsonRecordWriter
+from pipeline import write_csv
+from sharding import ShardSet, check_shard_limit
+from sqlite_store import query_table, quote_identifier
+
+FORMATS = ('csv', 'json')
+
+
+def list_tables(conn):
+    return [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+
+def write_records(table, path, encoding='utf-8', pretty=True, ndjson=False, shards=None):
+    """Write a Table of typed values (not CSV strings) as JSON, or JSON shards; returns the record count"""
+    indent = 4 if pretty else None
+    try:
+        columns = table.columns
+        if shards is not None:
+            for outfile, rows in shards.split(table.rows(), encoding):
+                with JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+                    for row in rows:
+                        writer.write(dict(zip(columns, row)))
+            return shards.rows
+        with open_output(path, encoding=encoding) as outfile, \
+                JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+            for row in table.rows():
+                writer.write(dict(zip(columns, row)))
+        return writer.count
+    finally:
+        table.close()
+
+
+def sqlite_to_file(db_file, output_file, table_name=None, query=None, to_format=None, encoding='utf-8',
+                   delimiter=',', pretty=True, ndjson=None, shard_rows=None, shard_bytes=None):
+    """
+    Export a table or query result from an SQLite database to CSV or JSON
+
+    Rows are fetched from the cursor a batch at a time and written as they
+    arrive, so memory use does not depend on the result size. JSON values
+    keep their SQLite types (INTEGER, REAL, TEXT, NULL).
+
+    Args:
+        db_file: SQLite database
+        output_file: CSV or JSON/JSON Lines file (may end in .gz/.bz2/.xz)
+        table_name: Table or view to export; default: the only one in the
+            database
+        query: SQL query to export instead of a table
+        to_format: 'csv' or 'json' (default: by extension, else csv)
+        encoding: Output encoding
+        delimiter: CSV delimiter
+        pretty: Indent JSON output
+        ndjson: Write JSON Lines (default: for a .jsonl/.ndjson output)
+        shard_rows, shard_bytes: Split the output into numbered files of
+            this many rows or characters (see sharding)
+
+    Returns:
+        Number of rows exported
+    """
+    if not Path(db_file).exists():
+        raise FileNotFoundError(f"Database not found: {db_file}")
+
+    suffix = strip_compression(Path(output_file)).suffix.lower()
+    if to_format is None:
+        to_format = 'json' if suffix in ('.json',) + JSON_LINES_SUFFIXES else 'csv'
+    if ndjson is None:
+        ndjson = suffix in JSON_LINES_SUFFIXES
+
+    # Read-only, so an export can run next to a writer
+    conn = sqlite3.connect(f"{Path(db_file).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        if query is None:
+            if table_name is None:
+                tables = list_tables(conn)
+                if len(tables) != 1:
+                    raise ValueError(f"Database has {len(tables)} tables; choose one with --table "
+                                     f"({', '.join(tables) or 'none'}) or use --query")
+                table_name = tables[0]
+            query = f"SELECT * FROM {quote_identifier(table_name)}"
+
+        table = query_table(conn, query)
+        shards = ShardSet(output_file, shard_rows, shard_bytes) if shard_rows or shard_bytes else None
+        if to_format == 'json':
+            count = write_records(table, output_file, encoding, pretty, ndjson, shards)
+        else:
+            count = write_csv(table, output_file, encoding, delimiter, shards=shards)
+    finally:
+        conn.close()
+    
+    if shards is not None:
+        shards.write_manifest(source=db_file)
+
+    print(f"✓ Exported {count} rows from {db_file} to '{output_file}'")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export SQLite tables or query results to CSV or JSON',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Export a table
+  %(prog)s data.db --table sales -o sales.csv
+
+  # Export a query as JSON Lines, compressed
+  %(prog)s data.db --query "SELECT country, sum(total) AS total FROM sales GROUP BY country" -o totals.jsonl.gz
+
+  # Tab-separated output
+  %(prog)s data.db --table sales -o sales.tsv --delimiter $'\\t'
+
+  # Files of 1M rows each (sales.part-0001.csv, ...) listed in sales.csv.shards.json
+  %(prog)s data.db --table sales -o sales.csv --shard-rows 1000000
+
+  # List the tables
+  %(prog)s data.db --list
+        '''
+    )
+
+    parser.add_argument('database', nargs='?', help='SQLite database file')
+    parser.add_argument('-o', '--output', help='Output file path (default: <table>.csv)')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--table', help='Table or view to export (default: the only table)')
+    source.add_argument('--query', help='SQL query whose result to export')
+    source.add_argument('--list', action='store_true', help='List the tables and views, and exit')
+    parser.add_argument('--to', dest='to_format', choices=FORMATS,
+                       help='Output format (default: by extension, else csv)')
+    parser.add_argument('--delimiter', '--sep', default=',', help='CSV delimiter (default: comma)')
+    parser.add_argument('--no-pretty', action='store_false', dest='pretty',
+                       help='Compact JSON output (no indentation)')
+    parser.add_argument('--ndjson', action='store_true', default=None,
+                       help='Write JSON Lines (default for .jsonl/.ndjson)')
+    parser.add_argument('--shard-rows', type=check_shard_limit, metavar='N',
+                       help='Split the output into files of N rows (name.part-0001.csv, ...) '
+                            'listed in <output>.shards.json')
+    parser.add_argument('--shard-bytes', type=check_shard_limit, metavar='N',
+                       help='Split the output into files of about N bytes (characters before compression)')
+    parser.add_argument('--encoding', default='utf-8', help='Output encoding (default: utf-8)')
+
+    args = parser.parse_args()
+
+    try:
+        # Interactive mode
+        if not args.database:
+            print("SQLite to CSV Exporter")
+            print("=" * 50)
+
+            db_file = input("SQLite database: ").strip() or "input.db"
+            table_name = input("Table to export: ").strip() or None
+            output_file = input("CSV or JSON file for output: ").strip() or f"{table_name or 'output'}.csv"
+
+            sqlite_to_file(db_file, output_file, table_name, encoding=args.encoding)
+
+        elif args.list:
+            if not Path(args.database).exists():
+                raise FileNotFoundError(f"Database not found: {args.database}")
+            conn = sqlite3.connect(args.database)
+            try:
+                for name in list_tables(conn):
+                    count = conn.execute(f"SELECT count(*) FROM {quote_identifier(name)}").fetchone()[0]
+                    print(f"{name}: {count} rows")
+            finally:
+                conn.close()
+
+        else:
+            if args.output:
+                output_file = args.output
+            elif args.table:
+                output_file = f"{args.table}.json" if args.to_format == 'json' else f"{args.table}.csv"
+            else:
+                print("Error: Give an output file with -o")
+                sys.exit(1)
+
+            sqlite_to_file(
+                args.database,
+                output_file,
+                table_name=args.table,
+                query=args.query,
+                to_format=args.to_format,
+                encoding=args.encoding,
+                delimiter=args.delimiter,
+                pretty=args.pretty,
+                ndjson=args.ndjson,
+                shard_rows=args.shard_rows,
+                shard_bytes=args.shard_bytes
+            )
+
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except sqlite3.Error as e:
+        print(f"SQLite error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
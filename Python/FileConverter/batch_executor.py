@@ -0,0 +1,247 @@
+"""
+Batch runner shared by the batch_* functions of the converter and media scripts
+
+Each input file is one BatchTask. run_batch() converts them one by one,
+or with jobs > 1 in a pool of worker processes, one file per worker:
+  - an exception fails only its own file, and a worker that dies outright
+    (e.g. a crash in a native library) only fails the file it was on;
+    the files that were in flight with it are rerun one per process
+  - each worker's output is captured and printed in input order, so the
+    log reads the same whatever the number of jobs
+  - with a ManifestSet, inputs unchanged since their last conversion are
+    skipped (see batch_manifest)
+
+It ends with a one-line tally. With summary_path, a JSON summary is also
+written: per file the status, wall time, bytes read and written, and the
+error, if any.
+"""
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from batch_manifest import input_fingerprint
+from parallel import resolve_jobs
+
+# func(*args, **kwargs) converts input_path. outputs lists the files it
+# writes, or is None when func returns that list (or a BatchOutput).
+# manifest_dir is the directory whose manifest records the input (default:
+# the first output's).
+BatchTask = namedtuple('BatchTask', 'input_path func args kwargs outputs manifest_dir',
+                       defaults=((), None, None, None))
+
+# What a func returns when its output isn't the whole of its output files,
+# e.g. one table of a database shared by the batch: bytes_out is the size
+# of its part, and details (a dict) is added to the file's summary entry
+BatchOutput = namedtuple('BatchOutput', 'outputs bytes_out details', defaults=(None,))
+
+# status is 'ok', 'error', 'skipped' (up to date) or 'missing' (no input)
+_Result = namedtuple('_Result', 'status seconds outputs error log bytes_out details', defaults=(None, None))
+
+
+def _run_task(task, capture):
+    """Run one task, turning any exception into an 'error' result"""
+    log = io.StringIO() if capture else None
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if capture:
+            stack.enter_context(contextlib.redirect_stdout(log))
+            stack.enter_context(contextlib.redirect_stderr(log))
+        try:
+            returned = task.func(*task.args, **(task.kwargs or {}))
+        except Exception as e:
+            return _Result('error', time.perf_counter() - start, [], f"{type(e).__name__}: {e}",
+                           log.getvalue() if capture else '')
+    bytes_out = details = None
+    if isinstance(returned, BatchOutput):
+        returned, bytes_out, details = returned
+    outputs = task.outputs if task.outputs is not None else returned or []
+    return _Result('ok', time.perf_counter() - start, [str(output) for output in outputs], None,
+                   log.getvalue() if capture else '', bytes_out, details)
+
+
+def _worker(task):
+    return _run_task(task, capture=True)
+
+
+def _run_alone(task):
+    """Run a task in a process of its own, so a crash fails only this task"""
+    with ProcessPoolExecutor(1) as pool:
+        try:
+            return pool.submit(_worker, task).result()
+        except BrokenProcessPool:
+            return _Result('error', 0.0, [], "Worker process died", '')
+
+
+def _pool_results(tasks, jobs):
+    """Run tasks in a process pool, yielding their results in task order"""
+    tasks = iter(tasks)
+    pending = deque()
+    pool = ProcessPoolExecutor(jobs)
+    try:
+        while True:
+            # Keep every worker busy with one task queued behind it
+            while len(pending) < jobs * 2:
+                task = next(tasks, None)
+                if task is None:
+                    break
+                pending.append((task, pool.submit(_worker, task)))
+            if not pending:
+                return
+
+            task, future = pending.popleft()
+            try:
+                yield future.result()
+            except BrokenProcessPool:
+                # The dead worker took the pool down; tasks that hadn't
+                # finished are rerun one per process to find the culprit
+                pool.shutdown(wait=False, cancel_futures=True)
+                retry = [(task, future)] + list(pending)
+                pending.clear()
+                for task, future in retry:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        yield future.result()
+                    else:
+                        yield _run_alone(task)
+                pool = ProcessPoolExecutor(jobs)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _manifest_dir(task):
+    if task.manifest_dir is not None:
+        return task.manifest_dir
+    if task.outputs:
+        return Path(task.outputs[0]).parent
+    return Path(task.input_path).parent
+
+
+def _default_banner(input_path):
+    return f"\nProcessing: {Path(input_path).name}"
+
+
+def run_batch(tasks, jobs=1, manifests=None, options=None, summary_path=None, banner=_default_banner):
+    """
+    Run a batch of conversions and report on them
+
+    Args:
+        tasks: BatchTask per input, in the order they are reported
+        jobs: Files converted at once in worker processes (0 = all cores);
+            1 converts them in this process with output shown live
+        manifests: ManifestSet for incremental runs, or None
+        options: Conversion options recorded in the manifest with each input
+        summary_path: Write a JSON summary here ('-' for stdout)
+        banner: Function giving the line(s) printed before an input's output
+
+    Returns:
+        The summary (dict)
+    """
+    jobs = resolve_jobs(jobs)
+    tasks = list(tasks)
+    start = time.perf_counter()
+    records = []
+
+    # Inputs that need converting, and their fingerprints for the manifest
+    queued = []
+    fingerprints = {}
+    for task in tasks:
+        record = {'input': str(task.input_path), 'status': None, 'seconds': 0.0,
+                  'bytes_in': 0, 'bytes_out': 0, 'outputs': [], 'error': None}
+        records.append(record)
+        if not os.path.exists(task.input_path):
+            record['status'] = 'missing'
+            continue
+        record['bytes_in'] = _size(task.input_path)
+        if manifests is not None:
+            manifest = manifests.get(_manifest_dir(task))
+            if manifest.is_current(task.input_path, options):
+                record['status'] = 'skipped'
+                continue
+            fingerprints[len(queued)] = input_fingerprint(task.input_path)
+        queued.append(task)
+
+    if jobs > 1 and len(queued) > 1:
+        jobs = min(jobs, len(queued))
+        print(f"Converting {len(queued)} files with {jobs} worker processes")
+        results = _pool_results(queued, jobs)
+    else:
+        results = None
+
+    try:
+        converted = 0
+        for task, record in zip(tasks, records):
+            if record['status'] == 'missing':
+                print(f"⚠️  Skipping {task.input_path}: File not found")
+                continue
+            if record['status'] == 'skipped':
+                print(f"\nUp to date: {Path(task.input_path).name}")
+                continue
+
+            fingerprint = fingerprints.get(converted)
+            converted += 1
+            print(banner(task.input_path))
+            if results is None:
+                sys.stdout.flush()
+                result = _run_task(task, capture=False)
+            else:
+                result = next(results)
+                print(result.log, end='')
+            if result.status == 'error':
+                print(f"✗ Error processing {task.input_path}: {result.error}")
+
+            if result.bytes_out is None:
+                bytes_out = sum(_size(output) for output in result.outputs)
+            else:
+                bytes_out = result.bytes_out
+            record.update(status=result.status, seconds=round(result.seconds, 3), outputs=result.outputs,
+                          bytes_out=bytes_out, error=result.error)
+            record.update(result.details or {})
+            if manifests is not None and result.status == 'ok':
+                manifests.get(_manifest_dir(task)).record(task.input_path, options, result.outputs, fingerprint)
+    finally:
+        if results is not None:
+            results.close()
+        if manifests is not None:
+            manifests.save()
+
+    elapsed = time.perf_counter() - start
+    counts = {status: sum(1 for record in records if record['status'] == status)
+              for status in ('ok', 'error', 'skipped', 'missing')}
+    summary = {
+        'jobs': jobs,
+        'seconds': round(elapsed, 3),
+        'counts': counts,
+        'bytes_in': sum(record['bytes_in'] for record in records if record['status'] in ('ok', 'error')),
+        'bytes_out': sum(record['bytes_out'] for record in records),
+        'files': records,
+    }
+
+    tally = f"{counts['ok']} converted, {counts['error']} failed"
+    if counts['skipped']:
+        tally += f", {counts['skipped']} up to date"
+    if counts['missing']:
+        tally += f", {counts['missing']} not found"
+    print(f"\nBatch: {tally} in {elapsed:.2f}s")
+
+    if summary_path:
+        text = json.dumps(summary, indent=2)
+        if summary_path == '-':
+            print(text)
+        else:
+            with open(summary_path, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+            print(f"Summary written to {summary_path}")
+    return summary
@@ -0,0 +1,138 @@
+"""
+Manifest of earlier batch conversions, for skipping inputs that haven't changed
+
+A JSON file in each output directory records, per script and input file,
+the input's size, mtime and SHA-256, the conversion options and the
+outputs written. An input is up to date, make-style, when all of these
+hold:
+  - it was converted before by the same script with the same options
+  - every output recorded for it still exists
+  - its size and mtime are unchanged, or (mtime only changed, e.g. after
+    a copy or checkout) its content hash is unchanged
+
+Anything else rebuilds it. Hashes are only computed for files that are
+converted, or whose mtime moved without their size changing.
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_NAME = '.convert_manifest.json'
+MANIFEST_VERSION = 1
+_HASH_BLOCK = 1024 * 1024
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_fingerprint(path):
+    """Size, mtime and content hash of an input, as the manifest records them"""
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(path)}
+
+
+def _normalise(options):
+    """Options as they read back from JSON (tuples become lists, paths strings)"""
+    return json.loads(json.dumps(options, sort_keys=True, default=str))
+
+
+class BatchManifest:
+    """
+    Conversions one script has made into one output directory
+
+    Args:
+        directory: Output directory holding the manifest file
+        tool: Name of the converting script; entries of other scripts
+            sharing the directory are kept but never matched
+    """
+
+    def __init__(self, directory, tool):
+        self.path = Path(directory) / MANIFEST_NAME
+        self.tool = tool
+        self.data = {'version': MANIFEST_VERSION, 'files': {}}
+        self.changed = False
+        if self.path.exists():
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️  Ignoring unreadable manifest {self.path}: {e}")
+            else:
+                if data.get('version') == MANIFEST_VERSION:
+                    self.data = data
+        self.entries = self.data['files'].setdefault(tool, {})
+
+    @staticmethod
+    def _key(input_path):
+        return str(Path(input_path).resolve())
+
+    def is_current(self, input_path, options):
+        """True if input_path was converted with these options and nothing has changed since"""
+        entry = self.entries.get(self._key(input_path))
+        if entry is None or entry['options'] != _normalise(options):
+            return False
+        if not all(os.path.exists(output) for output in entry['outputs']):
+            return False
+
+        stat = os.stat(input_path)
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns']:
+            return True
+        if file_sha256(input_path) != entry['sha256']:
+            return False
+        # Same content under a new mtime: remember it so the next run skips the hash
+        entry['mtime_ns'] = stat.st_mtime_ns
+        self.changed = True
+        return True
+
+    def record(self, input_path, options, outputs, fingerprint):
+        """
+        Remember a finished conversion
+
+        fingerprint is input_fingerprint() taken before converting, so an
+        input modified during the conversion is rebuilt next time.
+        """
+        self.entries[self._key(input_path)] = dict(
+            fingerprint,
+            options=_normalise(options),
+            outputs=[str(Path(output).resolve()) for output in outputs],
+        )
+        self.changed = True
+
+    def save(self):
+        """Write the manifest if anything changed, replacing the old file atomically"""
+        if not self.changed:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+class ManifestSet:
+    """The manifests of every output directory a batch writes to, loaded on first use"""
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.manifests = {}
+
+    def get(self, directory):
+        key = Path(directory).resolve()
+        manifest = self.manifests.get(key)
+        if manifest is None:
+            manifest = self.manifests[key] = BatchManifest(key, self.tool)
+        return manifest
+
+    def save(self):
+        for manifest in self.manifests.values():
+            manifest.save()
@@ -0,0 +1,176 @@
+"""
+Deterministic synthetic datasets for benchmark.py
+
+Every dataset is generated from a seeded random.Random, so the same name,
+row count and seed always give byte-identical files; a benchmark run can
+be compared with a baseline taken on another day or machine.
+
+  narrow    6 mixed columns: id, int, float, word, bool, date
+  wide      id plus 59 columns cycling int, float, word and sentence
+  numeric   id plus 19 int and float columns
+  text      id plus 7 long text columns with commas, quotes, newlines
+            and non-ASCII characters (every value needs CSV quoting)
+  dates     id plus 8 date columns, two in each DATE_FORMATS layout
+  nested    JSON only: records with nested objects and arrays, the case
+            --flatten is for
+
+Files are written as CSV, a JSON array, JSON Lines or a workbook; a
+workbook holds no more rows than fit on its one sheet (EXCEL_MAX_ROWS - 1
+under the header), since ExcelToCSV reads a single sheet.
+"""
+import contextlib
+import csv
+import itertools
+import os
+import random
+from pathlib import Path
+
+from json_stream import JsonRecordWriter
+from pipeline import Table, batched, write_excel
+from xlsx_stream import EXCEL_MAX_ROWS
+
+# Bumped whenever generated content changes, so cached files are rebuilt
+GENERATOR_VERSION = 1
+FORMATS = ('csv', 'json', 'jsonl', 'xlsx')
+
+_WORDS = ('alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf', 'hotel', 'india', 'juliett',
+          'kilo', 'lima', 'mike', 'november', 'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango',
+          'uniform', 'victor', 'whiskey', 'xray', 'yankee', 'zulu', 'Zürich', 'São Paulo', 'Kraków', '東京')
+_DATE_LAYOUTS = ('{y:04d}-{m:02d}-{d:02d}', '{d:02d}/{m:02d}/{y:04d}', '{m:02d}/{d:02d}/{y:04d}',
+                 '{y:04d}-{m:02d}-{d:02d} {H:02d}:{M:02d}:{S:02d}')
+
+
+def _word(rng, index):
+    return rng.choice(_WORDS)
+
+
+def _int(rng, index):
+    return rng.randint(-1000000, 1000000)
+
+
+def _float(rng, index):
+    return round(rng.uniform(-10000, 10000), 4)
+
+
+def _bool(rng, index):
+    return rng.random() < 0.5
+
+
+def _sentence(rng, index):
+    words = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(4, 16)))
+    return f'{words}, "{rng.choice(_WORDS)}"\n{rng.randint(0, 999)}'
+
+
+def _date(layout):
+    def value(rng, index):
+        return layout.format(y=rng.randint(1990, 2030), m=rng.randint(1, 12), d=rng.randint(1, 28),
+                             H=rng.randint(0, 23), M=rng.randint(0, 59), S=rng.randint(0, 59))
+    return value
+
+
+def _id(rng, index):
+    return index
+
+
+def _nested(rng, index):
+    return {
+        'id': index,
+        'user': {
+            'name': f"{rng.choice(_WORDS)} {rng.choice(_WORDS)}",
+            'age': rng.randint(18, 90),
+            'address': {'city': rng.choice(_WORDS), 'zip': f"{rng.randint(0, 99999):05d}"},
+        },
+        'tags': rng.sample(_WORDS, rng.randint(0, 4)),
+        'scores': {'math': _float(rng, index), 'art': _int(rng, index)},
+        'active': _bool(rng, index),
+        'joined': _date(_DATE_LAYOUTS[0])(rng, index),
+    }
+
+
+DATASETS = {
+    'narrow': [('id', _id), ('quantity', _int), ('price', _float), ('city', _word), ('active', _bool),
+               ('created', _date(_DATE_LAYOUTS[0]))],
+    'wide': [('id', _id)] + [(f"col_{index}", generator) for index, generator in
+                             zip(range(1, 60), itertools.cycle((_int, _float, _word, _sentence)))],
+    'numeric': [('id', _id)] + [(f"{'int' if index % 2 else 'float'}_{index}", _int if index % 2 else _float)
+                                for index in range(1, 20)],
+    'text': [('id', _id)] + [(f"text_{index}", _sentence) for index in range(1, 8)],
+    'dates': [('id', _id)] + [(f"date_{index}", _date(_DATE_LAYOUTS[index % len(_DATE_LAYOUTS)]))
+                              for index in range(8)],
+    'nested': None,
+}
+
+
+def dataset_formats(name):
+    """The file formats a dataset can be written as"""
+    return ('json', 'jsonl') if DATASETS[name] is None else FORMATS
+
+
+def dataset_records(name, rows, seed=0):
+    """Yield the rows of a dataset as dicts of typed values"""
+    if name not in DATASETS:
+        raise ValueError(f"Unknown dataset: {name} (choose from {', '.join(DATASETS)})")
+    rng = random.Random(f"{name}:{seed}")
+    columns = DATASETS[name]
+    for index in range(1, rows + 1):
+        if columns is None:
+            yield _nested(rng, index)
+        else:
+            yield {column: generator(rng, index) for column, generator in columns}
+
+
+def csv_cell(value):
+    """A typed value as CSVtoJSON reads it back"""
+    if value is None:
+        return ''
+    if value is True or value is False:
+        return 'true' if value else 'false'
+    return str(value)
+
+
+def _csv_rows(name, rows, seed):
+    for record in dataset_records(name, rows, seed):
+        yield [csv_cell(value) for value in record.values()]
+
+
+def write_dataset(name, rows, path, seed=0):
+    """Write a dataset in the format given by the file's extension; returns the path"""
+    path = Path(path)
+    file_format = path.suffix.lower().lstrip('.')
+    if file_format not in dataset_formats(name):
+        raise ValueError(f"Dataset {name} can't be written as {file_format}")
+    columns = [column for column, _ in DATASETS[name]] if DATASETS[name] else None
+
+    if file_format == 'xlsx':
+        # Only the first sheet is read back, so rows beyond it aren't generated
+        rows = min(rows, EXCEL_MAX_ROWS - 1)
+        write_excel(Table(columns, batched(_csv_rows(name, rows, seed))), path, engine='stream')
+    elif file_format == 'csv':
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(_csv_rows(name, rows, seed))
+    else:
+        with open(path, 'w', encoding='utf-8') as f, \
+                JsonRecordWriter(f, indent=None, ndjson=file_format == 'jsonl') as writer:
+            for record in dataset_records(name, rows, seed):
+                writer.write(record)
+    return path
+
+
+def dataset_path(data_dir, name, rows, file_format, seed=0):
+    """Cached file of a dataset, generated on first use"""
+    path = Path(data_dir) / f"{name}-{rows}-s{seed}-v{GENERATOR_VERSION}.{file_format}"
+    if not path.exists():
+        Path(data_dir).mkdir(parents=True, exist_ok=True)
+        partial = path.with_name(path.stem + '.partial' + path.suffix)
+        print(f"Generating {path.name}...")
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            write_dataset(name, rows, partial, seed)
+        partial.replace(path)
+    return path
+
+
+def dataset_rows(rows, file_format):
+    """Data rows a converter reads from a dataset file of this many rows"""
+    return min(rows, EXCEL_MAX_ROWS - 1) if file_format == 'xlsx' else rows
@@ -0,0 +1,298 @@
+import argparse
+import contextlib
+import fnmatch
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from bench_data import DATASETS, dataset_formats, dataset_path, dataset_rows
+from parallel import peak_rss_bytes, resolve_jobs
+
+DEFAULT_ROWS = ('10k', '100k')
+DEFAULT_THRESHOLD = 0.10
+RESULTS_VERSION = 1
+
+# Case name: (input format, module, function, keyword arguments, output suffix);
+# a 'jobs' of None is replaced by --jobs
+CASES = {
+    'CSVtoJSON/serial': ('csv', 'CSVtoJSON', 'csv_to_json', {}, '.json'),
+    'CSVtoJSON/parallel': ('csv', 'CSVtoJSON', 'csv_to_json', {'jobs': None}, '.json'),
+    'CSVtoJSON/ndjson': ('csv', 'CSVtoJSON', 'csv_to_json', {'ndjson': True, 'pretty': False}, '.jsonl'),
+    'CSVtoJSON/parse-dates': ('csv', 'CSVtoJSON', 'csv_to_json', {'parse_dates': True}, '.json'),
+    'JSONtoCSV/json': ('json', 'JSONtoCSV', 'json_to_csv', {}, '.csv'),
+    'JSONtoCSV/spill': ('json', 'JSONtoCSV', 'json_to_csv', {'header_strategy': 'spill'}, '.csv'),
+    'JSONtoCSV/jsonl': ('jsonl', 'JSONtoCSV', 'json_to_csv', {}, '.csv'),
+    'JSONtoCSV/parallel': ('jsonl', 'JSONtoCSV', 'json_to_csv', {'jobs': None}, '.csv'),
+    'CSVtoExcel/stream': ('csv', 'CSVtoExcel', 'csv_to_excel', {'engine': 'stream'}, '.xlsx'),
+    'CSVtoExcel/openpyxl': ('csv', 'CSVtoExcel', 'csv_to_excel', {'engine': 'openpyxl'}, '.xlsx'),
+    'ExcelToCSV/serial': ('xlsx', 'ExcelToCSV', 'excel_to_csv', {}, '.csv'),
+}
+
+
+def parse_rows(text):
+    """Row count of a --rows value: 10000, 10k or 10M"""
+    multipliers = {'k': 1000, 'm': 1000000}
+    text = text.strip().lower()
+    number = int(text[:-1]) * multipliers[text[-1]] if text[-1:] in multipliers else int(text)
+    if number < 1:
+        raise ValueError("row count must be at least 1")
+    return number
+
+
+def select_cases(patterns):
+    """Case names matching any of the patterns (e.g. 'CSVtoJSON/*'), in CASES order"""
+    if not patterns:
+        return list(CASES)
+    names = [name for name in CASES if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+    if not names:
+        raise ValueError(f"No case matches {', '.join(patterns)} (see --list)")
+    return names
+
+
+def _run_case(conn, module_name, function_name, args, kwargs):
+    """Run one conversion (in a fresh process) and send back (seconds, peak RSS) or an error"""
+    try:
+        func = getattr(importlib.import_module(module_name), function_name)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            func(*args, **kwargs)
+            elapsed = time.perf_counter() - started
+        # Worker processes have exited by now; the largest one may outgrow the parent
+        peaks = [peak for peak in (peak_rss_bytes(), peak_rss_bytes(children=True)) if peak is not None]
+        conn.send((elapsed, max(peaks) if peaks else None, None))
+    except Exception as e:
+        conn.send((None, None, f"{type(e).__name__}: {e}"))
+    finally:
+        conn.close()
+
+
+def measure(case, input_path, jobs, dataset):
+    """Time one conversion in a spawned process; returns (seconds, peak RSS bytes)"""
+    _, module_name, function_name, kwargs, suffix = CASES[case]
+    kwargs = dict(kwargs)
+    if 'jobs' in kwargs:
+        kwargs['jobs'] = jobs
+    if DATASETS[dataset] is None and module_name == 'JSONtoCSV':
+        kwargs['flatten'] = True
+
+    # A process of its own, so peak RSS isn't shared; not a pool worker, since
+    # those can't start the converter's own worker processes
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        receiver, sender = ctx.Pipe(duplex=False)
+        output_path = Path(tmp_dir) / f"output{suffix}"
+        process = ctx.Process(target=_run_case, args=(sender, module_name, function_name,
+                                                      (str(input_path), str(output_path)), kwargs))
+        process.start()
+        sender.close()
+        try:
+            elapsed, peak, error = receiver.recv()
+        except EOFError:
+            elapsed, peak, error = None, None, "process exited without a result"
+        process.join()
+    if error:
+        raise RuntimeError(f"{case} on {input_path.name} failed: {error}")
+    return elapsed, peak
+
+
+def run_benchmarks(cases, datasets, row_counts, data_dir, jobs=0, repeat=1, seed=0):
+    """
+    Run every case on every dataset it applies to, at every row count
+
+    Inputs come from bench_data (generated once into data_dir and reused).
+    Each measurement is the fastest of repeat runs, each in a fresh
+    process. Returns a list of result dicts.
+    """
+    jobs = resolve_jobs(jobs)
+    results = []
+    for rows in row_counts:
+        for dataset in datasets:
+            for case in cases:
+                input_format = CASES[case][0]
+                if input_format not in dataset_formats(dataset):
+                    continue
+                input_path = dataset_path(data_dir, dataset, rows, input_format, seed)
+                runs = [measure(case, input_path, jobs, dataset) for _ in range(repeat)]
+                elapsed, peak = min(runs, key=lambda run: run[0])
+                converted = dataset_rows(rows, input_format)
+                size = os.path.getsize(input_path)
+                result = {
+                    'case': case,
+                    'dataset': dataset,
+                    'rows': converted,
+                    'input_bytes': size,
+                    'seconds': round(elapsed, 4),
+                    'rows_per_s': round(converted / elapsed, 1) if elapsed else None,
+                    'mb_per_s': round(size / 1024 / 1024 / elapsed, 3) if elapsed else None,
+                    'peak_rss_mb': round(peak / 1024 / 1024, 1) if peak is not None else None,
+                }
+                results.append(result)
+                _print_result(result)
+    return results
+
+
+def _print_header():
+    print(f"{'Case':<22} {'Dataset':<8} {'Rows':>10} {'Seconds':>9} {'Rows/sec':>11} {'MB/sec':>8} "
+          f"{'Peak RSS':>10}")
+
+
+def _print_result(result):
+    peak = f"{result['peak_rss_mb']:.1f} MB" if result['peak_rss_mb'] is not None else "n/a"
+    print(f"{result['case']:<22} {result['dataset']:<8} {result['rows']:>10,} {result['seconds']:>9.2f} "
+          f"{result['rows_per_s'] or 0:>11,.0f} {result['mb_per_s'] or 0:>8.2f} {peak:>10}")
+
+
+def machine_info():
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save_results(results, path, jobs):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'version': RESULTS_VERSION, 'machine': machine_info(), 'jobs': resolve_jobs(jobs),
+                   'results': results}, f, indent=2)
+        f.write('\n')
+    print(f"Results written to {path}")
+
+
+def _change(current, base):
+    """Relative change from base, or None if either is missing"""
+    if current is None or not base:
+        return None
+    return current / base - 1
+
+
+def compare_results(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare results with a baseline file's results of the same case, dataset and row count
+
+    A result regressed when its rows/sec fell, or its peak RSS grew, by
+    more than threshold (0.10 = 10%). Returns the regressed results.
+    """
+    base_results = {(result['case'], result['dataset'], result['rows']): result
+                    for result in baseline.get('results', [])}
+    if baseline.get('machine') != machine_info():
+        print("Note: the baseline was taken on a different machine or Python; differences may not be "
+              "due to the code")
+
+    print(f"\nCompared with baseline (threshold {threshold:.0%}):")
+    print(f"{'Case':<22} {'Dataset':<8} {'Rows':>10} {'Rows/sec':>18} {'Peak RSS':>18}")
+    regressions = []
+    for result in results:
+        base = base_results.get((result['case'], result['dataset'], result['rows']))
+        if base is None:
+            continue
+        speed = _change(result['rows_per_s'], base.get('rows_per_s'))
+        memory = _change(result['peak_rss_mb'], base.get('peak_rss_mb'))
+        regressed = (speed is not None and speed < -threshold) or (memory is not None and memory > threshold)
+        if regressed:
+            regressions.append(result)
+        speed_text = f"{result['rows_per_s'] or 0:,.0f} ({speed:+.1%})" if speed is not None else "n/a"
+        memory_text = f"{result['peak_rss_mb']:.1f} ({memory:+.1%})" if memory is not None else "n/a"
+        print(f"{result['case']:<22} {result['dataset']:<8} {result['rows']:>10,} {speed_text:>18} "
+              f"{memory_text:>18}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure converter throughput and peak memory on generated datasets',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Every case on every dataset, at 10k and 100k rows
+  %(prog)s
+
+  # Save a baseline, then check a change against it (exit status 1 on a regression)
+  %(prog)s --rows 1M --save baseline.json
+  %(prog)s --rows 1M --baseline baseline.json --threshold 0.05
+
+  # Only the CSV to JSON paths, on the wide and date-heavy data
+  %(prog)s --cases "CSVtoJSON/*" --datasets wide dates --rows 100k 1M
+
+  # Best of 3 runs, parallel paths on 8 cores
+  %(prog)s --cases "*/parallel" --repeat 3 --jobs 8
+
+  # List the cases and datasets
+  %(prog)s --list
+
+Notes:
+  - Datasets are generated deterministically (see bench_data) into
+    --data-dir on first use and reused after; 10M-row files take a while
+  - Each run is a fresh process; peak RSS is that of the largest process
+    (the converter or one of its workers)
+  - MB/sec is input bytes read per second
+  - Workbook inputs hold at most 1,048,575 rows, so ExcelToCSV results
+    report fewer rows for larger counts
+        '''
+    )
+
+    parser.add_argument('--cases', nargs='+', metavar='PATTERN',
+                        help='Cases to run, e.g. "CSVtoJSON/*" (default: all)')
+    parser.add_argument('--datasets', nargs='+', choices=list(DATASETS), default=list(DATASETS),
+                        help='Datasets to run on (default: all)')
+    parser.add_argument('--rows', nargs='+', type=parse_rows, default=[parse_rows(rows) for rows in DEFAULT_ROWS],
+                        help=f"Row counts, e.g. 10k 1M (default: {' '.join(DEFAULT_ROWS)})")
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='Worker processes for the parallel cases (0 = all cores, default: 0)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per measurement, fastest kept (default: 1)')
+    parser.add_argument('--seed', type=int, default=0, help='Dataset seed (default: 0)')
+    parser.add_argument('--data-dir', default=str(Path(tempfile.gettempdir()) / 'fileconverter-bench'),
+                        help='Where generated datasets are kept (default: a folder in the temp directory)')
+    parser.add_argument('--save', metavar='FILE', help='Write the results as JSON, e.g. as a new baseline')
+    parser.add_argument('--baseline', metavar='FILE', help='Compare with results saved by --save')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f'Slowdown or memory growth counted as a regression (default: {DEFAULT_THRESHOLD})')
+    parser.add_argument('--list', action='store_true', help='List the cases and datasets, and exit')
+
+    args = parser.parse_args()
+
+    try:
+        if args.list:
+            print("Cases:")
+            for name, (input_format, _, _, kwargs, _) in CASES.items():
+                options = ', '.join(f"{key}={value}" for key, value in kwargs.items())
+                print(f"  {name:<22} {input_format} input{f' ({options})' if options else ''}")
+            print("Datasets:")
+            for name in DATASETS:
+                print(f"  {name:<8} {', '.join(dataset_formats(name))}")
+            return
+
+        baseline = None
+        if args.baseline:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+
+        cases = select_cases(args.cases)
+        _print_header()
+        results = run_benchmarks(cases, args.datasets, args.rows, args.data_dir, args.jobs, max(args.repeat, 1),
+                                 args.seed)
+
+        if args.save:
+            save_results(results, args.save, args.jobs)
+        if baseline is not None:
+            regressions = compare_results(results, baseline, args.threshold)
+            if regressions:
+                print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}", file=sys.stderr)
+                sys.exit(1)
+            print("\nNo regressions")
+
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
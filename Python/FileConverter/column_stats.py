@@ -0,0 +1,247 @@
+"""
+Column statistics gathered while a file is converted (--profile)
+
+A TableProfile watches the record batches on their way to the writer, so
+the statistics cost no second pass over the data. For every column it
+keeps:
+  - the non-empty and empty ('' or missing) cell counts
+  - an estimate of the distinct non-empty values, from a HyperLogLog
+    sketch: fixed memory (HLL_REGISTERS bytes) however many values there
+    are, within about 1% of the true count
+  - the kind column_types would infer from all of the values (not just a
+    sample), with dates recognised in any DATE_FORMATS entry
+  - min and max: numeric for int and float columns, else by string order
+
+Each batch is reduced to its distinct values first, so repeated values
+are classified and hashed once per batch. Profiles of parts of a file
+(e.g. from worker processes) are combined with merge().
+
+The statistics are written next to the output as <output>.stats.json.
+"""
+import hashlib
+import json
+import math
+from pathlib import Path
+
+from column_types import json_kind, resolve_json_kind
+from row_filters import select_indexes
+
+STATS_SUFFIX = '.stats.json'
+HLL_PRECISION = 14
+HLL_REGISTERS = 1 << HLL_PRECISION
+_HLL_ALPHA = 0.7213 / (1 + 1.079 / HLL_REGISTERS)
+_HASH_BITS = 64
+_NULLS = ('', None)
+
+
+def stats_path(output_path):
+    """Sidecar file of an output: data.csv -> data.csv.stats.json"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + STATS_SUFFIX)
+
+
+def _lower(current, value):
+    return value if current is None or (value is not None and value < current) else current
+
+
+def _higher(current, value):
+    return value if current is None or (value is not None and value > current) else current
+
+
+class HyperLogLog:
+    """
+    Distinct-count sketch: each value's hash picks a register, which keeps
+    the longest run of leading zeros seen in the rest of the hash
+    """
+
+    def __init__(self):
+        self.registers = bytearray(HLL_REGISTERS)
+
+    def update(self, values):
+        registers = self.registers
+        mask = HLL_REGISTERS - 1
+        width = _HASH_BITS - HLL_PRECISION
+        blake2b = hashlib.blake2b
+        from_bytes = int.from_bytes
+        for value in values:
+            # Stable across processes, unlike hash(), so sketches can be merged
+            hashed = from_bytes(blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'little')
+            rank = width - (hashed >> HLL_PRECISION).bit_length() + 1
+            index = hashed & mask
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def estimate(self):
+        zeros = self.registers.count(0)
+        if zeros == HLL_REGISTERS:
+            return 0
+        raw = _HLL_ALPHA * HLL_REGISTERS * HLL_REGISTERS / sum(2.0 ** -rank for rank in self.registers)
+        if raw <= 2.5 * HLL_REGISTERS and zeros:
+            # Few values: count the empty registers instead (linear counting)
+            return HLL_REGISTERS * math.log(HLL_REGISTERS / zeros)
+        return raw
+
+
+class ColumnStats:
+    """Statistics of one column; see the module docstring"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.kinds = set()
+        self.date_formats = None
+        self.min_text = None
+        self.max_text = None
+        self.min_number = None
+        self.max_number = None
+        self.distinct = HyperLogLog()
+
+    def _settled(self):
+        """True once more values can't change the kind from 'mixed'"""
+        kinds = self.kinds - {'int', 'float'}
+        return len(kinds) > 1 or (len(kinds) == 1 and len(self.kinds) > 1)
+
+    def _update_numbers(self, numbers):
+        numbers = [number for number in numbers if number == number]  # without NaN
+        if numbers:
+            self.min_number = _lower(self.min_number, min(numbers))
+            self.max_number = _higher(self.max_number, max(numbers))
+
+    def observe(self, values):
+        """Account for one batch of cells (strings, None for missing)"""
+        nulls = values.count('') + values.count(None)
+        self.nulls += nulls
+        self.count += len(values) - nulls
+        distinct = set(values)
+        distinct.difference_update(_NULLS)
+        if not distinct:
+            return
+
+        self.distinct.update(distinct)
+        self.min_text = _lower(self.min_text, min(distinct))
+        self.max_text = _higher(self.max_text, max(distinct))
+
+        # Whole-batch fast paths for numeric columns
+        if ''.join(distinct).isdigit():
+            self.kinds.add('int')
+            self._update_numbers(map(int, distinct))
+            return
+        try:
+            numbers = list(map(float, distinct))
+        except ValueError:
+            pass
+        else:
+            self.kinds.add('float')
+            self._update_numbers(numbers)
+            return
+
+        if self._settled():
+            return
+        numbers = []
+        for value in distinct:
+            # Dates only matter while every value so far was a date
+            kind = json_kind(value, parse_dates=self.kinds <= {'date'})
+            if isinstance(kind, frozenset):
+                self.date_formats = kind if self.date_formats is None else self.date_formats & kind
+                self.kinds.add('date')
+            else:
+                self.kinds.add(kind)
+                if kind == 'int':
+                    numbers.append(int(value))
+                elif kind == 'float':
+                    numbers.append(float(value))
+        self._update_numbers(numbers)
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.kinds |= other.kinds
+        if other.date_formats is not None:
+            self.date_formats = other.date_formats if self.date_formats is None else \
+                self.date_formats & other.date_formats
+        self.min_text = _lower(self.min_text, other.min_text)
+        self.max_text = _higher(self.max_text, other.max_text)
+        self.min_number = _lower(self.min_number, other.min_number)
+        self.max_number = _higher(self.max_number, other.max_number)
+        self.distinct.merge(other.distinct)
+
+    def to_dict(self):
+        kind = resolve_json_kind(self.kinds, self.date_formats)
+        if kind in ('int', 'float'):
+            low, high = self.min_number, self.max_number
+        else:
+            low, high = self.min_text, self.max_text
+        return {
+            'name': self.name,
+            'type': kind,
+            'count': self.count,
+            'nulls': self.nulls,
+            'distinct': min(round(self.distinct.estimate()), self.count),
+            'min': low,
+            'max': high,
+        }
+
+
+class TableProfile:
+    """
+    Statistics of every column of a Table's rows
+
+    Args:
+        columns: Column names
+        positions: Index of each column in the rows observed (default:
+            0, 1, 2, ...), for rows that hold more cells than are profiled
+    """
+
+    def __init__(self, columns, positions=None):
+        self.columns = [ColumnStats(name) for name in columns]
+        self.positions = list(positions) if positions is not None else list(range(len(self.columns)))
+        self.width = max(self.positions, default=-1) + 1
+        self.rows = 0
+
+    def observe(self, rows):
+        """Account for a batch of rows (lists of strings)"""
+        if not rows:
+            return
+        self.rows += len(rows)
+        if not self.columns:
+            return
+        if set(map(len, rows)) != {self.width}:
+            padding = [None] * self.width
+            rows = [(list(row) + padding)[:self.width] for row in rows]
+        cells = list(zip(*rows))
+        for stats, position in zip(self.columns, self.positions):
+            stats.observe(cells[position])
+
+    def merge(self, other):
+        self.rows += other.rows
+        for stats, other_stats in zip(self.columns, other.columns):
+            stats.merge(other_stats)
+
+    def to_dict(self, source=None, output=None):
+        return {
+            'source': str(source) if source is not None else None,
+            'output': str(output) if output is not None else None,
+            'rows': self.rows,
+            'columns': [stats.to_dict() for stats in self.columns],
+        }
+
+    def write(self, output_path, source=None):
+        """Write the <output>.stats.json sidecar; returns its path"""
+        path = stats_path(output_path)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(source, output_path), f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"Column statistics written to {path}")
+        return path
+
+
+def table_profile(columns, select=None):
+    """TableProfile of a header's columns, or of the select ones in rows with every column"""
+    columns = columns or []
+    if select:
+        return TableProfile(select, select_indexes(select, columns))
+    return TableProfile(columns)
@@ -0,0 +1,322 @@
+"""
+Column type inference for the FileConverter scripts
+
+A sample of rows is used to lock one type per column. Every later value is
+then converted by that column's precompiled converter; values that don't
+fit the locked type fall back to the generic per-cell conversion, so a bad
+sample never produces wrong output, only slower output.
+
+Two flavours exist: Excel cells (CSVtoExcel) and JSON values (CSVtoJSON,
+whose generic conversion is convert_value).
+"""
+import re
+from datetime import datetime
+
+DEFAULT_SAMPLE_ROWS = 1000
+
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%Y-%m-%d %H:%M:%S']
+
+# Excel stores numbers as doubles: longer integers would lose digits
+EXCEL_MAX_DIGITS = 15
+
+_INT_RE = re.compile(r'\s*[+-]?[0-9]+\s*')
+_FLOAT_RE = re.compile(r'\s*[+-]?(?:[0-9]+\.[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?\s*')
+_NUMERIC_START = frozenset('0123456789+-. \t')
+
+
+def _is_id(value):
+    """Integers that must stay strings: leading zeros or too many digits for Excel"""
+    digits = value.strip().lstrip('+-')
+    return (len(digits) > 1 and digits[0] == '0') or len(digits) > EXCEL_MAX_DIGITS
+
+
+def excel_kind(value):
+    """Classify a CSV string as None (empty), 'int', 'id', 'number' or 'text'"""
+    if not value:
+        return None
+    if _INT_RE.fullmatch(value):
+        return 'id' if _is_id(value) else 'int'
+    if _FLOAT_RE.fullmatch(value):
+        return 'number'
+    return 'text'
+
+
+def convert_excel_cell(value):
+    """Generic conversion of one CSV string to the value written to Excel"""
+    if not value:
+        return None
+    if _INT_RE.fullmatch(value):
+        return value if _is_id(value) else int(value)
+    if _FLOAT_RE.fullmatch(value):
+        return float(value)
+    return value
+
+
+def infer_excel_kinds(sample_rows, skip_header=True):
+    """
+    Lock a kind per column from sample rows
+
+    Kinds: 'int', 'number' (ints and decimals), 'id' (digit strings kept as
+    text), 'text', or 'mixed' (converted cell by cell).
+
+    Args:
+        sample_rows: List of CSV rows (lists of strings)
+        skip_header: Ignore the first row, which is usually column names
+    """
+    rows = sample_rows[1:] if skip_header and len(sample_rows) > 1 else sample_rows
+    width = max((len(row) for row in sample_rows), default=0)
+    seen = [set() for _ in range(width)]
+    for row in rows:
+        for col, value in enumerate(row):
+            kind = excel_kind(value)
+            if kind:
+                seen[col].add(kind)
+
+    kinds = []
+    for col_kinds in seen:
+        if not col_kinds or col_kinds == {'text'}:
+            kinds.append('text')
+        elif col_kinds == {'int'}:
+            kinds.append('int')
+        elif col_kinds <= {'int', 'number'}:
+            kinds.append('number')
+        elif col_kinds <= {'int', 'id'}:
+            kinds.append('id')
+        else:
+            kinds.append('mixed')
+    return kinds
+
+
+def _excel_int(value):
+    if value and value.isascii() and value.isdigit() and (value[0] != '0' or len(value) == 1) \
+            and len(value) <= EXCEL_MAX_DIGITS:
+        return int(value)
+    return convert_excel_cell(value)
+
+
+def _excel_number(value):
+    if value and '.' in value and _FLOAT_RE.fullmatch(value):
+        return float(value)
+    return convert_excel_cell(value)
+
+
+def _excel_id(value):
+    return value if value else None
+
+
+def _excel_text(value):
+    if value and value[0] not in _NUMERIC_START:
+        return value
+    return convert_excel_cell(value)
+
+
+_EXCEL_CONVERTERS = {
+    'int': _excel_int,
+    'number': _excel_number,
+    'id': _excel_id,
+    'text': _excel_text,
+    'mixed': convert_excel_cell,
+}
+
+
+def compile_excel_converters(kinds):
+    """Return one converter function per column kind"""
+    return [_EXCEL_CONVERTERS[kind] for kind in kinds]
+
+
+def convert_row(converters, row, fallback):
+    """Apply per-column converters; columns beyond the schema use fallback"""
+    if len(row) <= len(converters):
+        return [convert(value) for convert, value in zip(converters, row)]
+    return [convert(value) for convert, value in zip(converters, row)] + \
+        [fallback(value) for value in row[len(converters):]]
+
+
+def convert_value(value, preserve_strings=False, parse_dates=False):
+    """Convert string values to appropriate Python types"""
+    if preserve_strings:
+        return value
+    
+    if not value:
+        return None
+    
+    # Try date parsing if enabled
+    if parse_dates:
+        for fmt in DATE_FORMATS:
+            try:
+                dt = datetime.strptime(value, fmt)
+                return dt.isoformat()
+            except ValueError:
+                pass
+    
+    # Try numeric conversion
+    if value.isdigit():
+        return int(value)
+    
+    try:
+        float_val = float(value)
+        return float_val
+    except ValueError:
+        pass
+    
+    # Boolean conversion
+    if value.lower() in ('true', 'yes', '1'):
+        return True
+    if value.lower() in ('false', 'no', '0'):
+        return False
+    
+    return value
+
+
+def _date_pattern(fmt):
+    """Regex with groups in (year, month, day, hour, minute, second) order for a DATE_FORMATS entry"""
+    fields = {'%Y': '[0-9]{4}', '%m': '[0-9]{1,2}', '%d': '[0-9]{1,2}',
+              '%H': '[0-9]{1,2}', '%M': '[0-9]{1,2}', '%S': '[0-9]{1,2}'}
+    order = re.findall(r'%[YmdHMS]', fmt)
+    pattern = re.escape(fmt)
+    for code in order:
+        pattern = pattern.replace(re.escape(code), f'({fields[code]})', 1)
+    positions = [order.index(code) for code in ('%Y', '%m', '%d', '%H', '%M', '%S') if code in order]
+    return re.compile(pattern), positions
+
+
+_DATE_PATTERNS = {fmt: _date_pattern(fmt) for fmt in DATE_FORMATS}
+_BOOL_WORDS = {'true': True, 'yes': True, 'false': False, 'no': False}
+_ASCII_LETTERS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ')
+# Words float() or the boolean check accept, and the letters they start with
+_SPECIAL_WORDS = frozenset(('nan', 'inf', 'infinity', 'true', 'yes', 'false', 'no'))
+_SPECIAL_INITIALS = frozenset('nNiItTyYfF')
+
+
+def _parse_date(value, fmt):
+    """Parse value with a DATE_FORMATS entry without strptime; None if it doesn't match"""
+    pattern, positions = _DATE_PATTERNS[fmt]
+    match = pattern.fullmatch(value)
+    if match is None:
+        return None
+    groups = match.groups()
+    try:
+        return datetime(*(int(groups[i]) for i in positions)).isoformat()
+    except ValueError:
+        return None
+
+
+def json_kind(value, parse_dates=False):
+    """Classify a CSV string the way convert_value would treat it"""
+    if not value:
+        return None
+    if parse_dates:
+        formats = frozenset(fmt for fmt in DATE_FORMATS if _parse_date(value, fmt) is not None)
+        if formats:
+            return formats
+    if value.isdigit():
+        return 'int'
+    try:
+        float(value)
+        return 'float'
+    except ValueError:
+        pass
+    if value.lower() in _BOOL_WORDS:
+        return 'bool'
+    return 'text'
+
+
+def infer_json_kinds(sample_rows, parse_dates=False):
+    """
+    Lock a kind per column from sample rows (lists of strings, no header)
+
+    Kinds: 'int', 'float', 'bool', 'text', 'date:<format>' (the first
+    DATE_FORMATS entry every sampled date matches) or 'mixed'.
+    """
+    width = max((len(row) for row in sample_rows), default=0)
+    seen = [set() for _ in range(width)]
+    date_formats = [None] * width
+    for row in sample_rows:
+        for col, value in enumerate(row):
+            kind = json_kind(value, parse_dates)
+            if isinstance(kind, frozenset):
+                date_formats[col] = kind if date_formats[col] is None else date_formats[col] & kind
+                seen[col].add('date')
+            elif kind:
+                seen[col].add(kind)
+
+    return [resolve_json_kind(col_kinds, formats) for col_kinds, formats in zip(seen, date_formats)]
+
+
+def resolve_json_kind(col_kinds, date_formats=None):
+    """
+    One column's kind from the json_kind() results seen in it
+
+    col_kinds holds 'int', 'float', 'bool', 'text' and 'date' (for any
+    date); date_formats is the set of DATE_FORMATS every date matched.
+    """
+    if col_kinds == {'date'} and date_formats:
+        fmt = next(fmt for fmt in DATE_FORMATS if fmt in date_formats)
+        return f'date:{fmt}'
+    if not col_kinds or col_kinds == {'text'}:
+        return 'text'
+    if col_kinds == {'int'}:
+        return 'int'
+    if col_kinds <= {'int', 'float'}:
+        return 'float'
+    if col_kinds == {'bool'}:
+        return 'bool'
+    return 'mixed'
+
+
+def compile_json_converters(kinds, preserve_strings=False, parse_dates=False):
+    """
+    Return one converter per column kind
+
+    Each converter gives the same result as convert_value for values that
+    fit its kind and hands everything else to convert_value. Date columns
+    try their locked format first, so an ambiguous day/month value follows
+    the rest of its column.
+    """
+    def generic(value):
+        return convert_value(value, preserve_strings, parse_dates)
+
+    if preserve_strings:
+        return [generic] * len(kinds)
+
+    def to_int(value):
+        if value and value.isdigit():
+            return int(value)
+        return generic(value)
+
+    def to_float(value):
+        if not value:
+            return None
+        if value.isdigit():
+            return int(value)
+        try:
+            return float(value)
+        except ValueError:
+            return generic(value)
+
+    def to_bool(value):
+        if value:
+            flag = _BOOL_WORDS.get(value.lower())
+            if flag is not None:
+                return flag
+        return generic(value)
+
+    def to_text(value):
+        if value:
+            initial = value[0]
+            if initial in _ASCII_LETTERS and (initial not in _SPECIAL_INITIALS
+                                              or value.strip().lower() not in _SPECIAL_WORDS):
+                return value
+        return generic(value)
+
+    def to_date(fmt):
+        def convert(value):
+            if value:
+                parsed = _parse_date(value, fmt)
+                if parsed is not None:
+                    return parsed
+            return generic(value)
+        return convert
+
+    fixed = {'int': to_int, 'float': to_float, 'bool': to_bool, 'text': to_text, 'mixed': generic}
+    return [to_date(kind[5:]) if kind.startswith('date:') else fixed[kind] for kind in kinds]
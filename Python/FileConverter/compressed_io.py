@@ -0,0 +1,115 @@
+"""
+Transparent gzip, bzip2 and xz compression for converter input and output
+
+open_file() is a drop-in for open() that decompresses or compresses while
+streaming, so a .csv.gz feed is read without first being unpacked on disk.
+Input compression is recognised from the file's first bytes (falling back
+to the extension for empty files); output is compressed when the path ends
+in .gz, .bz2 or .xz. open_output() writes through a temp file so that only
+a complete output ever replaces the old one.
+
+Compressed files are read front to back only, so the byte-range splitting
+behind --jobs doesn't apply to them (see is_compressed).
+"""
+import bz2
+import gzip
+import lzma
+import os
+from contextlib import contextmanager, suppress
+from pathlib import Path
+
+COMPRESSION_SUFFIXES = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+}
+_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+)
+# gzip's own default; level 9 is several times slower for a few % less
+GZIP_LEVEL = 6
+
+
+def _suffix_compression(path):
+    return COMPRESSION_SUFFIXES.get(Path(path).suffix.lower())
+
+
+def detect_compression(path):
+    """'gzip', 'bz2', 'xz' or None for an existing file, from its magic bytes"""
+    with open(path, 'rb') as f:
+        head = f.read(6)
+    if not head:
+        return _suffix_compression(path)
+    for magic, compression in _MAGIC:
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def is_compressed(path):
+    """True for an existing compressed file (which can only be read sequentially)"""
+    return detect_compression(path) is not None
+
+
+def strip_compression(path):
+    """The path without a compression suffix: data.csv.gz -> data.csv"""
+    path = Path(path)
+    return path.with_suffix('') if _suffix_compression(path) else path
+
+
+def replace_suffix(path, suffix):
+    """Path.with_suffix() that keeps a compression suffix: data.csv.gz -> data.json.gz"""
+    path = Path(path)
+    compression = path.suffix if _suffix_compression(path) else ''
+    return strip_compression(path).with_suffix(suffix + compression)
+
+
+def open_file(path, mode='r', encoding=None, newline=None):
+    """
+    open() a file, decompressing on read or compressing on write as needed
+
+    Reads detect compression from the content, writes from the path's
+    suffix. Text and binary modes work as with open().
+    """
+    if 'r' in mode:
+        compression = detect_compression(path)
+    else:
+        compression = _suffix_compression(path)
+    return _open(path, mode, compression, encoding, newline)
+
+
+@contextmanager
+def open_output(path, mode='w', encoding=None, newline=None):
+    """
+    open_file() for writing, into <path>.tmp that replaces path on success
+
+    If the block raises, the temp file is removed and any existing file at
+    path is left as it was, so a failed conversion never leaves a
+    truncated output behind.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + '.tmp')
+    try:
+        with _open(tmp_path, mode, _suffix_compression(path), encoding, newline) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def _open(path, mode, compression, encoding, newline):
+    if compression is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+
+    if 'b' not in mode and 't' not in mode:
+        mode += 't'
+    text = {} if 'b' in mode else {'encoding': encoding, 'newline': newline}
+    if compression == 'gzip':
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL, **text)
+    if compression == 'bz2':
+        return bz2.open(path, mode, **text)
+    return lzma.open(path, mode, **text)
@@ -0,0 +1,299 @@
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+from column_types import DEFAULT_SAMPLE_ROWS
+from compressed_io import strip_compression
+from external_sort import DEFAULT_SORT_MEMORY_MB, sort_rows
+from json_stream import JSON_LINES_SUFFIXES
+from pipeline import (ENGINES, HEADER_STRATEGIES, INPUT_FORMATS, filter_rows, read_csv, read_excel, read_json,
+                      sniff_dialect, write_csv, write_excel, write_json)
+from row_filters import parse_column_list
+from sharding import ShardSet, check_shard_limit
+from xlsx_reader import sheet_window
+
+FORMATS = ('csv', 'json', 'xlsx')
+_SUFFIX_FORMATS = {
+    '.csv': 'csv',
+    '.tsv': 'csv',
+    '.txt': 'csv',
+    '.json': 'json',
+    '.jsonl': 'json',
+    '.ndjson': 'json',
+    '.xlsx': 'xlsx',
+    '.xlsm': 'xlsx',
+}
+
+
+def detect_format(path, given=None):
+    """File format from --from/--to if given, else from the extension (ignoring .gz/.bz2/.xz)"""
+    if given:
+        return given
+    file_format = _SUFFIX_FORMATS.get(strip_compression(path).suffix.lower())
+    if file_format is None:
+        raise ValueError(f"Can't tell the format of {path} from its extension; use --from/--to "
+                         f"({', '.join(FORMATS)})")
+    return file_format
+
+
+def convert(input_file, output_file, from_format=None, to_format=None, encoding='utf-8', delimiter=None,
+            sheet_name=None, sheet_index=0, cell_range=None, skip_rows=0, max_rows=None, flatten=False,
+            fields=None, header_strategy='scan', input_format='auto', select=None, where=None,
+            preserve_strings=False, parse_dates=False, pretty=True, ndjson=None,
+            sample_rows=DEFAULT_SAMPLE_ROWS, output_sheet='Sheet1', engine='auto', shard_rows=None,
+            shard_bytes=None, sort_by=None, descending=False, sort_memory=DEFAULT_SORT_MEMORY_MB):
+    """
+    Convert between CSV, JSON/JSON Lines and Excel in one streaming pass
+
+    The input is read into record batches, filtered, and written straight
+    to the output format (see pipeline); the result is the same as
+    converting to CSV and on from there with the single-format scripts.
+
+    Args:
+        input_file: Path to the input file
+        output_file: Path to the output file
+        from_format, to_format: 'csv', 'json' or 'xlsx' (default: by extension)
+        encoding: Encoding of CSV/JSON input and output
+        delimiter: CSV delimiter (input default: detected; output default:
+            tab for .tsv, else comma)
+        sheet_name, sheet_index: Excel sheet to read
+        cell_range, skip_rows, max_rows: Part of the Excel sheet to read
+        flatten, fields, header_strategy, input_format: JSON input options
+            (see JSONtoCSV)
+        select: Columns to keep, in output order
+        where: Conditions rows must all match (see row_filters)
+        sort_by, descending, sort_memory: Order rows by these columns
+            within a memory budget in MB (see external_sort)
+        preserve_strings, parse_dates, pretty, sample_rows: JSON output
+            options (see CSVtoJSON); sample_rows also locks Excel column types
+        ndjson: Write JSON Lines (default: for a .jsonl/.ndjson output)
+        output_sheet, engine: Excel output options (see CSVtoExcel)
+        shard_rows, shard_bytes: CSV and JSON output: split it into numbered
+            files of this many rows or characters (see sharding)
+    """
+    input_path = Path(input_file)
+    output_path = Path(output_file)
+
+    if not input_path.exists():
+        raise FileNotFoundError(f"Input file not found: {input_file}")
+
+    from_format = detect_format(input_path, from_format)
+    to_format = detect_format(output_path, to_format)
+    print(f"Converting {from_format} → {to_format}")
+    for path, file_format in ((input_path, from_format), (output_path, to_format)):
+        if file_format == 'xlsx' and strip_compression(path) != path:
+            raise ValueError(f"Excel workbooks are zip files already and can't be read or written "
+                             f"compressed: {path}")
+
+    shards = None
+    if shard_rows or shard_bytes:
+        if to_format == 'xlsx':
+            raise ValueError("Only CSV and JSON output can be sharded")
+        shards = ShardSet(output_path, shard_rows, shard_bytes)
+
+    # Read
+    if from_format == 'xlsx':
+        window = sheet_window(cell_range, skip_rows, max_rows)
+        table = read_excel(input_path, sheet_name, sheet_index, window)
+    elif from_format == 'json':
+        # Fields are pushed into flattening, so the sort columns are read
+        # too and dropped once the rows are sorted
+        extra = [column for column in sort_by or [] if fields and column not in fields]
+        table = read_json(input_path, encoding, flatten, fields and list(fields) + extra, header_strategy,
+                          input_format)
+    else:
+        params = {'delimiter': delimiter} if delimiter else sniff_dialect(input_path, encoding)
+        table = read_csv(input_path, encoding, params)
+    filtered = None
+    if sort_by:
+        # Filter before sorting, so rows --where drops are never keyed or
+        # spilled; --select is applied after, so the sort can still use
+        # columns it drops
+        if where:
+            table = filtered = filter_rows(table, None, where)
+        table = sort_rows(table, sort_by, descending, sort_memory, sample_rows)
+        if from_format == 'json' and extra:
+            kept = [column for column in table.columns if column in fields]
+            if not kept:
+                raise ValueError(f"None of the specified fields exist in data: {fields}")
+            table = filter_rows(table, kept)
+    pending_where = None if filtered else where
+
+    # Filter and write; JSON output filters as it converts, like CSVtoJSON
+    if to_format == 'json':
+        if ndjson is None:
+            ndjson = strip_compression(output_path).suffix.lower() in JSON_LINES_SUFFIXES
+        count = write_json(table, output_path, encoding, pretty, ndjson, preserve_strings, parse_dates,
+                           sample_rows, select, pending_where, shards=shards)
+    else:
+        if select or pending_where:
+            if select:
+                print(f"Selecting columns: {', '.join(select)}")
+            table = filter_rows(table, select, pending_where)
+        if to_format == 'xlsx':
+            count, sheet_names = write_excel(table, output_path, output_sheet, engine=engine,
+                                             sample_rows=sample_rows)
+            if table.columns is not None:
+                count -= 1
+        else:
+            if not delimiter:
+                delimiter = '\t' if strip_compression(output_path).suffix.lower() == '.tsv' else ','
+            # ExcelToCSV writes the platform's line endings, as pandas does
+            lineterminator = os.linesep if from_format == 'xlsx' else '\r\n'
+            count = write_csv(table, output_path, encoding, delimiter, lineterminator, shards)
+    scanned = (filtered or table).scanned
+
+    if shards is not None:
+        shards.write_manifest(source=input_path)
+
+    if where:
+        print(f"Kept {count} of {scanned} rows matching: {' AND '.join(where)}")
+    print(f"✓ Converted {count} rows from '{input_file}' to '{output_file}'")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Convert between CSV, JSON, JSON Lines and Excel in one streaming pass',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='''
+Examples:
+  # Formats are taken from the extensions
+  %(prog)s data.xlsx -o data.json
+  %(prog)s events.jsonl -o events.xlsx --flatten
+
+  # Part of a sheet, filtered, as JSON Lines
+  %(prog)s report.xlsx -o rows.jsonl --sheet Sales --range A3:F --where "region = EU"
+
+  # Filter a CSV into a smaller CSV
+  %(prog)s big.csv -o subset.csv --select name,age --where "age >= 30"
+
+  # Compressed feeds are streamed, and outputs compressed by extension
+  %(prog)s feed.jsonl.bz2 -o feed.csv.gz
+
+  # Sort a feed bigger than memory by two columns, descending
+  %(prog)s feed.jsonl.gz -o sorted.csv --sort-by region,revenue --desc
+
+  # Shards of about 256 MB each, with a manifest of row counts and checksums
+  %(prog)s huge.jsonl.gz -o huge.csv.gz --shard-bytes 268435456
+
+  # Unusual extensions
+  %(prog)s export.dat --from csv -o export.out --to json
+
+Notes:
+  - Recognised extensions: .csv .tsv .txt, .json .jsonl .ndjson, .xlsx .xlsm
+  - CSV and JSON files may end in .gz, .bz2 or .xz
+  - Values are typed the same way as by CSVtoJSON and CSVtoExcel, whatever
+    the input format
+        '''
+    )
+
+    parser.add_argument('input', help='File to convert')
+    parser.add_argument('-o', '--output', required=True, help='Output file path')
+    parser.add_argument('--from', dest='from_format', choices=FORMATS, help='Input format (default: by extension)')
+    parser.add_argument('--to', dest='to_format', choices=FORMATS, help='Output format (default: by extension)')
+    parser.add_argument('--encoding', default='utf-8', help='Text file encoding (default: utf-8)')
+    parser.add_argument('--delimiter', '--sep',
+                        help='CSV delimiter (default: detected on input; tab for .tsv output, else comma)')
+
+    excel_in = parser.add_argument_group('Excel input')
+    excel_in.add_argument('--sheet', dest='sheet_name', help='Sheet name to read')
+    excel_in.add_argument('--sheet-index', type=int, default=0, help='Sheet index to read (0-based, default: 0)')
+    excel_in.add_argument('--range', dest='cell_range',
+                          help='Only read this cell range, e.g. B2:H5000 or B:H (first row is the header)')
+    excel_in.add_argument('--skip-rows', type=int, default=0, help='Rows to skip before the header (default: 0)')
+    excel_in.add_argument('--max-rows', type=int, help='Read at most this many data rows')
+
+    json_in = parser.add_argument_group('JSON input')
+    json_in.add_argument('--flatten', action='store_true', help='Flatten nested JSON objects')
+    json_in.add_argument('--fields', nargs='+', help='Specific fields to read')
+    json_in.add_argument('--header-strategy', choices=HEADER_STRATEGIES, default='scan',
+                         help='Find the columns with a key-only first pass (scan) or by buffering rows in a '
+                              'temp file (spill) (default: scan)')
+    json_in.add_argument('--input-format', choices=INPUT_FORMATS, default='auto',
+                         help='Input is one JSON document (json) or one record per line (jsonl) (default: auto)')
+
+    filters = parser.add_argument_group('Filtering and sorting')
+    filters.add_argument('--select', type=parse_column_list,
+                         help='Comma-separated columns to keep, in output order')
+    filters.add_argument('--where', action='append',
+                         help='Keep rows matching a condition on the raw value: "col = x", "col >= 5", '
+                              '"col in (a,b)", "col ~ regex" (repeat to AND)')
+    filters.add_argument('--sort-by', type=parse_column_list, metavar='COL[,COL2]',
+                         help='Order rows by these columns, compared as typed values')
+    filters.add_argument('--desc', action='store_true', help='With --sort-by: descending order')
+    filters.add_argument('--sort-memory', type=int, default=DEFAULT_SORT_MEMORY_MB, metavar='MB',
+                         help=f'Memory for sorting before sorted runs spill to temp files '
+                              f'(default: {DEFAULT_SORT_MEMORY_MB})')
+
+    output = parser.add_argument_group('Output')
+    output.add_argument('--preserve-strings', action='store_true',
+                        help='JSON: keep all values as strings (no type conversion)')
+    output.add_argument('--parse-dates', action='store_true', help='JSON: convert date fields to ISO format')
+    output.add_argument('--no-pretty', action='store_false', dest='pretty',
+                        help='JSON: compact output (no indentation)')
+    output.add_argument('--ndjson', action='store_true', default=None,
+                        help='JSON: write one record per line (default for .jsonl/.ndjson)')
+    output.add_argument('--sample-rows', type=int, default=DEFAULT_SAMPLE_ROWS,
+                        help=f'Rows sampled to infer column types (default: {DEFAULT_SAMPLE_ROWS})')
+    output.add_argument('--output-sheet', default='Sheet1', help='Excel: sheet to write (default: Sheet1)')
+    output.add_argument('--engine', choices=ENGINES, default='auto',
+                        help='Excel: writer engine, see CSVtoExcel (default: auto)')
+
+    output.add_argument('--shard-rows', type=check_shard_limit, metavar='N',
+                        help='CSV/JSON: split the output into files of N rows (name.part-0001.csv, ...) '
+                             'listed in <output>.shards.json')
+    output.add_argument('--shard-bytes', type=check_shard_limit, metavar='N',
+                        help='CSV/JSON: split the output into files of about N bytes (characters before '
+                             'compression)')
+
+    args = parser.parse_args()
+
+    try:
+        convert(
+            args.input,
+            args.output,
+            from_format=args.from_format,
+            to_format=args.to_format,
+            encoding=args.encoding,
+            delimiter=args.delimiter,
+            sheet_name=args.sheet_name,
+            sheet_index=args.sheet_index,
+            cell_range=args.cell_range,
+            skip_rows=args.skip_rows,
+            max_rows=args.max_rows,
+            flatten=args.flatten,
+            fields=args.fields,
+            header_strategy=args.header_strategy,
+            input_format=args.input_format,
+            select=args.select,
+            where=args.where,
+            preserve_strings=args.preserve_strings,
+            parse_dates=args.parse_dates,
+            pretty=args.pretty,
+            ndjson=args.ndjson,
+            sample_rows=args.sample_rows,
+            output_sheet=args.output_sheet,
+            engine=args.engine,
+            shard_rows=args.shard_rows,
+            shard_bytes=args.shard_bytes,
+            sort_by=args.sort_by,
+            descending=args.desc,
+            sort_memory=args.sort_memory
+        )
+
+    except FileNotFoundError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    except json.JSONDecodeError as e:
+        print(f"Error: Invalid JSON - {e}", file=sys.stderr)
+        sys.exit(1)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
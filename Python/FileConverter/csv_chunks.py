@@ -0,0 +1,137 @@
+"""
+Split a CSV file into byte ranges that start and end on record boundaries
+
+A newline ends a record only when an even number of quote characters has
+been seen since the start of the file, so quoted fields containing line
+breaks are never cut in half. Worker processes can then read and parse
+their own range independently.
+"""
+import codecs
+import csv
+import os
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+MIN_CHUNK_BYTES = 256 * 1024
+_SCAN_BLOCK = 1024 * 1024
+
+
+def dialect_params(dialect):
+    """Keyword arguments that recreate a csv dialect (name, class or instance) in another process"""
+    if isinstance(dialect, str):
+        dialect = csv.get_dialect(dialect)
+    return {
+        'delimiter': dialect.delimiter,
+        'quotechar': dialect.quotechar,
+        'doublequote': dialect.doublequote,
+        'escapechar': dialect.escapechar,
+        'skipinitialspace': dialect.skipinitialspace,
+        'lineterminator': dialect.lineterminator,
+        'quoting': dialect.quoting,
+    }
+
+
+def can_split(encoding, params):
+    """
+    Whether byte-level splitting is safe for this encoding and dialect
+
+    Needs an ASCII-compatible encoding (newline and quote are single bytes)
+    and no escape character (an escaped quote would flip the quote count).
+    """
+    if params.get('escapechar'):
+        return False
+    name = codecs.lookup(encoding).name
+    if name.startswith(('utf-16', 'utf-32')):
+        return False
+    quote = params.get('quotechar') or '"'
+    if not quote.isascii():
+        return False
+    return ('\n' + quote).encode(encoding) == ('\n' + quote).encode('ascii')
+
+
+def split_records(path, chunk_size=DEFAULT_CHUNK_BYTES, quotechar='"', skip_records=1):
+    """
+    Find record-aligned byte ranges covering a CSV file
+
+    Args:
+        path: CSV file path
+        chunk_size: Approximate size of each range in bytes
+        quotechar: Quote character, or None if quotes are not special
+        skip_records: Leading records (the header) to leave out of the ranges
+
+    Returns:
+        (data_start, [(start, end), ...]) or None if the file has an odd
+        number of quote characters, i.e. stray quotes make the split unsafe
+    """
+    quote = quotechar.encode('ascii') if quotechar else None
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        in_quotes = False
+        pos = 0
+
+        def count_quotes(data):
+            return data.count(quote) & 1 if quote else 0
+
+        def next_record_end(start):
+            """Offset just past the first unquoted newline at or after start"""
+            nonlocal in_quotes
+            f.seek(start)
+            offset = start
+            while True:
+                block = f.read(_SCAN_BLOCK)
+                if not block:
+                    return size
+                idx = 0
+                while True:
+                    nl = block.find(b'\n', idx)
+                    if nl == -1:
+                        in_quotes ^= count_quotes(block[idx:])
+                        break
+                    in_quotes ^= count_quotes(block[idx:nl])
+                    if not in_quotes:
+                        return offset + nl + 1
+                    idx = nl + 1
+                offset += len(block)
+
+        for _ in range(skip_records):
+            pos = next_record_end(pos)
+        data_start = pos
+
+        ranges = []
+        while pos < size:
+            target = pos + chunk_size
+            if target >= size:
+                f.seek(pos)
+                while f.tell() < size:
+                    in_quotes ^= count_quotes(f.read(_SCAN_BLOCK))
+                ranges.append((pos, size))
+                break
+            f.seek(pos)
+            remaining = target - pos
+            while remaining:
+                block = f.read(min(remaining, _SCAN_BLOCK))
+                in_quotes ^= count_quotes(block)
+                remaining -= len(block)
+            end = next_record_end(target)
+            ranges.append((pos, end))
+            pos = end
+
+    if in_quotes:
+        return None
+    return data_start, ranges
+
+
+def chunk_size_for(data_size, jobs, chunk_size=DEFAULT_CHUNK_BYTES):
+    """Chunk size giving every worker a few ranges, within sane bounds"""
+    return max(MIN_CHUNK_BYTES, min(chunk_size, data_size // (jobs * 4) + 1))
+
+
+def read_chunk_text(path, start, end, encoding):
+    """Read a byte range and decode it with universal newlines, like open(path, 'r') would"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    text = data.decode(encoding)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
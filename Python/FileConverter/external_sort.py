@@ -0,0 +1,142 @@
+"""
+External merge sort of a Table's rows (--sort-by) in bounded memory
+
+sort_rows() is a pipeline stage. Rows are gathered until they fill the
+memory budget, sorted, and spilled to a temp file as a sorted run; the
+runs are then combined by a k-way heap merge (heapq.merge) whose output
+streams straight into the writer. Input that fits the budget is sorted in
+memory and never touches disk. Every MERGE_FAN_IN runs of one size are
+merged into a longer run as sorting goes on, so the number of files open
+at once stays small and each row is rewritten only log(runs) times.
+
+Keys are typed as CSVtoJSON types values (column_types: kinds locked from
+a sample, with dates recognised), so numbers sort numerically, dates
+chronologically (as ISO text) and text by code point. Within a column,
+numbers and booleans sort before text, and empty or missing cells come
+last in either direction. The sort is stable: rows with equal keys keep
+their input order. Blank rows are dropped.
+"""
+import contextlib
+import heapq
+import itertools
+import pickle
+import sys
+import tempfile
+from operator import itemgetter
+
+from column_types import DEFAULT_SAMPLE_ROWS, compile_json_converters, infer_json_kinds
+from pipeline import BATCH_ROWS, Table, batched, unspill_records
+from row_filters import select_indexes
+
+DEFAULT_SORT_MEMORY_MB = 256
+MERGE_FAN_IN = 64
+_KEY = itemgetter(0)
+_ROW = itemgetter(1)
+
+
+def sort_key(kinds, indexes, descending=False):
+    """Key function of a row for the columns at indexes, whose kinds are locked"""
+    converters = compile_json_converters(kinds, parse_dates=True)
+    columns = list(zip(indexes, converters))
+    # Ranks: numbers 0, text 1, empty 2; reversed for a descending sort so
+    # that empty cells still come last
+    empty = (-1, '') if descending else (2, '')
+
+    def key(row):
+        parts = []
+        for index, convert in columns:
+            value = row[index] if index < len(row) else None
+            value = convert(value) if value else None
+            if value is None:
+                parts.append(empty)
+            elif isinstance(value, str) or value != value:  # NaN sorts as text
+                parts.append((1, str(value)))
+            else:
+                parts.append((0, value))
+        return tuple(parts)
+
+    return key
+
+
+def _row_bytes(sample, key):
+    """Average memory of a sampled row held with its key, in bytes"""
+    if not sample:
+        return 1
+    getsizeof = sys.getsizeof
+    total = 0
+    for row in sample:
+        decorated = key(row)
+        total += getsizeof(row) + sum(map(getsizeof, row)) + getsizeof(decorated) + \
+            sum(getsizeof(part) + getsizeof(part[1]) for part in decorated) + 72  # the (key, row) pair
+    return total // len(sample) or 1
+
+
+def _spill_run(pairs):
+    """Write sorted (key, row) pairs to a temp file a batch at a time; returns the file"""
+    f = tempfile.TemporaryFile()
+    try:
+        for batch in batched(iter(pairs), BATCH_ROWS):
+            pickle.dump(batch, f, pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+    except BaseException:
+        f.close()
+        raise
+    return f
+
+
+def _read_run(f):
+    return itertools.chain.from_iterable(unspill_records(f))
+
+
+def _merge(runs, descending):
+    return heapq.merge(*map(_read_run, runs), key=_KEY, reverse=descending)
+
+
+def sort_rows(table, columns, descending=False, memory_mb=DEFAULT_SORT_MEMORY_MB, sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Stage sorting a Table's rows by the named columns (see the module docstring)
+
+    memory_mb bounds the rows (and their keys) held at once; each run is
+    sized from the average row of the first sample_rows rows, which also
+    lock the key types.
+    """
+    indexes = select_indexes(columns, list(table.columns or []))
+    rows = filter(None, table.rows())
+    sample = list(itertools.islice(rows, sample_rows))
+    kinds = infer_json_kinds(sample, parse_dates=True)
+    kinds += ['mixed'] * (max(indexes, default=-1) + 1 - len(kinds))
+    key = sort_key([kinds[index] for index in indexes], indexes, descending)
+    run_rows = max(BATCH_ROWS, memory_mb * 1024 * 1024 // _row_bytes(sample, key))
+    rows = itertools.chain(sample, rows)
+
+    def batches():
+        with contextlib.ExitStack() as stack:
+            runs = []  # (level, file), oldest first
+            spilled = 0
+            while True:
+                run = [(key(row), row) for row in itertools.islice(rows, run_rows)]
+                if not run:
+                    break
+                run.sort(key=_KEY, reverse=descending)
+                if not runs and len(run) < run_rows:
+                    # Everything fit in memory
+                    yield from batched(map(_ROW, run))
+                    return
+                runs.append((0, stack.enter_context(_spill_run(run))))
+                spilled += 1
+                del run
+                # Once the newest MERGE_FAN_IN runs are all of one level, merge
+                # them into a run of the next: every row is rewritten once per
+                # level, and few files are open at a time
+                while len(runs) >= MERGE_FAN_IN and len({level for level, _ in runs[-MERGE_FAN_IN:]}) == 1:
+                    level = runs[-1][0]
+                    group = [f for _, f in runs[-MERGE_FAN_IN:]]
+                    merged = stack.enter_context(_spill_run(_merge(group, descending)))
+                    for f in group:
+                        f.close()
+                    runs[-MERGE_FAN_IN:] = [(level + 1, merged)]
+            if runs:
+                print(f"Merging {spilled} sorted runs spilled to disk (--sort-memory {memory_mb} MB)")
+            yield from batched(map(_ROW, _merge([f for _, f in runs], descending)))
+
+    return Table(table.columns, batches(), table)
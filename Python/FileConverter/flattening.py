@@ -0,0 +1,171 @@
+"""
+Flatten nested JSON records into single-level dicts
+
+flatten_dict joins nested keys with a separator ({'a': {'b': 1}} becomes
+{'a_b': 1}) and turns lists into their str() form. It walks the record
+with an explicit stack, so deeply nested input never hits the recursion
+limit.
+
+Flattener is the fast path for exports where most records share a few
+shapes: the first record of each top-level key tuple is compiled into a
+small straight-line function (the plan), and later records with the same
+keys just call it. A record that doesn't match its plan is flattened generically
+and the plan is rebuilt, so the output is always that of flatten_dict.
+"""
+
+DEFAULT_MAX_PLANS = 1024
+
+
+def flatten_dict(d, parent_key='', sep='_'):
+    """Flatten nested dictionary"""
+    out = {}
+    stack = [(parent_key, iter(d.items()))]
+    while stack:
+        prefix, items = stack[-1]
+        for k, v in items:
+            new_key = f"{prefix}{sep}{k}" if prefix else k
+            if isinstance(v, dict):
+                stack.append((new_key, iter(v.items())))
+                break
+            # Later duplicates overwrite earlier ones in place, like dict(items)
+            out[new_key] = str(v) if isinstance(v, list) else v
+        else:
+            stack.pop()
+    return out
+
+
+_PLAIN_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def _fix_values(out):
+    """Slow path of a plan: stringify lists, or None if a value is a dict (shape changed)"""
+    for key, value in out.items():
+        if isinstance(value, dict):
+            return None
+        if isinstance(value, list):
+            out[key] = str(value)
+    return out
+
+
+def _column_prefixes(columns, sep):
+    """Every flattened key that some column continues with sep ('a' and 'a_b' for 'a_b_c')"""
+    prefixes = set()
+    for column in columns:
+        start = column.find(sep)
+        while start != -1:
+            prefixes.add(column[:start])
+            start = column.find(sep, start + 1)
+    return prefixes
+
+
+def _compile_plan(record, sep, columns=None, prefixes=None):
+    """
+    Compile a function that flattens records shaped like record
+
+    The function is straight-line code: it checks that each nested dict
+    still has the same keys, builds the output with one dict display in
+    flatten_dict's column order, and returns None for a record of a
+    different shape. Returns None instead of a function when the record
+    has non-string keys or two paths flatten to the same column.
+
+    With columns (a set, prefixes from _column_prefixes), only those output
+    columns are produced: other leaves are never read and nested dicts that
+    can't lead to one of them are never entered.
+    """
+    lines = ['def flatten(n0):']
+    entries = []
+    seen = set()
+    nodes = 1
+    stack = [('', 'n0', iter(record.items()))]
+    while stack:
+        prefix, node, items = stack[-1]
+        for k, v in items:
+            if not isinstance(k, str):
+                return None
+            new_key = f"{prefix}{sep}{k}" if prefix else k
+            if columns is not None and new_key and new_key not in columns and new_key not in prefixes:
+                continue
+            if isinstance(v, dict):
+                if columns is not None and new_key and new_key not in prefixes:
+                    # A wanted column that is a dict here; only its type matters
+                    lines.append(f'    if not isinstance({node}[{k!r}], dict): return None')
+                    continue
+                child = f'n{nodes}'
+                nodes += 1
+                lines.append(f'    {child} = {node}[{k!r}]')
+                lines.append(f'    if not isinstance({child}, dict) or tuple({child}) != {tuple(v)!r}: return None')
+                stack.append((new_key, child, iter(v.items())))
+                break
+            if columns is not None and new_key not in columns:
+                # Not wanted, but would lead to wanted columns if it became a dict
+                lines.append(f'    if isinstance({node}[{k!r}], dict): return None')
+                continue
+            if new_key in seen:
+                return None
+            seen.add(new_key)
+            if isinstance(v, list):
+                # Lists are likely to stay lists: stringify them inline
+                value = f'v{len(seen)}'
+                lines.append(f'    {value} = {node}[{k!r}]')
+                entries.append(f'{new_key!r}: str({value}) if isinstance({value}, list) else {value}')
+            else:
+                entries.append(f'{new_key!r}: {node}[{k!r}]')
+        else:
+            stack.pop()
+    lines.append('    out = {' + ', '.join(entries) + '}')
+    lines.append('    if not _PLAIN_TYPES.issuperset(map(type, out.values())): return _fix_values(out)')
+    lines.append('    return out')
+
+    namespace = {'_PLAIN_TYPES': _PLAIN_TYPES, '_fix_values': _fix_values}
+    exec('\n'.join(lines), namespace)
+    return namespace['flatten']
+
+
+class Flattener:
+    """
+    flatten_dict with flattening plans cached per record shape
+
+    Args:
+        sep: Separator between nested key names
+        max_plans: How many plans to compile at most; once reached, records
+            without a matching plan are flattened generically, so input
+            with ever-changing shapes costs no more than flatten_dict
+        columns: Only produce these output columns (None = all); the rest
+            of each record is never flattened
+    """
+
+    def __init__(self, sep='_', max_plans=DEFAULT_MAX_PLANS, columns=None):
+        self.sep = sep
+        self.max_plans = max_plans
+        self.columns = frozenset(columns) if columns is not None else None
+        self.compiled = 0
+        self._prefixes = _column_prefixes(self.columns, sep) if columns is not None else None
+        self._plans = {}
+
+    def _generic(self, record):
+        out = flatten_dict(record, sep=self.sep)
+        if self.columns is None:
+            return out
+        return {key: value for key, value in out.items() if key in self.columns}
+
+    def flatten(self, record):
+        shape = tuple(record)
+        plan = self._plans.get(shape)
+        if plan is not None:
+            out = plan(record)
+            if out is not None:
+                return out
+        elif shape in self._plans:
+            # Shape that can't be planned (colliding columns, non-string keys)
+            return self._generic(record)
+
+        if self.compiled >= self.max_plans:
+            return self._generic(record)
+
+        # New shape, or its nested dicts changed: (re)plan
+        self.compiled += 1
+        plan = _compile_plan(record, self.sep, self.columns, self._prefixes)
+        self._plans[shape] = plan
+        if plan is None:
+            return self._generic(record)
+        return plan(record)
@@ -0,0 +1,331 @@
+"""
+Streaming JSON helpers for the FileConverter scripts
+
+JsonRecordWriter writes records one at a time, either as a JSON array laid
+out exactly like json.dump(records, indent=...) or as JSON Lines, so memory
+stays at one record no matter how large the output is.
+
+JsonRecordReader does the reverse for input: it yields the records of a
+JSON document one by one, holding only the record being decoded.
+JsonLinesReader does the same for JSON Lines (one value per line).
+"""
+import json
+
+DEFAULT_READ_SIZE = 64 * 1024
+JSON_LINES_SUFFIXES = ('.jsonl', '.ndjson')
+_WHITESPACE = ' \t\n\r'
+_NUMBER_CHARS = frozenset('0123456789.eE+-')
+
+
+def encode_record(record, indent=4, ndjson=False):
+    """
+    Encode one record as it appears inside the output
+
+    Pretty array elements are indented one level, matching json.dump of the
+    whole list; JSON Lines records are always compact.
+    """
+    if ndjson or indent is None:
+        return json.dumps(record, ensure_ascii=False)
+    text = json.dumps(record, indent=indent, ensure_ascii=False)
+    # Encoded strings never contain a raw newline, so this only re-indents structure
+    return text.replace('\n', '\n' + ' ' * indent)
+
+
+def _separators(indent, ndjson):
+    """(before first record, between records, after last record) for a layout"""
+    if ndjson:
+        return '', '', ''
+    if indent is None:
+        return '[', ', ', ']'
+    pad = ' ' * indent
+    return '[\n' + pad, ',\n' + pad, '\n]'
+
+
+def join_encoded(texts, indent=4, ndjson=False):
+    """Join encoded records into a block for JsonRecordWriter.write_block()"""
+    if ndjson:
+        return ''.join(text + '\n' for text in texts)
+    return _separators(indent, ndjson)[1].join(texts)
+
+
+class JsonRecordWriter:
+    """
+    Write records to an open text file as a JSON array or JSON Lines
+
+    Args:
+        fp: Text file opened for writing
+        indent: Array indentation (None for compact); ignored for JSON Lines
+        ndjson: Write one compact record per line instead of an array
+    """
+
+    def __init__(self, fp, indent=4, ndjson=False):
+        self.fp = fp
+        self.indent = indent
+        self.ndjson = ndjson
+        self.count = 0
+        self._first, self._next, self._end = _separators(indent, ndjson)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Leave the document unterminated rather than make a partial one look complete
+            self.fp = None
+
+    def write(self, record):
+        self.write_encoded(encode_record(record, self.indent, self.ndjson))
+
+    def write_encoded(self, text):
+        """Write a record already produced by encode_record()"""
+        self.fp.write(self._next if self.count else self._first)
+        self.fp.write(text)
+        if self.ndjson:
+            self.fp.write('\n')
+        self.count += 1
+
+    def write_block(self, block, count):
+        """Write count records already joined by join_encoded()"""
+        if not count:
+            return
+        self.fp.write(self._next if self.count else self._first)
+        self.fp.write(block)
+        self.count += count
+
+    def close(self):
+        if self.fp is None:
+            return
+        if self.count:
+            self.fp.write(self._end)
+        elif not self.ndjson:
+            self.fp.write('[]')
+        self.fp = None
+
+
+class JsonRecordReader:
+    """
+    Yield records from a JSON document without loading the whole file
+
+    Accepts the same shapes json_to_csv always has:
+      - a top-level array: its items are yielded
+      - an object with a list value: the items of the first list are yielded
+      - any other object: the object itself is the only record
+
+    After iteration, root is 'list' or 'dict', and for a dict root list_key
+    names the list that was used (None if the object was wrapped).
+    Memory is bounded by the largest single record.
+
+    Args:
+        fp: Text file opened for reading
+        read_size: Characters read from fp at a time
+    """
+
+    def __init__(self, fp, read_size=DEFAULT_READ_SIZE):
+        self.fp = fp
+        self.read_size = read_size
+        self.root = None
+        self.list_key = None
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=None):
+        """Read more input, dropping the part of the buffer already consumed"""
+        data = self.fp.read(size or self.read_size)
+        if not data:
+            self._eof = True
+            return
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+
+    def _peek(self):
+        """Skip whitespace and return the next character ('' at end of input)"""
+        while True:
+            buf = self._buf
+            pos = self._pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if self._eof:
+                return ''
+            self._fill()
+
+    def _error(self, message):
+        return json.JSONDecodeError(message, self._buf, self._pos)
+
+    def _decode(self):
+        """Decode the complete JSON value starting at the current position"""
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            else:
+                # A number running up to the buffer end may continue in the next read
+                if self._eof or type(value) not in (int, float) or \
+                        (end < len(self._buf) and self._buf[end] not in _NUMBER_CHARS):
+                    self._pos = end
+                    return value
+            # Grow geometrically so one huge record is not re-decoded too often
+            self._fill(max(self.read_size, len(self._buf) - self._pos))
+
+    def _expect(self, char, message):
+        if self._peek() != char:
+            raise self._error(message)
+        self._pos += 1
+
+    def _iter_array(self):
+        """Yield the items of the array whose '[' was just consumed"""
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        while True:
+            self._peek()
+            yield self._decode()
+            char = self._peek()
+            if char == ']':
+                self._pos += 1
+                return
+            self._expect(',', "Expecting ',' delimiter")
+
+    def _iter_object(self):
+        """Yield the records of an object root whose '{' was just consumed"""
+        members = {}
+        if self._peek() == '}':
+            self._pos += 1
+        else:
+            while True:
+                if self._peek() != '"':
+                    raise self._error("Expecting property name enclosed in double quotes")
+                key = self._decode()
+                self._expect(':', "Expecting ':' delimiter")
+                if self._peek() == '[' and self.list_key is None:
+                    self.list_key = key
+                    self._pos += 1
+                    yield from self._iter_array()
+                else:
+                    value = self._decode()
+                    if self.list_key is None:
+                        members[key] = value
+                char = self._peek()
+                if char == '}':
+                    self._pos += 1
+                    break
+                self._expect(',', "Expecting ',' delimiter")
+        self._expect_end()
+
+        if self.list_key is None:
+            if not members:
+                raise ValueError("JSON file is empty!")
+            yield members
+
+    def _expect_end(self):
+        if self._peek() != '':
+            raise self._error("Extra data")
+
+    def __iter__(self):
+        char = self._peek()
+        if char == '\ufeff' and self._pos == 0:
+            raise self._error("Unexpected UTF-8 BOM (decode using utf-8-sig)")
+        if char == '':
+            raise self._error("Expecting value")
+
+        if char == '[':
+            self.root = 'list'
+            self._pos += 1
+            count = 0
+            for item in self._iter_array():
+                count += 1
+                yield item
+            self._expect_end()
+            if not count:
+                raise ValueError("JSON file is empty!")
+        elif char == '{':
+            self.root = 'dict'
+            self._pos += 1
+            yield from self._iter_object()
+        else:
+            value = self._decode()
+            self._expect_end()
+            if not value:
+                raise ValueError("JSON file is empty!")
+            raise ValueError("JSON root must be a list of objects or a dict containing a list")
+
+
+def json_line_error(lineno, message, colno):
+    """Error for a JSON Lines line that doesn't decode"""
+    return ValueError(f"Invalid JSON on line {lineno}: {message} (column {colno})")
+
+
+class JsonLinesReader:
+    """
+    Yield the records of a JSON Lines file, one per non-blank line
+
+    Has the same root/list_key attributes as JsonRecordReader (root is
+    'lines') so callers can treat both readers alike.
+
+    Args:
+        fp: Text file opened for reading
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.root = 'lines'
+        self.list_key = None
+
+    def __iter__(self):
+        count = 0
+        for lineno, line in enumerate(self.fp, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise json_line_error(lineno, e.msg, e.colno) from None
+            count += 1
+            yield record
+        if not count:
+            raise ValueError("JSON file is empty!")
+
+
+def is_json_lines(fp, read_size=DEFAULT_READ_SIZE):
+    """
+    Guess whether an open text file holds JSON Lines rather than one document
+
+    True when the first non-blank line is a complete JSON value and another
+    non-blank line follows it. A single-line file is treated as a document,
+    which is how json_to_csv has always read it. Only the first read_size
+    characters are decoded: a first value that doesn't end within them is
+    taken to start a document, so a large single-line file is never held
+    whole. Rewinds fp.
+    """
+    try:
+        text = fp.read(read_size)
+        start = len(text) - len(text.lstrip(_WHITESPACE))
+        if text[start:start + 1] not in ('{', '['):
+            return False
+        try:
+            _, end = json.JSONDecoder().raw_decode(text, start)
+        except json.JSONDecodeError:
+            return False
+        if '\n' in text[start:end]:
+            return False
+        # The rest of the first line must be blank, and something must follow it
+        newline = False
+        while True:
+            for char in text[end:]:
+                if char == '\n':
+                    newline = True
+                elif char not in _WHITESPACE:
+                    return newline
+            text, end = fp.read(read_size), 0
+            if not text:
+                return False
+    finally:
+        fp.seek(0)
@@ -0,0 +1,61 @@
+"""
+Process-pool helpers shared by the FileConverter scripts, and the
+peak-memory probe used when timing work in a separate process
+"""
+import multiprocessing
+import os
+import sys
+from collections import deque
+
+
+def resolve_jobs(jobs):
+    """Number of worker processes for a --jobs value (0 or None = all cores)"""
+    if not jobs:
+        return os.cpu_count() or 1
+    if jobs < 0:
+        raise ValueError("--jobs must be 0 (all cores) or a positive number")
+    return jobs
+
+
+def ordered_map(func, tasks, jobs, window=None):
+    """
+    Run func(task) in a process pool and yield results in task order
+
+    At most `window` tasks (default: 2 per worker) are in flight, so results
+    never pile up in memory faster than the caller consumes them.
+    """
+    window = window or jobs * 2
+    with multiprocessing.Pool(jobs) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(func, (task,)))
+            if len(pending) >= window:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def peak_rss_bytes(children=False):
+    """
+    Peak resident set size of this process, or None if unavailable
+
+    With children, that of its largest finished child process (e.g. a
+    pool worker) instead.
+    """
+    if not children:
+        # Linux keeps ru_maxrss across exec, so a freshly spawned process
+        # would report its parent's peak; VmHWM starts over
+        try:
+            with open('/proc/self/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
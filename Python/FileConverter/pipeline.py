@@ -0,0 +1,668 @@
+"""
+Streaming conversion pipeline shared by the FileConverter scripts
+
+A conversion is reader -> stages -> writer, in one pass that holds no more
+than a batch of rows at a time:
+
+  readers   read_csv, read_json and read_excel (sheet_table for an open
+            worksheet) turn an input file into a Table: the column names
+            plus record batches, lists of rows holding the strings a CSV
+            file would (None for a cell that a short row doesn't have)
+  stages    filter_rows (select/where on the raw strings), json_records and
+            excel_rows (per-column type inference and conversion),
+            profile_rows (column statistics, see column_stats)
+  writers   write_csv, write_json and write_excel; the CSV and JSON writers
+            can split their output across shard files (see sharding)
+
+Any input therefore converts directly to any output, with the same result
+as going through an intermediate CSV file with the single-format scripts,
+which are built on these same functions. convert.py is the command-line
+front end.
+
+CSV and JSON files may be gzip, bzip2 or xz compressed; they are
+decompressed and compressed while streaming (see compressed_io).
+"""
+import csv
+import itertools
+import json
+import pickle
+import tempfile
+from pathlib import Path
+
+from column_types import (DEFAULT_SAMPLE_ROWS, compile_excel_converters, compile_json_converters,
+                          convert_excel_cell, convert_row, convert_value, infer_excel_kinds, infer_json_kinds)
+from compressed_io import open_file, open_output, strip_compression
+from csv_chunks import dialect_params
+from flattening import Flattener
+from json_stream import JSON_LINES_SUFFIXES, JsonLinesReader, JsonRecordReader, JsonRecordWriter, is_json_lines
+from row_filters import compile_where, select_indexes
+from xlsx_reader import get_sheet, open_workbook, sheet_rows
+from xlsx_stream import SheetPaginator, StreamingXlsxWriter, XlsxAppender, existing_sheet_names, stale_rollover_sheets
+
+BATCH_ROWS = 1000
+HEADER_STRATEGIES = ('scan', 'spill')
+INPUT_FORMATS = ('auto', 'json', 'jsonl')
+ENGINES = ('auto', 'stream', 'openpyxl')
+
+
+class Table:
+    """
+    Column names and the rows under them
+
+    Args:
+        columns: Header row (list of names), or None for an empty input
+        batches: One-shot iterable of record batches (lists of rows)
+        source: Open file, workbook or Table the batches are read from;
+            writers close it once they are done
+    """
+
+    def __init__(self, columns, batches, source=None):
+        self.columns = columns
+        self.batches = batches
+        self.source = source
+        # Rows seen so far by filter_rows(), before filtering
+        self.scanned = None
+
+    def rows(self):
+        """The rows of every batch, one by one"""
+        return itertools.chain.from_iterable(self.batches)
+
+    def close(self):
+        """Stop reading, closing the input"""
+        close = getattr(self.batches, 'close', None)
+        if close is not None:
+            close()
+        if self.source is not None:
+            self.source.close()
+
+
+def batched(rows, size=BATCH_ROWS):
+    """Group rows into record batches"""
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def csv_text(value):
+    """A value as csv.writer writes it"""
+    if value is None:
+        return ''
+    if type(value) is str:
+        return value
+    return repr(value) if type(value) is float else str(value)
+
+
+# --- CSV -------------------------------------------------------------------
+
+def sniff_dialect(csv_path, encoding='utf-8'):
+    """csv.reader() arguments for a file's dialect, detected from its start"""
+    with open_file(csv_path, 'r', encoding=encoding) as file:
+        sample = file.read(8192)  # Read larger sample
+
+    try:
+        dialect = csv.Sniffer().sniff(sample)
+        print(f"Detected delimiter: '{dialect.delimiter}'")
+    except csv.Error:
+        print("Could not auto-detect delimiter, using comma")
+        dialect = 'excel'
+    return dialect_params(dialect)
+
+
+def read_csv(csv_path, encoding='utf-8', params=None, newline=None):
+    """
+    Table of a CSV file: the first row is the header, later rows are read as they are
+
+    params are csv.reader() arguments (see csv_chunks.dialect_params);
+    None sniffs them from the file. newline is open()'s: by default line
+    breaks inside quoted fields become plain newlines, as
+    csv_chunks.read_chunk_text gives them to parallel workers; '' keeps
+    them as they are in the file.
+    """
+    if params is None:
+        params = sniff_dialect(csv_path, encoding)
+    f = open_file(csv_path, 'r', encoding=encoding, newline=newline)
+    try:
+        reader = csv.reader(f, **params)
+        columns = next(reader, None)
+    except BaseException:
+        f.close()
+        raise
+    return Table(columns, batched(reader), f)
+
+
+def write_csv(table, csv_path, encoding='utf-8', delimiter=',', lineterminator='\r\n', shards=None):
+    """
+    Write a Table as CSV; returns the number of rows under the header
+
+    With shards (a sharding.ShardSet for csv_path) the rows are split
+    across its shard files instead, each starting with the header.
+    """
+    count = 0
+    try:
+        if shards is not None:
+            for f, rows in shards.split(table.rows(), encoding, newline=''):
+                writer = csv.writer(f, delimiter=delimiter, lineterminator=lineterminator)
+                if table.columns is not None:
+                    writer.writerow(table.columns)
+                writer.writerows(rows)
+            return shards.rows
+        with open_file(csv_path, 'w', encoding=encoding, newline='') as f:
+            writer = csv.writer(f, delimiter=delimiter, lineterminator=lineterminator)
+            if table.columns is not None:
+                writer.writerow(table.columns)
+            for batch in table.batches:
+                writer.writerows(batch)
+                count += len(batch)
+    finally:
+        table.close()
+    return count
+
+
+# --- JSON ------------------------------------------------------------------
+
+def process_record(item, flattener, fields=None):
+    """
+    Turn a dict record into a CSV row dict: flattened, or with nested values as JSON strings
+
+    With fields, everything else is dropped before it is serialised; a
+    flattener should then be built with columns=fields.
+    """
+    # Flattened values are never dicts or lists
+    if flattener:
+        return flattener.flatten(item)
+
+    # Handle nested objects by converting to strings
+    processed_item = {}
+    keys = item if fields is None else [key for key in fields if key in item]
+    for key in keys:
+        value = item[key]
+        if isinstance(value, (dict, list)):
+            # Convert complex types to JSON string
+            processed_item[key] = json.dumps(value, ensure_ascii=False)
+        else:
+            processed_item[key] = value
+    return processed_item
+
+
+def make_flattener(flatten, fields):
+    if not flatten:
+        return None
+    return Flattener(columns=fields)
+
+
+def _processed_records(reader, flatten, fields=None, warn=False):
+    """Yield the dict records of a reader ready for csv.DictWriter"""
+    flattener = make_flattener(flatten, fields)
+    for item in reader:
+        if not isinstance(item, dict):
+            if warn:
+                print(f"Warning: Skipping non-dict item: {type(item)}")
+            continue
+        yield process_record(item, flattener, fields)
+
+
+def _open_reader(f, input_format):
+    return JsonLinesReader(f) if input_format == 'jsonl' else JsonRecordReader(f)
+
+
+def _report_root(reader):
+    """Explain how a non-list JSON root was interpreted"""
+    if reader.root == 'dict':
+        if reader.list_key is not None:
+            print(f"Warning: Root is a dict. Used first list value ('{reader.list_key}')")
+        else:
+            print("Warning: Root is a dict, not a list. Wrapped in list.")
+
+
+def _scan_fields(json_path, encoding, flatten, fields, input_format):
+    """First pass: collect the union of keys (of fields, if given) and count rows without converting values"""
+    all_fields = set()
+    row_count = 0
+    flattener = make_flattener(flatten, fields)
+    wanted = set(fields) if fields else None
+    with open_file(json_path, 'r', encoding=encoding) as f:
+        reader = _open_reader(f, input_format)
+        for item in reader:
+            if not isinstance(item, dict):
+                print(f"Warning: Skipping non-dict item: {type(item)}")
+                continue
+            if flattener:
+                all_fields.update(flattener.flatten(item))
+            elif wanted is not None:
+                all_fields.update(wanted.intersection(item))
+            else:
+                all_fields.update(item)
+            row_count += 1
+    _report_root(reader)
+    return all_fields, row_count
+
+
+def _spill_records(json_path, encoding, flatten, fields, spill, input_format):
+    """Single pass: collect the union of keys while pickling rows to a temp file"""
+    all_fields = set()
+    row_count = 0
+    with open_file(json_path, 'r', encoding=encoding) as f:
+        reader = _open_reader(f, input_format)
+        for item in _processed_records(reader, flatten, fields, warn=True):
+            all_fields.update(item)
+            pickle.dump(item, spill, pickle.HIGHEST_PROTOCOL)
+            row_count += 1
+    _report_root(reader)
+    return all_fields, row_count
+
+
+def unspill_records(spill):
+    """Read back rows pickled back to back into a file"""
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+
+def resolve_json_format(json_path, encoding, input_format):
+    """'json' or 'jsonl' for an --input-format value, sniffing the file for 'auto'"""
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"Unknown input format: {input_format} (choose from {', '.join(INPUT_FORMATS)})")
+    if input_format != 'auto':
+        return input_format
+    if strip_compression(json_path).suffix.lower() in JSON_LINES_SUFFIXES:
+        return 'jsonl'
+    with open_file(json_path, 'r', encoding=encoding) as f:
+        if is_json_lines(f):
+            print("Detected JSON Lines input")
+            return 'jsonl'
+    return 'json'
+
+
+def json_fieldnames(all_fields, row_count, fields=None):
+    """The CSV header for the keys found in the records: fields (in order) if given, else all keys sorted"""
+    if not row_count:
+        raise ValueError("No valid data rows to export")
+
+    if fields:
+        # Use specified fields only
+        fieldnames = [f for f in fields if f in all_fields]
+        if not fieldnames:
+            raise ValueError(f"None of the specified fields exist in data: {fields}")
+        print(f"Exporting fields: {', '.join(fieldnames)}")
+        return fieldnames
+    return sorted(all_fields)
+
+
+def read_json(json_path, encoding='utf-8', flatten=False, fields=None, header_strategy='scan',
+              input_format='auto'):
+    """
+    Table of a JSON document or JSON Lines file, one row per dict record
+
+    The header is the union of all keys (sorted), or the given fields that
+    occur, so it is only known after every record has been seen:
+    header_strategy 'scan' reads the input twice (keys only, then rows),
+    'spill' reads it once and buffers rows in a temp file. Nested values
+    become JSON strings, or 'parent_child' columns with flatten.
+    input_format is 'json', 'jsonl' or 'auto' (see resolve_json_format).
+    """
+    if header_strategy not in HEADER_STRATEGIES:
+        raise ValueError(f"Unknown header strategy: {header_strategy} (choose from {', '.join(HEADER_STRATEGIES)})")
+    input_format = resolve_json_format(json_path, encoding, input_format)
+    fields = list(fields) if fields else None
+
+    if flatten:
+        print("Flattening nested JSON structures...")
+
+    # Neither strategy keeps the records in memory
+    if header_strategy == 'spill':
+        source = tempfile.TemporaryFile()
+        try:
+            fieldnames = json_fieldnames(*_spill_records(json_path, encoding, flatten, fields, source, input_format),
+                                         fields)
+        except BaseException:
+            source.close()
+            raise
+        source.seek(0)
+        records = unspill_records(source)
+    else:
+        fieldnames = json_fieldnames(*_scan_fields(json_path, encoding, flatten, fields, input_format), fields)
+        source = open_file(json_path, 'r', encoding=encoding)
+        records = _processed_records(_open_reader(source, input_format), flatten, fields)
+
+    rows = ([csv_text(record.get(key)) for key in fieldnames] for record in records)
+    return Table(fieldnames, batched(rows), source)
+
+
+def build_row_converter(spec):
+    """
+    Build a function turning a raw CSV row (list of strings) into a record
+
+    spec is a picklable tuple (fieldnames, kinds, preserve_strings,
+    parse_dates, select, where) so worker processes can rebuild the same
+    converter. The function returns None for rows rejected by the where
+    conditions; those rows and unselected columns are never type-converted.
+    Records match what csv.DictReader plus convert_value would produce.
+    """
+    fieldnames, kinds, preserve_strings, parse_dates, select, where = spec
+    converters = compile_json_converters(kinds, preserve_strings, parse_dates)
+    keep = compile_where(where, fieldnames)
+    width = len(fieldnames)
+
+    if select:
+        columns = [(name, index, converters[index])
+                   for name, index in zip(select, select_indexes(select, fieldnames))]
+
+        def convert(row):
+            if keep is not None and not keep(row):
+                return None
+            size = len(row)
+            return {name: to_value(row[index] if index < size else None) for name, index, to_value in columns}
+        return convert
+
+    unique_names = len(set(fieldnames)) == width
+
+    def convert(row):
+        if keep is not None and not keep(row):
+            return None
+        if len(row) == width and unique_names:
+            return {key: to_value(value) for key, to_value, value in zip(fieldnames, converters, row)}
+        # Short/long rows or duplicate column names: same dict as csv.DictReader
+        record = dict(zip(fieldnames, row))
+        if len(row) > width:
+            record[None] = row[width:]
+        else:
+            for key in fieldnames[len(row):]:
+                record[key] = None
+        return {key: convert_value(value, preserve_strings, parse_dates) for key, value in record.items()}
+    return convert
+
+
+def json_spec(fieldnames, sample, preserve_strings=False, parse_dates=False, select=None, where=None):
+    """
+    build_row_converter() spec with column kinds locked from sample rows
+
+    Only sample rows as wide as the header are used for inference.
+    """
+    width = len(fieldnames)
+    kinds = infer_json_kinds([row for row in sample if len(row) == width], parse_dates)
+    kinds += ['mixed'] * (width - len(kinds))
+    if kinds and not preserve_strings:
+        print(f"Column types: {', '.join(kinds)}")
+    if select:
+        print(f"Selecting columns: {', '.join(select)}")
+    return (tuple(fieldnames), tuple(kinds), preserve_strings, parse_dates,
+            tuple(select) if select else None, tuple(where) if where else None)
+
+
+def json_records(table, preserve_strings=False, parse_dates=False, sample_rows=DEFAULT_SAMPLE_ROWS, select=None,
+                 where=None, profile=None):
+    """
+    Stage turning a Table's rows into JSON records (dicts) with typed values
+
+    Column kinds (and date formats, with parse_dates) are locked from the
+    first sample_rows rows, see column_types. select and where are applied
+    as filter_rows() does, but types are inferred from every column of the
+    unfiltered sample. Blank rows are skipped; table.scanned counts the rest.
+
+    profile (a column_stats.TableProfile for the select columns at their
+    positions in the rows) observes the raw strings of the rows kept.
+    """
+    rows = table.rows()
+    sample = list(itertools.islice(rows, sample_rows))
+    convert = build_row_converter(json_spec(table.columns or [], sample, preserve_strings, parse_dates,
+                                            select, where))
+    table.scanned = 0
+    kept = []
+    for row in itertools.chain(sample, rows):
+        if not row:
+            continue
+        table.scanned += 1
+        record = convert(row)
+        if record is not None:
+            if profile is not None:
+                kept.append(row)
+                if len(kept) >= BATCH_ROWS:
+                    profile.observe(kept)
+                    kept = []
+            yield record
+    if profile is not None:
+        profile.observe(kept)
+
+
+def write_json(table, json_path, encoding='utf-8', pretty=True, ndjson=False, preserve_strings=False,
+               parse_dates=False, sample_rows=DEFAULT_SAMPLE_ROWS, select=None, where=None, profile=None,
+               shards=None):
+    """
+    Write a Table as a JSON array of records, or JSON Lines with ndjson
+
+    With shards (a sharding.ShardSet for json_path) the records are split
+    across its shard files instead, each a complete array (or JSON Lines
+    file). Returns the number of records written (see json_records).
+    """
+    indent = 4 if pretty else None
+    try:
+        if shards is not None:
+            records = json_records(table, preserve_strings, parse_dates, sample_rows, select, where, profile)
+            for outfile, shard_records in shards.split(records, encoding):
+                with JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+                    for record in shard_records:
+                        writer.write(record)
+            return shards.rows
+        with open_output(json_path, encoding=encoding) as outfile, \
+                JsonRecordWriter(outfile, indent=indent, ndjson=ndjson) as writer:
+            for record in json_records(table, preserve_strings, parse_dates, sample_rows, select, where, profile):
+                writer.write(record)
+    finally:
+        table.close()
+    return writer.count
+
+
+# --- Excel -----------------------------------------------------------------
+
+def sheet_table(ws, window=None, source=None):
+    """
+    Table of an open worksheet, with cells as pandas' read_excel + to_csv writes them
+
+    window (from xlsx_reader.sheet_window()) selects part of the sheet;
+    source (the workbook) is closed with the Table.
+    """
+    rows = sheet_rows(ws, window)
+    try:
+        columns = next(rows)
+    except BaseException:
+        if source is not None:
+            source.close()
+        raise
+    return Table(columns, batched(rows), source)
+
+
+def read_excel(excel_path, sheet_name=None, sheet_index=0, window=None):
+    """Table of one sheet of a workbook, by name or else by 0-based index (see sheet_table)"""
+    wb = open_workbook(excel_path)
+    try:
+        ws = get_sheet(wb, sheet_name=sheet_name or None, sheet_index=sheet_index)
+    except BaseException:
+        wb.close()
+        raise
+    return sheet_table(ws, window, source=wb)
+
+
+def excel_rows(table, sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Stage turning the header and every row of a Table into Excel cell values
+
+    Column kinds are locked from the first sample_rows rows, see column_types.
+    """
+    rows = table.rows()
+    if table.columns is not None:
+        rows = itertools.chain([table.columns], rows)
+    sample = list(itertools.islice(rows, sample_rows))
+    kinds = infer_excel_kinds(sample)
+    if kinds:
+        print(f"Column types: {', '.join(kinds)}")
+    converters = compile_excel_converters(kinds)
+
+    for row_data in itertools.chain(sample, rows):
+        yield convert_row(converters, row_data, convert_excel_cell)
+
+
+def write_excel(table, excel_path, sheet_name='Sheet1', start_row=1, start_col=1, engine='auto',
+                sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Write a Table, header first, to a sheet of a new or existing workbook
+
+    engine 'stream' writes sheet XML directly (new workbook, new sheet, or
+    full replacement of an existing sheet), 'openpyxl' loads the whole
+    workbook in memory, 'auto' uses openpyxl only to update an existing
+    sheet in place.
+
+    Rows beyond Excel's 1,048,576-row limit continue on sheets named
+    <sheet>_2, <sheet>_3, ... with the header repeated. When the stream
+    engine replaces <sheet>, continuation sheets an earlier, longer run
+    left beyond the ones this run needs are removed.
+
+    Returns (rows written including the header, names of the sheets used).
+    """
+    excel_path = Path(excel_path)
+    pages = SheetPaginator(excel_rows(table, sample_rows), sheet_name, start_row, start_col)
+    try:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine '{engine}' (choose from: {', '.join(ENGINES)})")
+        if engine == 'auto':
+            # Overwriting part of an existing sheet keeps its other cells,
+            # which only the openpyxl engine can do
+            if excel_path.exists() and sheet_name.lower() in (n.lower() for n in existing_sheet_names(excel_path)):
+                engine = 'openpyxl'
+            else:
+                engine = 'stream'
+
+        if engine == 'stream':
+            _write_with_stream(excel_path, sheet_name, pages, start_col)
+        else:
+            _write_with_openpyxl(excel_path, pages, start_col)
+    finally:
+        table.close()
+    return pages.rows_read, pages.sheet_names
+
+
+def _write_with_stream(excel_path, sheet_name, pages, start_col):
+    """
+    Stream rows straight into sheet XML
+
+    New workbooks are written from scratch. For an existing workbook only the
+    target sheet is written; every other part is copied over unchanged, and a
+    sheet with the same name is replaced entirely, along with the
+    continuation sheets it had.
+    """
+    replacing = False
+    if excel_path.exists():
+        book = XlsxAppender(excel_path)
+        replacing = sheet_name.lower() in (n.lower() for n in book.sheet_names)
+        if replacing:
+            print(f"Replacing sheet '{sheet_name}' in existing Excel file: {excel_path} (streaming)")
+        else:
+            print(f"Appending sheet '{sheet_name}' to existing Excel file: {excel_path} (streaming)")
+    else:
+        print(f"Creating new Excel file: {excel_path} (streaming)")
+        book = StreamingXlsxWriter(excel_path)
+
+    with book:
+        current = None
+        for name, row_index, values in pages:
+            if name != current:
+                if current is not None:
+                    print(f"Sheet '{current}' is full, continuing on '{name}'")
+                sheet = book.add_sheet(name)
+                current = name
+            sheet.write_row(row_index, values, start_col)
+        if replacing:
+            for name in stale_rollover_sheets(book.sheet_names, sheet_name, len(pages.sheet_names)):
+                print(f"Removing sheet '{name}' left over from an earlier, longer '{sheet_name}'")
+                book.remove_sheet(name)
+
+
+def _write_with_openpyxl(excel_path, pages, start_col):
+    """Write rows cell by cell through an in-memory openpyxl workbook"""
+    import openpyxl
+
+    # Load or create workbook
+    if excel_path.exists():
+        print(f"Loading existing Excel file: {excel_path}")
+        wb = openpyxl.load_workbook(excel_path)
+    else:
+        print(f"Creating new Excel file: {excel_path}")
+        wb = openpyxl.Workbook()
+        # Remove default sheet if creating new workbook
+        if 'Sheet' in wb.sheetnames:
+            wb.remove(wb['Sheet'])
+
+    # Write converted rows to Excel, creating or selecting each sheet
+    current = None
+    for sheet_name, row_index, values in pages:
+        if sheet_name != current:
+            if sheet_name in wb.sheetnames:
+                print(f"Writing to existing sheet: {sheet_name}")
+                sheet = wb[sheet_name]
+            else:
+                print(f"Creating new sheet: {sheet_name}")
+                sheet = wb.create_sheet(title=sheet_name)
+            current = sheet_name
+        for col_index, value in enumerate(values, start=start_col):
+            sheet.cell(row=row_index, column=col_index, value=value)
+
+    # Cells are updated in place here, so sheets this run didn't reach are kept
+    base_name = pages.sheet_names[0]
+    stale = stale_rollover_sheets(wb.sheetnames, base_name, len(pages.sheet_names))
+    if stale:
+        print(f"⚠️  Sheets {', '.join(stale)} still hold rows of an earlier, longer '{base_name}'; "
+              f"use --engine stream to replace the sheet and remove them")
+
+    wb.save(excel_path)
+
+
+# --- Stages ----------------------------------------------------------------
+
+def filter_rows(table, select=None, where=None):
+    """
+    Stage keeping the rows that match every where condition, and only the
+    select columns (in that order)
+
+    Conditions are checked on the raw strings before any conversion (see
+    row_filters); blank rows are dropped. The returned Table's scanned
+    counts the non-blank rows seen.
+    """
+    columns = table.columns or []
+    keep = compile_where(where, columns)
+    indexes = select_indexes(select, columns) if select else None
+    out = Table(list(select) if select else table.columns, None, table)
+    out.scanned = 0
+
+    def batches():
+        for batch in table.batches:
+            rows = [row for row in batch if row]
+            out.scanned += len(rows)
+            if keep is not None:
+                rows = [row for row in rows if keep(row)]
+            if indexes is not None:
+                rows = [[row[index] if index < len(row) else None for index in indexes] for row in rows]
+            if rows:
+                yield rows
+
+    out.batches = batches()
+    return out
+
+
+def profile_rows(table, profile):
+    """
+    Stage passing a Table's batches on unchanged while profile (a
+    column_stats.TableProfile) observes them
+    """
+    out = Table(table.columns, None, table)
+
+    def batches():
+        for batch in table.batches:
+            profile.observe(batch)
+            yield batch
+        out.scanned = table.scanned
+
+    out.batches = batches()
+    return out
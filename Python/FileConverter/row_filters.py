@@ -0,0 +1,119 @@
+"""
+Row predicates and column selection evaluated on raw CSV strings
+
+Filters run before any type conversion, so rows and columns that are
+dropped cost one string comparison (or nothing) instead of a full convert.
+
+Condition syntax (several conditions are ANDed):
+    country = US              equality on the raw string (also ==, !=)
+    age >= 30                 numeric when the literal is a number, else text (<, <=, >, >=)
+    status in (open,pending)  membership (also: not in)
+    name ~ ^A.*son$           regex search (also !~ for no match)
+"""
+import re
+
+_CONDITION = re.compile(
+    r'^\s*(?P<column>.+?)\s*'
+    r'(?P<op>==|!=|<=|>=|!~|=|<|>|~|\s+not\s+in\s+|\s+in\s+)'
+    r'\s*(?P<value>.*?)\s*$',
+    re.IGNORECASE,
+)
+_COMPARE = {
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def _unquote(text):
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in '\'"':
+        return text[1:-1]
+    return text
+
+
+def _as_number(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_condition(text):
+    """Split a condition string into (column, operator, value)"""
+    match = _CONDITION.match(text)
+    if not match:
+        raise ValueError(f"Invalid condition: {text!r} (expected e.g. 'age >= 30' or 'city in (A,B)')")
+    column = _unquote(match.group('column'))
+    op = ' '.join(match.group('op').lower().split())
+    value = match.group('value')
+    if op in ('in', 'not in'):
+        if value.startswith('(') and value.endswith(')'):
+            value = value[1:-1]
+        value = frozenset(_unquote(item.strip()) for item in value.split(','))
+    else:
+        value = _unquote(value)
+    return column, ('==' if op == '=' else op), value
+
+
+def _column_index(column, fieldnames):
+    try:
+        return fieldnames.index(column)
+    except ValueError:
+        raise ValueError(f"Unknown column {column!r}; available: {', '.join(fieldnames)}") from None
+
+
+def _compile_condition(column, op, value, index):
+    def raw(row):
+        return row[index] if index < len(row) else ''
+
+    if op == '==':
+        return lambda row: raw(row) == value
+    if op == '!=':
+        return lambda row: raw(row) != value
+    if op == 'in':
+        return lambda row: raw(row) in value
+    if op == 'not in':
+        return lambda row: raw(row) not in value
+    if op in ('~', '!~'):
+        pattern = re.compile(value)
+        if op == '~':
+            return lambda row: pattern.search(raw(row)) is not None
+        return lambda row: pattern.search(raw(row)) is None
+
+    compare = _COMPARE[op]
+    number = _as_number(value)
+    if number is None:
+        return lambda row: compare(raw(row), value)
+
+    def numeric(row):
+        cell = _as_number(raw(row))
+        return cell is not None and compare(cell, number)
+    return numeric
+
+
+def compile_where(conditions, fieldnames):
+    """
+    Build a predicate over raw rows (lists of strings) from condition strings
+
+    Returns None when there are no conditions.
+    """
+    if not conditions:
+        return None
+    checks = []
+    for text in conditions:
+        column, op, value = parse_condition(text)
+        checks.append(_compile_condition(column, op, value, _column_index(column, fieldnames)))
+    if len(checks) == 1:
+        return checks[0]
+    return lambda row: all(check(row) for check in checks)
+
+
+def select_indexes(columns, fieldnames):
+    """Positions of the selected columns in the header, validating the names"""
+    return [_column_index(column, fieldnames) for column in columns]
+
+
+def parse_column_list(text):
+    """Parse a --select value ('a,b,c') into a list of column names"""
+    return [name.strip() for name in text.split(',') if name.strip()]
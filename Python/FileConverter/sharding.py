@@ -0,0 +1,153 @@
+"""
+Output split across numbered shard files (--shard-rows / --shard-bytes)
+
+A ShardSet turns one output path into name.part-0001.ext, name.part-0002.ext,
+... (data.csv.gz -> data.part-0001.csv.gz). Writers ask it for one shard at
+a time while streaming, and it rolls over to the next file once the current
+one holds shard_rows rows or shard_bytes characters (counted before any
+compression; a shard is closed after the row that reaches the limit).
+Each shard is a complete file of its own: writers repeat the CSV header or
+open and close the JSON array in every shard.
+
+When the output is done, write_manifest() saves <output>.shards.json with
+the row count, size and SHA-256 of each shard. Shards listed by an earlier
+manifest for the same output that this run didn't write are removed.
+"""
+import json
+import os
+from pathlib import Path
+
+from batch_manifest import file_sha256
+from compressed_io import open_output, strip_compression
+
+MANIFEST_SUFFIX = '.shards.json'
+_END = object()
+
+
+def shard_path(path, number):
+    """Path of the numbered shard of an output: data.csv.gz, 1 -> data.part-0001.csv.gz"""
+    path = Path(path)
+    stripped = strip_compression(path)
+    compression = path.name[len(stripped.name):]
+    return path.with_name(f"{stripped.stem}.part-{number:04d}{stripped.suffix}{compression}")
+
+
+def manifest_path(path):
+    path = Path(path)
+    return path.with_name(path.name + MANIFEST_SUFFIX)
+
+
+def check_shard_limit(value):
+    """argparse type for --shard-rows / --shard-bytes"""
+    number = int(value)
+    if number < 1:
+        raise ValueError("shard size must be at least 1")
+    return number
+
+
+class _CountingFile:
+    """Text file wrapper counting the characters written through it"""
+
+    def __init__(self, f):
+        self.f = f
+        self.chars = 0
+
+    def write(self, text):
+        self.chars += len(text)
+        return self.f.write(text)
+
+
+class ShardSet:
+    """
+    The shard files of one output
+
+    Args:
+        path: The output as it would be without sharding
+        shard_rows: Rows per shard
+        shard_bytes: Characters per shard (before compression)
+    """
+
+    def __init__(self, path, shard_rows=None, shard_bytes=None):
+        if not shard_rows and not shard_bytes:
+            raise ValueError("Give shard_rows or shard_bytes")
+        self.path = Path(path)
+        self.shard_rows = shard_rows
+        self.shard_bytes = shard_bytes
+        self.shards = []  # (path, rows) of each finished shard
+        self._file = None
+        self._rows = 0
+
+    @property
+    def rows(self):
+        return sum(rows for _, rows in self.shards)
+
+    def _full(self):
+        return ((self.shard_rows and self._rows >= self.shard_rows) or
+                (self.shard_bytes and self._file.chars >= self.shard_bytes))
+
+    def _shard_items(self, first, items):
+        """This shard's items: first, then more until the shard is full"""
+        item = first
+        while True:
+            yield item
+            self._rows += 1
+            if self._full():
+                return
+            item = next(items, _END)
+            if item is _END:
+                return
+
+    def split(self, items, encoding='utf-8', newline=None):
+        """
+        Yield (file, items) for each shard in turn
+
+        The file is the open shard; items iterates over the rows (or
+        records) belonging in it, and must be used up before the next
+        shard is requested. An empty input still gets one, empty, shard.
+        """
+        items = iter(items)
+        first = next(items, _END)
+        while True:
+            path = shard_path(self.path, len(self.shards) + 1)
+            with open_output(path, encoding=encoding, newline=newline) as f:
+                self._file = _CountingFile(f)
+                self._rows = 0
+                yield self._file, (iter(()) if first is _END else self._shard_items(first, items))
+            self.shards.append((path, self._rows))
+            first = next(items, _END)
+            if first is _END:
+                return
+
+    def write_manifest(self, source=None):
+        """Write <output>.shards.json, remove shards left over from an earlier run; returns its path"""
+        path = manifest_path(self.path)
+        written = {shard.name for shard, _ in self.shards}
+        if path.exists():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    stale = [entry['path'] for entry in json.load(f).get('shards', [])]
+            except (OSError, ValueError, KeyError, TypeError):
+                stale = []
+            for name in stale:
+                shard = self.path.with_name(Path(name).name)
+                if shard.name not in written and shard.exists():
+                    os.remove(shard)
+
+        manifest = {
+            'source': str(source) if source is not None else None,
+            'output': str(self.path),
+            'shard_rows': self.shard_rows,
+            'shard_bytes': self.shard_bytes,
+            'rows': self.rows,
+            'shards': [{'path': shard.name, 'rows': rows, 'bytes': os.path.getsize(shard),
+                        'sha256': file_sha256(shard)} for shard, rows in self.shards],
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+            f.write('\n')
+        print(f"Wrote {len(self.shards)} shards of {self.path.name}; manifest: {path}")
+        return path
+
+    def outputs(self):
+        """Every file written: the shards, then the manifest"""
+        return [shard for shard, _ in self.shards] + [manifest_path(self.path)]
@@ -0,0 +1,311 @@
+"""
+Bulk loading of pipeline Tables into SQLite, and query results back out as Tables
+
+Loading is built for speed on large files:
+  - rows are converted a column at a time and inserted with executemany()
+    a batch at a time, committing every COMMIT_ROWS rows rather than per row
+  - during the load the connection runs without a rollback journal and
+    without fsync (bulk_load_pragmas); a crash mid-load can leave the
+    database unusable, so load into a new file or keep a copy
+  - indexes are built once the rows are in, which is far cheaper than
+    updating them on every insert
+  - rows loaded into other database files (e.g. by worker processes) are
+    merged with a single INSERT ... SELECT inside SQLite (append_database)
+
+Inserts name their columns, so a file appended to an existing table may
+list the table's columns in any order; a file with other columns is
+refused (check_append_columns).
+
+Values are typed as CSVtoJSON types them (column_types, the same rules as
+convert_value): each column's kind is locked from a sample of rows and
+becomes its declared SQL type.
+"""
+import contextlib
+import itertools
+import sqlite3
+
+from column_types import DEFAULT_SAMPLE_ROWS, compile_json_converters, infer_json_kinds
+from pipeline import BATCH_ROWS, Table, batched
+
+IF_EXISTS = ('fail', 'replace', 'append')
+COMMIT_ROWS = 500000
+INSERT_BATCH_ROWS = BATCH_ROWS * 10
+LOAD_PRAGMAS = (
+    'PRAGMA journal_mode = OFF',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',  # 256 MB
+)
+SQL_TYPES = {
+    'int': 'INTEGER',
+    'float': 'REAL',
+    'bool': 'INTEGER',
+    'text': 'TEXT',
+    'mixed': '',  # no affinity: values are stored as converted
+}
+# SQLite integers are 64-bit
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+def quote_identifier(name):
+    """A name as a quoted SQL identifier"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def column_names(header):
+    """Header names usable as SQL columns: blanks named column_N, duplicates suffixed _2, _3, ..."""
+    names = []
+    seen = set()
+    for index, name in enumerate(header, 1):
+        name = (name or '').strip() or f'column_{index}'
+        unique = name
+        suffix = 2
+        while unique.lower() in seen:
+            unique = f'{name}_{suffix}'
+            suffix += 1
+        seen.add(unique.lower())
+        names.append(unique)
+    return names
+
+
+def sql_type(kind):
+    if kind.startswith('date:'):
+        return 'TEXT'
+    return SQL_TYPES[kind]
+
+
+def column_kinds(sample, width, preserve_strings=False, parse_dates=False):
+    """A kind per column from sample rows; columns the sample doesn't cover are 'mixed'"""
+    if preserve_strings:
+        return ['text'] * width
+    kinds = infer_json_kinds([row for row in sample if len(row) == width], parse_dates)
+    return kinds + ['mixed'] * (width - len(kinds))
+
+
+def parse_index_spec(text):
+    """Columns of an --index value: 'country' or 'country,city' for a composite index"""
+    columns = [column.strip() for column in text.split(',') if column.strip()]
+    if not columns:
+        raise ValueError(f"Empty index specification: '{text}'")
+    return columns
+
+
+def table_exists(conn, name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def table_bytes(conn, name):
+    """Bytes of the pages holding a table and its indexes, or None where SQLite lacks the dbstat table"""
+    try:
+        row = conn.execute("SELECT sum(dbstat.pgsize) FROM dbstat JOIN sqlite_master "
+                           "ON dbstat.name = sqlite_master.name WHERE sqlite_master.tbl_name = ?",
+                           (name,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] or 0
+
+
+@contextlib.contextmanager
+def bulk_load_pragmas(conn):
+    """Run a block with LOAD_PRAGMAS, restoring the journal and sync modes after"""
+    if conn.in_transaction:
+        conn.commit()
+    journal_mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+    synchronous = conn.execute('PRAGMA synchronous').fetchone()[0]
+    for pragma in LOAD_PRAGMAS:
+        conn.execute(pragma)
+    try:
+        yield
+    finally:
+        # Without a journal there is nothing to roll back to
+        if conn.in_transaction:
+            conn.execute('COMMIT')
+        conn.execute(f'PRAGMA journal_mode = {journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {synchronous}')
+
+
+def check_append_columns(conn, name, columns):
+    """
+    Check that loaded columns match an existing table's by name (in any
+    order, case-insensitively as SQLite compares them)
+    """
+    existing = [row[1] for row in conn.execute(f"PRAGMA table_info({quote_identifier(name)})")]
+    existing_names = {column.lower() for column in existing}
+    loaded_names = {column.lower() for column in columns}
+    missing = [column for column in existing if column.lower() not in loaded_names]
+    extra = [column for column in columns if column.lower() not in existing_names]
+    if missing or extra:
+        problems = []
+        if missing:
+            problems.append(f"missing {', '.join(missing)}")
+        if extra:
+            problems.append(f"not in the table: {', '.join(extra)}")
+        raise ValueError(f"Can't append to table '{name}', its columns differ ({'; '.join(problems)})")
+
+
+def create_table(conn, name, columns, kinds, if_exists='fail'):
+    """Create the table for a load, or check it may be appended to"""
+    if if_exists not in IF_EXISTS:
+        raise ValueError(f"Unknown if_exists: {if_exists} (choose from {', '.join(IF_EXISTS)})")
+    quoted = quote_identifier(name)
+    if table_exists(conn, name):
+        if if_exists == 'fail':
+            raise ValueError(f"Table '{name}' already exists (use --if-exists replace or append)")
+        if if_exists == 'append':
+            check_append_columns(conn, name, columns)
+            return
+        conn.execute(f"DROP TABLE {quoted}")
+    definitions = ', '.join(f"{quote_identifier(column)} {sql_type(kind)}".rstrip()
+                            for column, kind in zip(columns, kinds))
+    conn.execute(f"CREATE TABLE {quoted} ({definitions})")
+
+
+def _safe_int(value):
+    """
+    A converted value SQLite can store: integers beyond 64 bits become
+    their digits (which an INTEGER or REAL column then keeps as a REAL)
+    """
+    if type(value) is int and not _INT64_MIN <= value <= _INT64_MAX:
+        return str(value)
+    return value
+
+
+def convert_column(kind, convert, values):
+    """
+    Convert one column of a batch as its converter would, value by value
+
+    Columns of plain digits in an INTEGER column, and of numbers in a REAL
+    column (which stores int('3') and float('3') alike), take a fast path
+    with the same result. Integers too big for SQLite are made safe
+    (_safe_int) before anything is inserted.
+    """
+    if kind == 'int' and all(values) and ''.join(values).isdigit():
+        # Up to 18 digits always fit in 64 bits
+        if max(map(len, values)) <= 18:
+            return map(int, values)
+        return map(_safe_int, map(int, values))
+    if kind == 'float' and all(values):
+        try:
+            return list(map(float, values))
+        except ValueError:
+            pass
+    if kind == 'text' or kind.startswith('date:'):
+        return map(convert, values)
+    return map(_safe_int, map(convert, values))
+
+
+def _column_list(columns):
+    return ', '.join(map(quote_identifier, columns))
+
+
+def insert_rows(conn, name, columns, kinds, rows, preserve_strings=False, parse_dates=False):
+    """
+    Convert raw string rows and insert them into the named columns of an
+    existing table
+
+    Blank rows are skipped; short rows are padded with NULLs and cells
+    beyond the columns are dropped. Returns the number of rows inserted.
+    """
+    quoted = quote_identifier(name)
+    width = len(kinds)
+    converters = compile_json_converters(kinds, preserve_strings, parse_dates)
+    insert = f"INSERT INTO {quoted} ({_column_list(columns)}) VALUES ({', '.join('?' * width)})"
+    padding = [None] * width
+
+    loaded = 0
+    uncommitted = 0
+    conn.execute('BEGIN')
+    for batch in batched(filter(None, rows), INSERT_BATCH_ROWS):
+        if set(map(len, batch)) != {width}:
+            batch = [(row + padding)[:width] for row in batch]
+        # Convert column by column, then back into rows
+        values = list(zip(*[convert_column(kind, convert, column)
+                            for kind, convert, column in zip(kinds, converters, zip(*batch))]))
+        conn.executemany(insert, values)
+        loaded += len(values)
+        uncommitted += len(values)
+        if uncommitted >= COMMIT_ROWS:
+            conn.execute('COMMIT')
+            conn.execute('BEGIN')
+            uncommitted = 0
+    conn.execute('COMMIT')
+    return loaded
+
+
+def append_database(conn, name, path, columns, source_name=None):
+    """Append the named columns of a table in another database file; returns the row count"""
+    source = quote_identifier(source_name or name)
+    column_list = _column_list(columns)
+    conn.execute("ATTACH DATABASE ? AS chunk", (str(path),))
+    try:
+        conn.execute('BEGIN')
+        cursor = conn.execute(f"INSERT INTO {quote_identifier(name)} ({column_list}) "
+                              f"SELECT {column_list} FROM chunk.{source}")
+        conn.execute('COMMIT')
+        return cursor.rowcount
+    finally:
+        conn.execute("DETACH DATABASE chunk")
+
+
+def create_indexes(conn, name, indexes):
+    """Build an index per list of columns; returns the index names"""
+    created = []
+    for columns in indexes:
+        index_name = f"idx_{name}_{'_'.join(columns)}"
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {quote_identifier(index_name)} ON {quote_identifier(name)} "
+                     f"({', '.join(quote_identifier(column) for column in columns)})")
+        created.append(index_name)
+    return created
+
+
+def load_table(table, conn, name, if_exists='fail', indexes=None, preserve_strings=False, parse_dates=False,
+               sample_rows=DEFAULT_SAMPLE_ROWS):
+    """
+    Insert a Table's rows into an SQLite table
+
+    Args:
+        table: pipeline Table of raw strings (closed when done)
+        conn: sqlite3 connection
+        name: Table to create or fill
+        if_exists: 'fail', 'replace' (drop it first) or 'append'
+        indexes: Lists of columns to index once the rows are loaded
+        preserve_strings, parse_dates, sample_rows: as for CSVtoJSON;
+            with preserve_strings every column is TEXT
+
+    Returns:
+        (rows loaded, column kinds)
+    """
+    try:
+        if table.columns is None:
+            raise ValueError("Input has no header row")
+        columns = column_names(table.columns)
+        rows = table.rows()
+        sample = list(itertools.islice(filter(None, rows), sample_rows))
+        kinds = column_kinds(sample, len(columns), preserve_strings, parse_dates)
+
+        with bulk_load_pragmas(conn):
+            create_table(conn, name, columns, kinds, if_exists)
+            loaded = insert_rows(conn, name, columns, kinds, itertools.chain(sample, rows), preserve_strings,
+                                 parse_dates)
+            for index_name in create_indexes(conn, name, indexes or []):
+                print(f"Created index {index_name}")
+    finally:
+        table.close()
+    return loaded, kinds
+
+
+def query_table(conn, sql, params=()):
+    """Table streaming the result of a query; values keep their SQLite types"""
+    cursor = conn.execute(sql, params)
+    columns = [description[0] for description in cursor.description or ()]
+
+    def batches():
+        while True:
+            batch = cursor.fetchmany(BATCH_ROWS)
+            if not batch:
+                return
+            yield batch
+
+    return Table(columns, batches(), cursor)
@@ -0,0 +1,55 @@
+"""
+Tests for CSVtoJSON: parallel conversion matches a plain single-process run,
+and a failed conversion leaves the old output in place
+
+Run with: python -m pytest test_csv_to_json.py
+"""
+import json
+
+import pytest
+
+import json_stream
+from CSVtoJSON import csv_to_json
+
+
+def _write_crlf_csv(path, rows):
+    # Big enough to be split into several chunks (see csv_chunks.MIN_CHUNK_BYTES)
+    lines = ['id,note,amount']
+    for i in range(rows):
+        lines.append(f'{i},"line one\r\nline two {i}",{i * 1.5}')
+    path.write_bytes(('\r\n'.join(lines) + '\r\n').encode('utf-8'))
+    return path
+
+
+def test_jobs_output_matches_plain_output_for_crlf_input(tmp_path):
+    csv_file = _write_crlf_csv(tmp_path / 'notes.csv', 30000)
+    plain = tmp_path / 'plain.json'
+    parallel = tmp_path / 'parallel.json'
+
+    csv_to_json(csv_file, plain)
+    csv_to_json(csv_file, parallel, jobs=4)
+
+    records = json.loads(plain.read_text(encoding='utf-8'))
+    assert len(records) == 30000
+    assert records[7]['note'] == 'line one\nline two 7'
+    assert parallel.read_bytes() == plain.read_bytes()
+
+
+def test_failed_conversion_keeps_the_old_output(tmp_path, monkeypatch):
+    csv_file = tmp_path / 'people.csv'
+    csv_file.write_text('name,age\nAda,36\nAlan,41\n', encoding='utf-8')
+    json_file = tmp_path / 'people.json'
+    json_file.write_text('[{"name": "Grace"}]', encoding='utf-8')
+    encode_record = json_stream.encode_record
+
+    def failing_encode(record, *args):
+        if record['name'] == 'Alan':
+            raise RuntimeError('disk full')
+        return encode_record(record, *args)
+
+    monkeypatch.setattr(json_stream, 'encode_record', failing_encode)
+    with pytest.raises(RuntimeError):
+        csv_to_json(csv_file, json_file)
+
+    assert json_file.read_text(encoding='utf-8') == '[{"name": "Grace"}]'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['people.csv', 'people.json']
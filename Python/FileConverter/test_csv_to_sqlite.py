@@ -0,0 +1,111 @@
+"""
+Tests for CSVtoSQLite: appending to a table, and batch loads into a shared
+database
+
+Run with: python -m pytest test_csv_to_sqlite.py
+"""
+import os
+import sqlite3
+
+import pytest
+
+import sqlite_store
+from CSVtoSQLite import batch_csv_to_sqlite, csv_to_sqlite
+
+
+def _write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return path
+
+
+def _table_rows(db_file, table):
+    conn = sqlite3.connect(db_file)
+    try:
+        return conn.execute(f'SELECT * FROM "{table}" ORDER BY rowid').fetchall()
+    finally:
+        conn.close()
+
+
+def test_append_matches_columns_by_name(tmp_path):
+    db_file = tmp_path / 'data.db'
+    csv_to_sqlite(_write(tmp_path / 'jan.csv', 'id,city,amount\n1,Oslo,9.5\n'), db_file, 'sales')
+    csv_to_sqlite(_write(tmp_path / 'feb.csv', 'amount,id,city\n3.25,2,Rome\n'), db_file, 'sales',
+                  if_exists='append')
+
+    assert _table_rows(db_file, 'sales') == [(1, 'Oslo', 9.5), (2, 'Rome', 3.25)]
+
+
+def test_append_with_different_columns_names_them(tmp_path):
+    db_file = tmp_path / 'data.db'
+    csv_to_sqlite(_write(tmp_path / 'jan.csv', 'id,city,amount\n1,Oslo,9.5\n'), db_file, 'sales')
+
+    with pytest.raises(ValueError, match=r"missing amount; not in the table: price"):
+        csv_to_sqlite(_write(tmp_path / 'feb.csv', 'id,city,price\n2,Rome,3\n'), db_file, 'sales',
+                      if_exists='append')
+    assert _table_rows(db_file, 'sales') == [(1, 'Oslo', 9.5)]
+
+
+def test_append_with_an_oversized_integer_keeps_every_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlite_store, 'INSERT_BATCH_ROWS', 3)
+    db_file = tmp_path / 'data.db'
+    conn = sqlite3.connect(db_file)
+    conn.execute('CREATE TABLE sales (id INTEGER PRIMARY KEY, amount INTEGER)')
+    conn.execute('INSERT INTO sales VALUES (1, 10)')
+    conn.commit()
+    conn.close()
+
+    big = '12345678901234567890'
+    count = csv_to_sqlite(_write(tmp_path / 'new.csv', f'id,amount\n500,1\n501,2\n502,3\n600,4\n601,{big}\n602,6\n'),
+                          db_file, 'sales', if_exists='append')
+
+    assert count == 6
+    rows = _table_rows(db_file, 'sales')
+    assert [row[0] for row in rows] == [1, 500, 501, 502, 600, 601, 602]
+    assert rows[5][1] == float(big)
+
+
+def test_batch_summary_counts_each_table_not_the_database(tmp_path):
+    sales = _write(tmp_path / 'sales.csv', 'id,amount\n1,9.5\n2,3.25\n3,1\n')
+    people = _write(tmp_path / 'people.csv', 'name,age\nAda,36\nAlan,41\n')
+    db_file = tmp_path / 'data.db'
+
+    summary = batch_csv_to_sqlite([sales, people], db_file)
+
+    files = {os.path.basename(record['input']): record for record in summary['files']}
+    assert files['sales.csv']['table'] == 'sales'
+    assert files['sales.csv']['rows'] == 3
+    assert files['people.csv']['rows'] == 2
+    # Each table is a part of the database, and together they don't exceed it
+    assert all(0 < record['bytes_out'] < os.path.getsize(db_file) for record in files.values())
+    assert summary['bytes_out'] < 2 * os.path.getsize(db_file)
+
+
+def test_incremental_batch_reloads_only_changed_inputs(tmp_path):
+    sales = _write(tmp_path / 'sales.csv', 'id,amount\n1,9.5\n2,3.25\n')
+    people = _write(tmp_path / 'people.csv', 'name,age\nAda,36\n')
+    db_file = tmp_path / 'data.db'
+
+    first = batch_csv_to_sqlite([sales, people], db_file, incremental=True)
+    assert first['counts']['ok'] == 2
+
+    _write(people, 'name,age\nAda,36\nAlan,41\n')
+    os.utime(people, ns=(os.stat(people).st_atime_ns, os.stat(people).st_mtime_ns + 10 ** 9))
+    second = batch_csv_to_sqlite([sales, people], db_file, incremental=True)
+
+    statuses = {os.path.basename(record['input']): record['status'] for record in second['files']}
+    assert statuses == {'sales.csv': 'skipped', 'people.csv': 'ok'}
+    assert _table_rows(db_file, 'sales') == [(1, 9.5), (2, 3.25)]
+    assert _table_rows(db_file, 'people') == [('Ada', 36), ('Alan', 41)]
+
+
+def test_jobs_load_matches_plain_load_for_crlf_input(tmp_path):
+    lines = ['id,note'] + [f'{i},"line one\r\nline two {i}"' for i in range(40000)]
+    csv_file = tmp_path / 'notes.csv'
+    csv_file.write_bytes(('\r\n'.join(lines) + '\r\n').encode('utf-8'))
+
+    csv_to_sqlite(csv_file, tmp_path / 'plain.db', 'notes')
+    csv_to_sqlite(csv_file, tmp_path / 'parallel.db', 'notes', jobs=4)
+
+    rows = _table_rows(tmp_path / 'plain.db', 'notes')
+    assert rows[7] == (7, 'line one\nline two 7')
+    assert _table_rows(tmp_path / 'parallel.db', 'notes') == rows
@@ -0,0 +1,111 @@
+"""
+Tests for xlsx_stream: adding sheets to an existing workbook, rolling a
+table over to extra sheets, replacing it, and sizing what it writes
+
+Run with: python -m pytest test_xlsx_stream.py
+"""
+import zipfile
+
+import openpyxl
+import openpyxl.worksheet._reader
+import pytest
+
+import xlsx_stream
+from pipeline import Table, write_excel
+from xlsx_reader import open_workbook
+from xlsx_stream import StreamingXlsxWriter, XlsxAppender, existing_sheet_names
+
+
+@pytest.fixture
+def small_sheets(monkeypatch):
+    """Sheets of 5 rows, so a few rows are enough to roll over"""
+    monkeypatch.setattr(xlsx_stream, 'EXCEL_MAX_ROWS', 5)
+
+
+def _table(rows):
+    return Table(['id', 'name'], iter([[[str(n), f'name {n}'] for n in range(1, rows + 1)]]))
+
+
+def _sheet_values(path, name):
+    wb = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [list(row) for row in wb[name].iter_rows(values_only=True)]
+    finally:
+        wb.close()
+
+
+@pytest.mark.parametrize('raw_copy', [True, False], ids=['raw', 'recompressed'])
+def test_appending_a_sheet_keeps_the_other_parts(tmp_path, monkeypatch, raw_copy):
+    monkeypatch.setattr(xlsx_stream, 'RAW_COPY', raw_copy)
+    path = tmp_path / 'book.xlsx'
+    wb = openpyxl.Workbook()
+    wb.active.title = 'Keep'
+    for n in range(200):
+        wb.active.append([n, f'text {n}'])
+    wb.save(path)
+    with zipfile.ZipFile(path) as zf:
+        before = {name: zf.read(name) for name in zf.namelist()}
+
+    with XlsxAppender(path) as book:
+        book.add_sheet('New').write_row(1, ['a', 'b'])
+
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        after = {name: zf.read(name) for name in zf.namelist()}
+    rewritten = {'xl/workbook.xml', 'xl/_rels/workbook.xml.rels', '[Content_Types].xml'}
+    assert {name: data for name, data in after.items() if name in before and name not in rewritten} == \
+        {name: data for name, data in before.items() if name not in rewritten}
+    assert existing_sheet_names(path) == ['Keep', 'New']
+    assert _sheet_values(path, 'Keep')[199] == [199, 'text 199']
+    assert _sheet_values(path, 'New') == [['a', 'b']]
+
+
+def test_rows_roll_over_with_the_header_repeated(tmp_path, small_sheets):
+    path = tmp_path / 'out.xlsx'
+    count, sheet_names = write_excel(_table(10), path, 'Data', engine='stream')
+
+    assert count == 11
+    assert sheet_names == ['Data', 'Data_2', 'Data_3']
+    assert _sheet_values(path, 'Data_2')[0] == ['id', 'name']
+
+
+def test_replacing_with_fewer_rows_removes_stale_rollover_sheets(tmp_path, small_sheets):
+    path = tmp_path / 'out.xlsx'
+    write_excel(_table(2), path, 'Other', engine='stream')
+    write_excel(_table(14), path, 'Data', engine='stream')
+    write_excel(_table(1), path, 'Summary', engine='stream')
+    assert existing_sheet_names(path) == ['Other', 'Data', 'Data_2', 'Data_3', 'Data_4', 'Summary']
+
+    _, sheet_names = write_excel(_table(6), path, 'Data', engine='stream')
+
+    assert sheet_names == ['Data', 'Data_2']
+    assert existing_sheet_names(path) == ['Other', 'Data', 'Data_2', 'Summary']
+    assert _sheet_values(path, 'Data_2') == [['id', 'name'], [5, 'name 5'], [6, 'name 6']]
+    assert _sheet_values(path, 'Summary') == [['id', 'name'], [1, 'name 1']]
+
+
+def test_stream_written_sheets_are_sized_without_parsing_their_rows(tmp_path, monkeypatch):
+    path = tmp_path / 'big.xlsx'
+    with StreamingXlsxWriter(path) as writer:
+        sheet = writer.add_sheet('Data')
+        for n in range(1, 5001):
+            sheet.write_row(n, [n, f'name {n % 10}', None, n * 1.5], start_col=2)
+        writer.add_sheet('Empty')
+
+    # Count the XML elements openpyxl's read-only mode parses to size each sheet
+    iterparse = openpyxl.worksheet._reader.iterparse
+    parsed = []
+
+    def counting_iterparse(source):
+        for event in iterparse(source):
+            parsed.append(event)
+            yield event
+
+    monkeypatch.setattr(openpyxl.worksheet._reader, 'iterparse', counting_iterparse)
+    wb = open_workbook(path)
+    try:
+        assert len(parsed) < 10
+        assert (wb['Data'].min_column, wb['Data'].max_column, wb['Data'].max_row) == (2, 5, 5000)
+        assert wb['Empty'].max_row == 1
+    finally:
+        wb.close()
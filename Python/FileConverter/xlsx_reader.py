@@ -0,0 +1,407 @@
+"""
+Streaming XLSX reading that matches pandas.read_excel(...).to_csv(index=False)
+
+pandas builds a whole DataFrame before writing anything. Here a sheet is
+streamed with openpyxl in read-only mode instead: one pass keeps a few
+flags per column (which decide the column's dtype, exactly what pandas
+needs the whole column for) while pickling the rows to a temp file, then
+the rows are read back and each cell formatted the way that dtype is
+written by to_csv (sheet_rows). Memory depends on the number of columns,
+not rows.
+
+The pandas rules reproduced, per column (header is the first row):
+  - empty cells, Excel errors and NA strings ('NA', 'null', 'nan', ...) are NaN
+  - all numbers, bools or numeric strings -> int64 ('7'), or float64 ('7.0')
+    as soon as one value is a float or NaN; only bools -> bool (ints beyond
+    int64 follow pandas' own special cases, see _Column.dtype)
+  - otherwise only bools or 'True'/'false'-style strings -> 'True'/'False'
+  - only datetimes -> '2024-01-01', or with times when any has one
+  - anything else stays as it is (str() of the cell value)
+Headers get 'Unnamed: N' for blanks and '.1', '.2' suffixes for duplicates.
+Trailing empty rows and cells are dropped, other rows padded to full width.
+"""
+import datetime
+import pickle
+import re
+import tempfile
+
+# pandas' default na_values
+NA_STRINGS = frozenset((
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+))
+# Values of error cells, as openpyxl returns them (pandas reads them as NaN)
+ERROR_STRINGS = frozenset(('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A', '#GETTING_DATA'))
+_TRUE_STRINGS = frozenset(('True', 'TRUE', 'true'))
+_BOOL_STRINGS = _TRUE_STRINGS | frozenset(('False', 'FALSE', 'false'))
+_INT_STRING = re.compile(r'\s*[+-]?[0-9]+\s*')
+_FLOAT_STRING = re.compile(
+    r'\s*[+-]?(?:[0-9]+\.?[0-9]*(?:[eE][+-]?[0-9]+)?|\.[0-9]+(?:[eE][+-]?[0-9]+)?|inf(?:inity)?)\s*',
+    re.IGNORECASE)
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+_UINT64_MAX = 2 ** 64 - 1
+
+
+def open_workbook(path):
+    """
+    Open a workbook the way pandas' openpyxl engine does (read-only, cached formula values)
+
+    A sheet's <dimension> element is only a hint (often stale, or missing,
+    in which case openpyxl finds the size by parsing the sheet once while
+    loading), so sheets are read after reset_dimensions(): the used range
+    is the rows actually iterated.
+    """
+    import openpyxl
+    return openpyxl.load_workbook(path, read_only=True, data_only=True, keep_links=False)
+
+
+def get_sheet(wb, sheet_name=None, sheet_index=0):
+    """Worksheet by name, else by 0-based index, with pandas' error messages"""
+    if sheet_name is not None:
+        if sheet_name not in wb.sheetnames:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+        return wb[sheet_name]
+    sheets = wb.worksheets
+    if not 0 <= sheet_index < len(sheets):
+        raise ValueError(f"Worksheet index {sheet_index} is invalid, {len(sheets)} worksheets found")
+    return sheets[sheet_index]
+
+
+def _cell(value):
+    """pandas' cell conversion: integral floats become ints, errors become NaN (None)"""
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    if type(value) is str and value in ERROR_STRINGS:
+        return None
+    return value
+
+
+def _is_na(value):
+    return value is None or (type(value) is str and value in NA_STRINGS) or value != value
+
+
+def sheet_window(cell_range=None, skip_rows=0, max_rows=None):
+    """
+    iter_rows() bounds for part of a sheet
+
+    cell_range is an Excel range ('B2:H5000', 'B:H' or '2:5000'); its first
+    row is the header. skip_rows more rows are skipped before the header and
+    at most max_rows rows follow it. Reading stops at the last row of the
+    window, so a small window of a huge sheet is cheap.
+    """
+    if skip_rows < 0:
+        raise ValueError("skip_rows must not be negative")
+    if max_rows is not None and max_rows < 0:
+        raise ValueError("max_rows must not be negative")
+    min_col = max_col = max_row = None
+    min_row = 1
+    if cell_range:
+        from openpyxl.utils import range_boundaries
+        min_col, first_row, max_col, max_row = range_boundaries(cell_range)
+        min_row = first_row or 1
+    min_row += skip_rows
+    if max_rows is not None:
+        last = min_row + max_rows
+        max_row = last if max_row is None else min(max_row, last)
+    return {'min_row': min_row, 'max_row': max_row, 'min_col': min_col, 'max_col': max_col}
+
+
+def _sheet_rows(ws, window=None):
+    """Converted cell values of every row (in the window), trailing empty cells trimmed"""
+    ws.reset_dimensions()
+    for row in ws.iter_rows(values_only=True, **(window or {})):
+        row = [_cell(value) for value in row]
+        while row and (row[-1] is None or row[-1] == ''):
+            row.pop()
+        yield row
+
+
+class _Column:
+    """What pandas' type inference needs to know about one column"""
+
+    __slots__ = ('present', 'first', 'numeric', 'floats', 'ints', 'big', 'huge', 'negative',
+                 'bools', 'datetimes', 'timedeltas', 'has_time', 'fraction', 'zero', 'one')
+
+    def __init__(self):
+        self.present = 0
+        self.first = None
+        self.numeric = True
+        self.floats = False
+        self.ints = False
+        self.big = False
+        self.huge = False
+        self.negative = False
+        self.bools = True
+        self.datetimes = True
+        self.timedeltas = True
+        self.has_time = False
+        self.fraction = 0
+        self.zero = None
+        self.one = None
+
+    def add(self, value):
+        """Account for one value that is not NaN"""
+        self.present += 1
+        kind = type(value)
+        if kind is not bool and (kind is not str or value not in _BOOL_STRINGS) and \
+                (kind is not int or (value != 0 and value != 1)):
+            # 0 and 1 only pass if a False or True came before them, see dtype()
+            self.bools = False
+        if kind is not datetime.datetime:
+            self.datetimes = False
+        elif self.datetimes:
+            if value.microsecond:
+                self.fraction = max(self.fraction, 3 if value.microsecond % 1000 == 0 else 6)
+            if value.hour or value.minute or value.second or value.microsecond:
+                self.has_time = True
+        if kind is not datetime.timedelta:
+            self.timedeltas = False
+        if (kind is bool or kind is int) and (value == 0 or value == 1):
+            # Which of 0/False and 1/True came first; see _object_formatter()
+            if value and self.one is None:
+                self.one = value
+            elif not value and self.zero is None:
+                self.zero = value
+
+        if not self.numeric or kind is bool:
+            return
+        if kind is float:
+            self.floats = True
+        elif kind is int:
+            self._add_int(value)
+        elif kind is str and _INT_STRING.fullmatch(value):
+            self._add_int(int(value))
+        elif kind is str and _FLOAT_STRING.fullmatch(value):
+            self.floats = True
+        else:
+            self.numeric = False
+
+    def _add_int(self, value):
+        self.ints = True
+        if _INT64_MIN <= value < 0:
+            self.negative = True
+        if value < _INT64_MIN or value > _UINT64_MAX:
+            self.huge = True
+        elif value > _INT64_MAX:
+            self.big = True
+
+    def dtype(self, rows):
+        """Name of the dtype pandas ends up with for a column of this many rows"""
+        has_na = self.present < rows
+        if not self.present:
+            return 'float'
+        if self.numeric:
+            # uint64 values next to NaN or negative ints: pandas gives up, values stay as read
+            if self.big and (has_na or self.negative):
+                return 'raw'
+            if self.huge and not self.floats and not has_na:
+                # Python ints, unless the first value was a bool (then as read)
+                return 'raw' if type(self.first) is bool else 'bigint'
+            if self.floats or has_na or self.huge:
+                return 'float'
+            return 'int' if self.ints else 'bool'
+        # pandas only tries bools when the first value isn't an int (or bool), and
+        # after 0 and 1 were replaced by an equal value that came first (False, True)
+        if self.bools and not isinstance(self.first, int) and \
+                type(self.zero) is not int and type(self.one) is not int:
+            return 'bool'
+        if self.datetimes:
+            return 'datetime'
+        if self.timedeltas:
+            return 'timedelta'
+        return 'object'
+
+
+def _format_float(value):
+    if value is None or (type(value) is str and value in NA_STRINGS) or value != value:
+        return ''
+    if type(value) is str:
+        return repr(float(value.strip()))
+    return repr(float(value))
+
+
+def _format_int(value):
+    return str(int(value))
+
+
+def _format_bool(value):
+    if _is_na(value):
+        return ''
+    if type(value) is str:
+        return 'True' if value in _TRUE_STRINGS else 'False'
+    return 'True' if value else 'False'
+
+
+def _datetime_formatter(has_time, fraction):
+    if not has_time:
+        def format_value(value):
+            return '' if _is_na(value) else f'{value.year:04d}-{value.month:02d}-{value.day:02d}'
+        return format_value
+
+    def format_value(value):
+        if _is_na(value):
+            return ''
+        text = (f'{value.year:04d}-{value.month:02d}-{value.day:02d} '
+                f'{value.hour:02d}:{value.minute:02d}:{value.second:02d}')
+        if fraction == 3:
+            text += f'.{value.microsecond // 1000:03d}'
+        elif fraction == 6:
+            text += f'.{value.microsecond:06d}'
+        return text
+    return format_value
+
+
+def _format_timedelta(value):
+    if _is_na(value):
+        return ''
+    hours, rest = divmod(value.seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    text = f'{value.days} days {hours:02d}:{minutes:02d}:{seconds:02d}'
+    if value.microseconds:
+        text += f'.{value.microseconds:06d}'
+    return text
+
+
+def _format_bigint(value):
+    return '' if value is None or type(value) is bool else str(int(value))
+
+
+def _format_raw(value):
+    if value is None:
+        return ''
+    return repr(value) if type(value) is float else str(value)
+
+
+def _format_object(value):
+    if type(value) is str:
+        return '' if value in NA_STRINGS else value
+    if value is None or value != value:
+        return ''
+    return repr(value) if type(value) is float else str(value)
+
+
+def _object_formatter(column):
+    """
+    _format_object, except that in pandas object columns 1 and True (and 0
+    and False) are equal values, all written like the first one that occurs
+    """
+    first = {0: column.zero, 1: column.one}
+
+    def format_value(value):
+        kind = type(value)
+        if (kind is bool or kind is int) and (value == 0 or value == 1):
+            return str(first[value])
+        return _format_object(value)
+    return format_value
+
+
+def _formatter(column, rows):
+    dtype = column.dtype(rows)
+    if dtype == 'datetime':
+        return _datetime_formatter(column.has_time, column.fraction)
+    if dtype == 'object' and (column.zero is not None or column.one is not None):
+        return _object_formatter(column)
+    return {
+        'float': _format_float,
+        'int': _format_int,
+        'bool': _format_bool,
+        'bigint': _format_bigint,
+        'raw': _format_raw,
+        'timedelta': _format_timedelta,
+        'object': _format_object,
+    }[dtype]
+
+
+def header_names(header, width):
+    """Column names for a header row: 'Unnamed: N' for blanks, duplicates numbered like pandas"""
+    names = []
+    unnamed = []
+    for i in range(width):
+        value = header[i] if i < len(header) else None
+        if value is None or value == '':
+            names.append(f'Unnamed: {i}')
+            unnamed.append(i)
+        else:
+            names.append(value)
+
+    # Named columns claim their names before unnamed ones get numbered
+    counts = {}
+    for i in [i for i in range(width) if i not in unnamed] + unnamed:
+        col = original = names[i]
+        cur_count = counts.get(col, 0)
+        while cur_count > 0:
+            counts[original] = cur_count + 1
+            col = f'{original}.{cur_count}'
+            cur_count = cur_count + 1 if col in names else counts.get(col, 0)
+        names[i] = col
+        counts[col] = cur_count + 1
+    return [_format_object(name) if not isinstance(name, str) else name for name in names]
+
+
+def scan_sheet(ws, spill=None, window=None):
+    """
+    Read a sheet once, collecting what its dtypes depend on
+
+    Returns (header, width, data_rows, columns): the raw header row, the
+    padded row width, the number of data rows after trailing empty rows
+    are dropped, and a _Column per column. With spill (a binary file), the
+    data rows are also pickled to it, for _unspill_rows(). window (from
+    sheet_window()) limits the pass to part of the sheet.
+    """
+    rows = _sheet_rows(ws, window)
+    header = next(rows, None)
+    if header is None:
+        return None, 0, 0, []
+    width = len(header)
+    columns = [_Column() for _ in range(width)]
+    data_rows = 0
+    for index, row in enumerate(rows, 1):
+        if len(row) > width:
+            columns.extend(_Column() for _ in range(len(row) - width))
+            width = len(row)
+        if index == 1:
+            for column, value in zip(columns, row):
+                column.first = value
+        if spill is not None:
+            pickle.dump(row, spill, pickle.HIGHEST_PROTOCOL)
+        if not row:
+            continue
+        data_rows = index
+        for column, value in zip(columns, row):
+            if not _is_na(value):
+                column.add(value)
+    return header, width, data_rows, columns
+
+
+def _unspill_rows(spill):
+    """Read back the rows written by scan_sheet()"""
+    while True:
+        try:
+            yield pickle.load(spill)
+        except EOFError:
+            return
+
+
+def sheet_rows(ws, window=None):
+    """
+    Yield the header row and then every data row of a worksheet, as the
+    strings pandas' to_csv writes for them
+
+    window (from sheet_window()) selects part of the sheet. An empty sheet
+    yields one empty header row, like an empty DataFrame's CSV.
+    """
+    with tempfile.TemporaryFile() as spill:
+        header, width, data_rows, columns = scan_sheet(ws, spill, window)
+        if header is None:
+            yield []
+            return
+
+        yield header_names(header, width)
+        formatters = [_formatter(column, data_rows) for column in columns]
+        spill.seek(0)
+        padding = [None] * width
+        for _, row in zip(range(data_rows), _unspill_rows(spill)):
+            if len(row) < width:
+                row += padding[len(row):]
+            yield [format_value(value) for format_value, value in zip(formatters, row)]
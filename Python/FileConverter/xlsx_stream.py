@@ -0,0 +1,751 @@
+"""
+Streaming XLSX writer
+
+Writes worksheet XML as rows arrive, spilling each sheet to a temp file
+until it is closed and then into the .xlsx zip container, so memory stays
+flat no matter how many rows are written. Strings go into a
+shared-strings table (capped, overflow is written inline).
+
+XlsxAppender adds or replaces sheets in an existing workbook: every other
+part is copied byte-for-byte (still compressed) from the old container, so
+the cost is proportional to the new sheet, not the workbook. (On Python
+versions outside RAW_COPY_VERSIONS the parts are recompressed instead.)
+"""
+import math
+import os
+import platform
+import posixpath
+import re
+import shutil
+import struct
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr, unescape
+
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLS = 16384
+DEFAULT_MAX_SHARED_STRINGS = 250000
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+NS_CONTENT_TYPES = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+CT_WORKSHEET = 'application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml'
+REL_WORKSHEET = NS_REL + '/worksheet'
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_INVALID_SHEET_CHARS = re.compile(r'[\\*?:/\[\]]')
+_FLUSH_EVERY = 1000
+_COPY_BLOCK = 1024 * 1024
+# _copy_raw_entry() writes into a ZipFile through attributes zipfile
+# doesn't document (fp, start_dir, _didModify), so it is only used on the
+# CPython versions it has been checked against; anywhere else each copied
+# part is decompressed and recompressed a block at a time (_copy_entry)
+RAW_COPY_VERSIONS = ((3, 8), (3, 14))
+RAW_COPY = (platform.python_implementation() == 'CPython' and
+            RAW_COPY_VERSIONS[0] <= sys.version_info[:2] <= RAW_COPY_VERSIONS[1])
+_ATTRIBUTE = re.compile(r'([\w:]+)\s*=\s*(["\'])(.*?)\2', re.S)
+_column_letters = {}
+
+
+def column_letter(index):
+    """Convert a 1-based column index to Excel letters (1 -> A, 28 -> AB)"""
+    letters = _column_letters.get(index)
+    if letters is None:
+        n = index
+        letters = ''
+        while n:
+            n, rem = divmod(n - 1, 26)
+            letters = chr(65 + rem) + letters
+        _column_letters[index] = letters
+    return letters
+
+
+def validate_sheet_name(name):
+    """Raise ValueError if name is not a legal Excel sheet title"""
+    if not name or len(name) > 31:
+        raise ValueError(f"Sheet name must be 1-31 characters: {name!r}")
+    if _INVALID_SHEET_CHARS.search(name):
+        raise ValueError(f"Sheet name contains invalid characters: {name!r}")
+
+
+def rollover_sheet_name(base, part):
+    """Name of the part-th sheet of a rolled-over table (Data, Data_2, Data_3, ...)"""
+    if part == 1:
+        return base
+    suffix = f'_{part}'
+    return base[:31 - len(suffix)] + suffix
+
+
+def stale_rollover_sheets(sheet_names, base, parts):
+    """
+    Continuation sheets of base beyond its first parts sheets (base_N for
+    N = parts + 1, parts + 2, ... as long as they run on), left by an
+    earlier, longer table
+    """
+    names = {name.lower(): name for name in sheet_names}
+    stale = []
+    part = max(parts, 1) + 1
+    while rollover_sheet_name(base, part).lower() in names:
+        stale.append(names[rollover_sheet_name(base, part).lower()])
+        part += 1
+    return stale
+
+
+class SheetPaginator:
+    """
+    Spread rows over as many sheets as Excel's row limit requires
+
+    Iterating yields (sheet name, row number, values). When a sheet is full
+    the next one (Data_2, Data_3, ...) starts at start_row again with the
+    first row (the header) repeated.
+
+    Args:
+        rows: Iterable of row value lists
+        sheet_name: Name of the first sheet
+        start_row: Row number of the first row on every sheet
+        start_col: Column number of the first value (checked against the column limit)
+    """
+
+    def __init__(self, rows, sheet_name, start_row=1, start_col=1):
+        if not 1 <= start_row < EXCEL_MAX_ROWS:
+            raise ValueError(f"start_row must be between 1 and {EXCEL_MAX_ROWS - 1}")
+        if not 1 <= start_col <= EXCEL_MAX_COLS:
+            raise ValueError(f"start_col must be between 1 and {EXCEL_MAX_COLS}")
+        self.rows = rows
+        self.base_name = sheet_name
+        self.start_row = start_row
+        self.start_col = start_col
+        self.rows_read = 0
+        self.sheet_names = [sheet_name]
+
+    def __iter__(self):
+        header = None
+        name = self.base_name
+        row_number = self.start_row
+        max_width = EXCEL_MAX_COLS - self.start_col + 1
+        for values in self.rows:
+            if len(values) > max_width:
+                raise ValueError(f"Row {self.rows_read + 1} has {len(values)} columns; only {max_width} "
+                                 f"fit in Excel starting at column {self.start_col}")
+            if header is None:
+                header = values
+            if row_number > EXCEL_MAX_ROWS:
+                name = rollover_sheet_name(self.base_name, len(self.sheet_names) + 1)
+                self.sheet_names.append(name)
+                row_number = self.start_row
+                yield name, row_number, header
+                row_number += 1
+            self.rows_read += 1
+            yield name, row_number, values
+            row_number += 1
+
+
+def _text_element(value):
+    """Return a <t> element for a string value"""
+    text = escape(_ILLEGAL_XML_CHARS.sub('', value))
+    if text != text.strip():
+        return f'<t xml:space="preserve">{text}</t>'
+    return f'<t>{text}</t>'
+
+
+class SharedStrings:
+    """Shared-strings table; stops growing once max_size strings are stored"""
+
+    def __init__(self, max_size=DEFAULT_MAX_SHARED_STRINGS):
+        self.max_size = max_size
+        self.index = {}
+        self.elements = []
+        self.count = 0
+
+    def lookup(self, value):
+        """Return the table index for value, or None if the table is full"""
+        idx = self.index.get(value)
+        if idx is None:
+            if len(self.elements) >= self.max_size:
+                return None
+            idx = len(self.elements)
+            self.index[value] = idx
+            self.elements.append(_text_element(value))
+        self.count += 1
+        return idx
+
+    def write(self, zf, part_name='xl/sharedStrings.xml'):
+        with zf.open(part_name, 'w', force_zip64=True) as stream:
+            stream.write((
+                f'{XML_HEADER}<sst xmlns="{NS_MAIN}" count="{self.count}" '
+                f'uniqueCount="{len(self.elements)}">'
+            ).encode('utf-8'))
+            for start in range(0, len(self.elements), _FLUSH_EVERY):
+                chunk = self.elements[start:start + _FLUSH_EVERY]
+                stream.write(''.join(f'<si>{t}</si>' for t in chunk).encode('utf-8'))
+            stream.write(b'</sst>')
+
+
+class SheetStream:
+    """
+    Writes one worksheet part into an open zip file, row by row
+
+    The <dimension> element (the used range) has to come before the rows,
+    but is only known once they are all written, so rows are spilled to an
+    unnamed temp file and the part is written into the zip on close().
+    Readers such as openpyxl's read-only mode otherwise parse the whole
+    sheet just to size it.
+
+    Args:
+        zf: Writable zipfile.ZipFile
+        part_name: Zip member name, e.g. xl/worksheets/sheet1.xml
+        strings: SharedStrings table, or None to write all strings inline
+    """
+
+    def __init__(self, zf, part_name, strings=None):
+        self.part_name = part_name
+        self.strings = strings
+        self.rows_written = 0
+        self._zf = zf
+        self._spill = tempfile.TemporaryFile()
+        self._buffer = []
+        self._min_row = self._max_row = None
+        self._min_col = self._max_col = None
+
+    def _string_cell(self, ref, value):
+        if self.strings is not None:
+            idx = self.strings.lookup(value)
+            if idx is not None:
+                return f'<c r="{ref}" t="s"><v>{idx}</v></c>'
+        return f'<c r="{ref}" t="inlineStr"><is>{_text_element(value)}</is></c>'
+
+    def write_row(self, row_number, values, start_col=1):
+        """Write one row of Python values (None and '' leave the cell empty)"""
+        row_ref = str(row_number)
+        cells = [f'<row r="{row_ref}">']
+        first = last = None
+        for col, value in enumerate(values, start_col):
+            if value is None or value == '':
+                continue
+            ref = column_letter(col) + row_ref
+            kind = type(value)
+            if kind is bool:
+                cells.append(f'<c r="{ref}" t="b"><v>{int(value)}</v></c>')
+            elif kind is int:
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            elif kind is float and math.isfinite(value):
+                cells.append(f'<c r="{ref}"><v>{value!r}</v></c>')
+            else:
+                cells.append(self._string_cell(ref, str(value)))
+            if first is None:
+                first = col
+            last = col
+        cells.append('</row>')
+        self._buffer.append(''.join(cells))
+        self.rows_written += 1
+        if first is not None:
+            self._extend_dimension(row_number, first, last)
+        if len(self._buffer) >= _FLUSH_EVERY:
+            self._flush()
+
+    def _extend_dimension(self, row_number, first, last):
+        if self._min_row is None:
+            self._min_row = self._max_row = row_number
+            self._min_col, self._max_col = first, last
+            return
+        if row_number < self._min_row:
+            self._min_row = row_number
+        elif row_number > self._max_row:
+            self._max_row = row_number
+        if first < self._min_col:
+            self._min_col = first
+        if last > self._max_col:
+            self._max_col = last
+
+    def dimension(self):
+        """The used range written so far, e.g. 'A1:F300', as <dimension ref> gives it"""
+        if self._min_row is None:
+            return 'A1'
+        start = f'{column_letter(self._min_col)}{self._min_row}'
+        end = f'{column_letter(self._max_col)}{self._max_row}'
+        return start if start == end else f'{start}:{end}'
+
+    def _flush(self):
+        if self._buffer:
+            self._spill.write(''.join(self._buffer).encode('utf-8'))
+            self._buffer = []
+
+    def close(self):
+        if self._spill is None:
+            return
+        try:
+            self._flush()
+            self._spill.seek(0)
+            with self._zf.open(self.part_name, 'w', force_zip64=True) as stream:
+                stream.write((
+                    f'{XML_HEADER}<worksheet xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+                    f'<dimension ref="{self.dimension()}"/><sheetData>'
+                ).encode('utf-8'))
+                shutil.copyfileobj(self._spill, stream, _COPY_BLOCK)
+                stream.write(b'</sheetData></worksheet>')
+        finally:
+            self.discard()
+
+    def discard(self):
+        """Drop the rows written without adding the part to the zip"""
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+
+class StreamingXlsxWriter:
+    """
+    Create a new .xlsx workbook by streaming rows into it
+
+    Only one sheet can be open at a time; add_sheet() closes the previous one.
+
+    Example:
+        with StreamingXlsxWriter('out.xlsx') as writer:
+            sheet = writer.add_sheet('Data')
+            sheet.write_row(1, ['name', 'age'])
+    """
+
+    def __init__(self, path, max_shared_strings=DEFAULT_MAX_SHARED_STRINGS):
+        self._zip = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        self.strings = SharedStrings(max_shared_strings)
+        self.sheet_names = []
+        self._sheet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def add_sheet(self, name):
+        """Start a new worksheet and return its SheetStream"""
+        validate_sheet_name(name)
+        if name.lower() in (n.lower() for n in self.sheet_names):
+            raise ValueError(f"Duplicate sheet name: {name!r}")
+        if self._sheet is not None:
+            self._sheet.close()
+        self.sheet_names.append(name)
+        part_name = f'xl/worksheets/sheet{len(self.sheet_names)}.xml'
+        self._sheet = SheetStream(self._zip, part_name, self.strings)
+        return self._sheet
+
+    def close(self):
+        if self._zip is None:
+            return
+        if self._sheet is not None:
+            self._sheet.close()
+        if not self.sheet_names:
+            self.add_sheet('Sheet1').close()
+        try:
+            self.strings.write(self._zip)
+            self._write_package_parts()
+        finally:
+            self._zip.close()
+            self._zip = None
+
+    def _write_package_parts(self):
+        count = len(self.sheet_names)
+        sheets = ''.join(
+            f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(self.sheet_names, 1)
+        )
+        self._zip.writestr('xl/workbook.xml', (
+            f'{XML_HEADER}<workbook xmlns="{NS_MAIN}" xmlns:r="{NS_REL}">'
+            f'<sheets>{sheets}</sheets></workbook>'
+        ))
+
+        rels = ''.join(
+            f'<Relationship Id="rId{i}" Type="{REL_WORKSHEET}" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, count + 1)
+        )
+        rels += (
+            f'<Relationship Id="rId{count + 1}" Type="{NS_REL}/styles" Target="styles.xml"/>'
+            f'<Relationship Id="rId{count + 2}" Type="{NS_REL}/sharedStrings" '
+            f'Target="sharedStrings.xml"/>'
+        )
+        self._zip.writestr('xl/_rels/workbook.xml.rels', (
+            f'{XML_HEADER}<Relationships xmlns="{NS_PKG_REL}">{rels}</Relationships>'
+        ))
+
+        self._zip.writestr('xl/styles.xml', (
+            f'{XML_HEADER}<styleSheet xmlns="{NS_MAIN}">'
+            '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+            '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+            '<fill><patternFill patternType="gray125"/></fill></fills>'
+            '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+            '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+            '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+            '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+            '</styleSheet>'
+        ))
+
+        overrides = ''.join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" ContentType="{CT_WORKSHEET}"/>'
+            for i in range(1, count + 1)
+        )
+        self._zip.writestr('[Content_Types].xml', (
+            f'{XML_HEADER}<Types xmlns="{NS_CONTENT_TYPES}">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            '<Override PartName="/xl/sharedStrings.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+            f'{overrides}</Types>'
+        ))
+
+        self._zip.writestr('_rels/.rels', (
+            f'{XML_HEADER}<Relationships xmlns="{NS_PKG_REL}">'
+            f'<Relationship Id="rId1" Type="{NS_REL}/officeDocument" Target="xl/workbook.xml"/>'
+            '</Relationships>'
+        ))
+
+
+def _attributes(tag):
+    """Parse the attributes of a single XML start tag into a dict"""
+    return {name: unescape(value, {'&quot;': '"', '&apos;': "'"})
+            for name, _, value in _ATTRIBUTE.findall(tag)}
+
+
+def _strip_zip64_extra(extra):
+    """Drop the ZIP64 field (id 1) from a zip extra block; it is rebuilt on write"""
+    kept = b''
+    pos = 0
+    while pos + 4 <= len(extra):
+        field_id, size = struct.unpack('<HH', extra[pos:pos + 4])
+        if field_id != 1:
+            kept += extra[pos:pos + 4 + size]
+        pos += 4 + size
+    return kept
+
+
+def _copy_raw_entry(src, dest, info):
+    """
+    Copy one member from src to dest without decompressing it
+
+    zipfile has no public raw-copy API, so this writes the local header and
+    compressed bytes itself and registers the entry the same way
+    ZipFile.open(..., 'w') does (see RAW_COPY).
+    """
+    if info.flag_bits & 0x1:
+        raise ValueError(f"Encrypted workbook parts are not supported: {info.filename}")
+
+    src.fp.seek(info.header_offset)
+    header = src.fp.read(30)
+    if header[:4] != b'PK\x03\x04':
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    src.fp.seek(info.header_offset + 30 + name_len + extra_len)
+
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    for attr in ('compress_type', 'comment', 'create_system', 'create_version',
+                 'extract_version', 'volume', 'internal_attr', 'external_attr',
+                 'CRC', 'compress_size', 'file_size'):
+        setattr(entry, attr, getattr(info, attr))
+    # Sizes and CRC go in the local header, so no data descriptor follows
+    entry.flag_bits = info.flag_bits & ~0x08
+    entry.extra = _strip_zip64_extra(info.extra)
+    zip64 = entry.file_size > zipfile.ZIP64_LIMIT or entry.compress_size > zipfile.ZIP64_LIMIT
+
+    dest.fp.seek(dest.start_dir)
+    entry.header_offset = dest.fp.tell()
+    dest.fp.write(entry.FileHeader(zip64))
+    remaining = info.compress_size
+    while remaining:
+        block = src.fp.read(min(remaining, _COPY_BLOCK))
+        if not block:
+            raise zipfile.BadZipFile(f"Truncated data for {info.filename}")
+        dest.fp.write(block)
+        remaining -= len(block)
+
+    dest.start_dir = dest.fp.tell()
+    dest.filelist.append(entry)
+    dest.NameToInfo[entry.filename] = entry
+    dest._didModify = True
+
+
+def _copy_entry(src, dest, info):
+    """Copy one member from src to dest through zipfile's public API, decompressing and recompressing it"""
+    entry = zipfile.ZipInfo(info.filename, info.date_time)
+    for attr in ('compress_type', 'comment', 'create_system', 'external_attr', 'file_size'):
+        setattr(entry, attr, getattr(info, attr))
+    with src.open(info) as source, \
+            dest.open(entry, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as target:
+        shutil.copyfileobj(source, target, _COPY_BLOCK)
+
+
+def copy_entry(src, dest, info):
+    """Copy one member from src to dest, raw where RAW_COPY allows"""
+    if RAW_COPY:
+        _copy_raw_entry(src, dest, info)
+    else:
+        _copy_entry(src, dest, info)
+
+
+def _rels_path(part_name):
+    """Relationship part for a package part (xl/workbook.xml -> xl/_rels/workbook.xml.rels)"""
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+def _resolve_target(source_part, target):
+    """Resolve a relationship Target against the part that owns it"""
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_part), target))
+
+
+class WorkbookPackage:
+    """The workbook-level XML parts of an .xlsx and the sheets they list"""
+
+    def __init__(self, zf):
+        root_rels = zf.read('_rels/.rels').decode('utf-8')
+        self.workbook_part = 'xl/workbook.xml'
+        for tag in re.findall(r'<(?:\w+:)?Relationship\b[^>]*>', root_rels):
+            attrs = _attributes(tag)
+            if attrs.get('Type', '').endswith('/officeDocument'):
+                self.workbook_part = _resolve_target('', attrs['Target'])
+                break
+        self.workbook_rels_part = _rels_path(self.workbook_part)
+
+        self.workbook_xml = zf.read(self.workbook_part).decode('utf-8')
+        self.rels_xml = zf.read(self.workbook_rels_part).decode('utf-8')
+        self.types_xml = zf.read('[Content_Types].xml').decode('utf-8')
+
+        self.rels = {}
+        for tag in re.findall(r'<(?:\w+:)?Relationship\b[^>]*>', self.rels_xml):
+            attrs = _attributes(tag)
+            self.rels[attrs['Id']] = attrs
+
+        match = re.search(r'xmlns:(\w+)="' + re.escape(NS_REL) + '"', self.workbook_xml)
+        self.rel_prefix = match.group(1) if match else 'r'
+        if not match:
+            self.workbook_xml = re.sub(r'<((?:\w+:)?workbook)\b',
+                                       rf'<\1 xmlns:r="{NS_REL}"', self.workbook_xml, count=1)
+        self.sheets_prefix = re.search(r'<(\w+:)?sheets\b', self.workbook_xml).group(1) or ''
+
+        self.sheets = []
+        for tag in re.findall(r'<(?:\w+:)?sheet\b[^>]*>', self.workbook_xml):
+            attrs = _attributes(tag)
+            rel = self.rels.get(attrs.get(f'{self.rel_prefix}:id'), {})
+            part = _resolve_target(self.workbook_part, rel['Target']) if 'Target' in rel else None
+            self.sheets.append({'name': attrs['name'], 'sheetId': int(attrs['sheetId']), 'part': part,
+                                'rel_id': attrs.get(f'{self.rel_prefix}:id')})
+
+    @property
+    def sheet_names(self):
+        return [sheet['name'] for sheet in self.sheets]
+
+
+def existing_sheet_names(path):
+    """List sheet names of an .xlsx by reading only its workbook part"""
+    with zipfile.ZipFile(path, 'r') as zf:
+        return WorkbookPackage(zf).sheet_names
+
+
+def _renumber_sheet_positions(workbook_xml, removed):
+    """
+    Update the workbook's references to sheets by position (sheet-scoped
+    defined names, the active and first visible tab) once the sheets at
+    the removed positions are gone
+    """
+    def shifted(position):
+        return position - sum(1 for index in removed if index < position)
+
+    def defined_name(match):
+        position = int(match.group(2))
+        if position in removed:
+            return ''
+        return match.group(0).replace(match.group(1), f'localSheetId="{shifted(position)}"', 1)
+
+    workbook_xml = re.sub(r'<(?:\w+:)?definedName\b[^>]*?(localSheetId="(\d+)")[^>]*>.*?</(?:\w+:)?definedName>',
+                          defined_name, workbook_xml, flags=re.S)
+    return re.sub(r'\b(activeTab|firstSheet)="(\d+)"',
+                  lambda m: f'{m.group(1)}="{0 if int(m.group(2)) in removed else shifted(int(m.group(2)))}"',
+                  workbook_xml)
+
+
+class XlsxAppender:
+    """
+    Add, replace or remove sheets in an existing .xlsx without loading the
+    workbook
+
+    New sheets use inline strings so the existing shared-strings table is
+    left untouched. Replacing a sheet discards all of its old content.
+
+    Example:
+        with XlsxAppender('report.xlsx') as book:
+            sheet = book.add_sheet('2024-06-01')
+            sheet.write_row(1, ['date', 'total'])
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._src = zipfile.ZipFile(self.path, 'r')
+        try:
+            self.package = WorkbookPackage(self._src)
+        except Exception:
+            self._src.close()
+            raise
+        fd, self._tmp_name = tempfile.mkstemp(dir=self.path.parent, suffix='.xlsx.tmp')
+        os.close(fd)
+        self._dest = zipfile.ZipFile(self._tmp_name, 'w', compression=zipfile.ZIP_DEFLATED)
+        self._sheet = None
+        self._added = []      # (name, part_name) of sheets written by this appender
+        self._replaced = {}   # lower-case name -> existing sheet info
+        self._removed = {}    # lower-case name -> existing sheet info
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    @property
+    def sheet_names(self):
+        return self.package.sheet_names
+
+    def add_sheet(self, name):
+        """Start a sheet (replacing any existing sheet of that name) and return its SheetStream"""
+        validate_sheet_name(name)
+        key = name.lower()
+        if any(added.lower() == key for added, _ in self._added):
+            raise ValueError(f"Duplicate sheet name: {name!r}")
+        if self._sheet is not None:
+            self._sheet.close()
+
+        existing = next((s for s in self.package.sheets if s['name'].lower() == key), None)
+        if existing is not None and existing['part']:
+            part_name = existing['part']
+            self._replaced[key] = existing
+        else:
+            taken = set(self._src.namelist()) | {part for _, part in self._added}
+            n = 1
+            while f'xl/worksheets/sheet{n}.xml' in taken:
+                n += 1
+            part_name = f'xl/worksheets/sheet{n}.xml'
+
+        self._added.append((name, part_name))
+        self._sheet = SheetStream(self._dest, part_name, strings=None)
+        return self._sheet
+
+    def remove_sheet(self, name):
+        """Drop an existing sheet from the workbook"""
+        key = name.lower()
+        existing = next((s for s in self.package.sheets if s['name'].lower() == key), None)
+        if existing is None:
+            raise ValueError(f"No sheet named {name!r}")
+        if any(added.lower() == key for added, _ in self._added):
+            raise ValueError(f"Sheet {name!r} was written in this run")
+        self._removed[key] = existing
+
+    def _updated_package_xml(self):
+        """Return new (workbook, workbook rels, content types) XML and parts to drop"""
+        pkg = self.package
+        workbook_xml, rels_xml, types_xml = pkg.workbook_xml, pkg.rels_xml, pkg.types_xml
+        dropped = set()
+
+        rel_ids = set(pkg.rels)
+        next_sheet_id = max([s['sheetId'] for s in self.package.sheets] + [0]) + 1
+        new_rels = []
+        new_sheets = []
+        new_types = []
+        for name, part_name in self._added:
+            if name.lower() in self._replaced:
+                continue
+            n = 1
+            while f'rId{n}' in rel_ids:
+                n += 1
+            rel_id = f'rId{n}'
+            rel_ids.add(rel_id)
+            target = posixpath.relpath(part_name, posixpath.dirname(pkg.workbook_part))
+            new_rels.append(f'<Relationship Id="{rel_id}" Type="{REL_WORKSHEET}" Target="{target}"/>')
+            new_sheets.append(f'<{pkg.sheets_prefix}sheet name={quoteattr(name)} '
+                              f'sheetId="{next_sheet_id}" {pkg.rel_prefix}:id="{rel_id}"/>')
+            new_types.append(f'<Override PartName="/{part_name}" ContentType="{CT_WORKSHEET}"/>')
+            next_sheet_id += 1
+
+        if self._removed:
+            for sheet in self._removed.values():
+                workbook_xml = re.sub(r'<(?:\w+:)?sheet\b[^>]*\b' + re.escape(f'{pkg.rel_prefix}:id') + '="'
+                                      + re.escape(sheet['rel_id'] or '') + r'"[^>]*>', '', workbook_xml)
+                rels_xml = re.sub(r'<(?:\w+:)?Relationship\b[^>]*\bId="' + re.escape(sheet['rel_id'] or '')
+                                  + r'"[^>]*>', '', rels_xml)
+                if sheet['part']:
+                    types_xml = re.sub(r'<Override\b[^>]*PartName="/' + re.escape(sheet['part']) + r'"[^>]*>',
+                                       '', types_xml)
+                    dropped.update((sheet['part'], _rels_path(sheet['part'])))
+            removed = {index for index, sheet in enumerate(pkg.sheets) if sheet['name'].lower() in self._removed}
+            workbook_xml = _renumber_sheet_positions(workbook_xml, removed)
+
+        if self._replaced or self._removed:
+            # The old sheet's drawings/comments links and Excel's formula
+            # cache no longer match; Excel rebuilds calcChain on open
+            for sheet in self._replaced.values():
+                dropped.add(_rels_path(sheet['part']))
+            for rel_id, rel in pkg.rels.items():
+                if rel.get('Type', '').endswith('/calcChain'):
+                    dropped.add(_resolve_target(pkg.workbook_part, rel['Target']))
+                    rels_xml = re.sub(r'<(?:\w+:)?Relationship\b[^>]*\bId="' + re.escape(rel_id)
+                                      + r'"[^>]*>', '', rels_xml)
+            types_xml = re.sub(r'<Override\b[^>]*PartName="/xl/calcChain.xml"[^>]*>', '', types_xml)
+
+        if new_sheets:
+            close_sheets = f'</{pkg.sheets_prefix}sheets>'
+            workbook_xml = workbook_xml.replace(close_sheets, ''.join(new_sheets) + close_sheets, 1)
+            close_rels = re.search(r'</(?:\w+:)?Relationships>', rels_xml).group(0)
+            rels_xml = rels_xml.replace(close_rels, ''.join(new_rels) + close_rels, 1)
+            close_types = re.search(r'</(?:\w+:)?Types>', types_xml).group(0)
+            types_xml = types_xml.replace(close_types, ''.join(new_types) + close_types, 1)
+
+        return workbook_xml, rels_xml, types_xml, dropped
+
+    def close(self):
+        if self._dest is None:
+            return
+        try:
+            if self._sheet is not None:
+                self._sheet.close()
+            pkg = self.package
+            workbook_xml, rels_xml, types_xml, dropped = self._updated_package_xml()
+            rewritten = {pkg.workbook_part: workbook_xml, pkg.workbook_rels_part: rels_xml,
+                         '[Content_Types].xml': types_xml}
+            written = {part for _, part in self._added}
+
+            for info in self._src.infolist():
+                name = info.filename
+                if name in written or name in dropped or name in rewritten:
+                    continue
+                copy_entry(self._src, self._dest, info)
+            for name, xml in rewritten.items():
+                self._dest.writestr(name, xml)
+
+            self._dest.close()
+            self._src.close()
+            self._dest = None
+            os.replace(self._tmp_name, self.path)
+        except Exception:
+            self.abort()
+            raise
+
+    def abort(self):
+        """Discard everything written and leave the original workbook untouched"""
+        if self._dest is not None:
+            if self._sheet is not None:
+                self._sheet.discard()
+            self._dest.close()
+            self._dest = None
+        self._src.close()
+        if os.path.exists(self._tmp_name):
+            os.remove(self._tmp_name)
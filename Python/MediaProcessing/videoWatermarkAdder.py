@@ -1,7 +1,11 @@
 import cv2
 import numpy as np
 import argparse
+import contextlib
+import io
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 
@@ -133,12 +137,34 @@ def add_watermark(input_video, output_video, watermark_path, position='bottom-ri
     print(f"  Output: {output_video}")
 
 
-def batch_add_watermark(video_files, watermark_path, output_dir=None, **kwargs):
-    """Add watermark to multiple videos"""
+def _banner(video_path):
+    return f"\n{'='*60}\nProcessing: {Path(video_path).name}\n{'='*60}"
+
+
+def _watermark_captured(video_file, output_path, watermark_path, kwargs):
+    """Worker process: add_watermark with its output captured; returns (output, error)"""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        try:
+            add_watermark(video_file, output_path, watermark_path, **kwargs)
+        except Exception as e:
+            return log.getvalue(), e
+    return log.getvalue(), None
+
+
+def batch_add_watermark(video_files, watermark_path, output_dir=None, jobs=1, **kwargs):
+    """
+    Add watermark to multiple videos
+    
+    With jobs > 1 (0 = all cores) several videos are encoded at once in
+    worker processes; each one's output is printed, in input order, once
+    it is done.
+    """
     output_dir = Path(output_dir) if output_dir else None
     if output_dir:
         output_dir.mkdir(parents=True, exist_ok=True)
     
+    videos = []
     for video_file in video_files:
         video_path = Path(video_file)
         
@@ -151,14 +177,31 @@ def batch_add_watermark(video_files, watermark_path, output_dir=None, **kwargs):
             output_path = output_dir / f"{video_path.stem}_watermarked{video_path.suffix}"
         else:
             output_path = video_path.parent / f"{video_path.stem}_watermarked{video_path.suffix}"
-        
-        try:
-            print(f"\n{'='*60}")
-            print(f"Processing: {video_path.name}")
-            print('='*60)
-            add_watermark(video_file, output_path, watermark_path, **kwargs)
-        except Exception as e:
-            print(f"✗ Error processing {video_file}: {e}")
+        videos.append((video_file, output_path))
+    
+    jobs = min(jobs or os.cpu_count() or 1, len(videos))
+    if jobs <= 1:
+        for video_file, output_path in videos:
+            try:
+                print(_banner(video_file))
+                add_watermark(video_file, output_path, watermark_path, **kwargs)
+            except Exception as e:
+                print(f"✗ Error processing {video_file}: {e}")
+        return
+    
+    print(f"Encoding {len(videos)} videos, {jobs} at a time")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(_watermark_captured, video_file, output_path, watermark_path, kwargs)
+                   for video_file, output_path in videos]
+        for (video_file, _), future in zip(videos, futures):
+            print(_banner(video_file))
+            try:
+                output, error = future.result()
+            except Exception as e:  # the worker died
+                output, error = '', e
+            print(output, end='')
+            if error is not None:
+                print(f"✗ Error processing {video_file}: {error}")
 
 
 def main():
@@ -205,6 +248,8 @@ Examples:
     parser.add_argument('--batch', action='store_true',
                        help='Batch mode: process multiple videos')
     parser.add_argument('--output-dir', help='Output directory for batch mode')
+    parser.add_argument('--jobs', type=int, default=1,
+                       help='Batch mode: videos encoded at once in worker processes (0 = all cores, default: 1)')
     
     args = parser.parse_args()
     
@@ -252,6 +297,7 @@ Examples:
                 videos,
                 watermark,
                 output_dir=args.output_dir,
+                jobs=args.jobs,
                 position=position,
                 scale=args.scale,
                 opacity=args.opacity,